@@ -21,12 +21,19 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-t@xo7%yrm49r!f^j%h7b*%u)fka*ac_9t%8d$srfg+qk)(l7f_' # noqa
+SECRET_KEY = os.environ.get(
+    'SECRET_KEY',
+    'django-insecure-t@xo7%yrm49r!f^j%h7b*%u)fka*ac_9t%8d$srfg+qk)(l7f_',
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = bool(int(os.environ.get('DEBUG', 0)))
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [
+    host.strip()
+    for host in os.environ.get('ALLOWED_HOSTS', '').split(',')
+    if host.strip()
+]
 
 
 # Application definition
@@ -47,11 +54,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -80,16 +91,57 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Connections are kept open for DB_CONN_MAX_AGE seconds and checked before
+# being reused. With DB_POOL enabled they are instead returned to a per
+# process pool at the end of each request, so the max age defaults to 0.
+DB_POOL = bool(int(os.environ.get('DB_POOL', 0)))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST', 'db'),
         'NAME': os.environ.get('DB_NAME', 'postgres'),
         'USER': os.environ.get('DB_USER', 'postgres'),
         'PASSWORD': os.environ.get('DB_PASSWORD', 'postgres'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE',
+                                           0 if DB_POOL else 60)),
+        'CONN_HEALTH_CHECKS': bool(int(
+            os.environ.get('DB_CONN_HEALTH_CHECKS', 1))),
+        'POOL': {
+            'ENABLED': DB_POOL,
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+            'CHECK_INTERVAL': int(
+                os.environ.get('DB_POOL_CHECK_INTERVAL', 30)),
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
+# Cached list and retrieve responses of the recepie API, invalidated per
+# user on writes. Workers only see each other's invalidations through a
+# shared cache backend such as memcached, so keep it off with LocMemCache
+# when running more than one process.
+RESPONSE_CACHE = {
+    'ENABLED': bool(int(os.environ.get('RESPONSE_CACHE', 0))),
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300)),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -128,6 +180,7 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.2/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.environ.get('STATIC_ROOT', '/vol/web/static')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
@@ -138,4 +191,74 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Default page size of paginated lists and the upper bound for the
+# ?page_size= query parameter
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 100))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+
+# Largest number of items accepted by a single bulk request
+API_BULK_MAX_SIZE = int(os.environ.get('API_BULK_MAX_SIZE', 500))
+
+# Rows fetched per round trip while streaming an export
+API_EXPORT_CHUNK_SIZE = int(os.environ.get('API_EXPORT_CHUNK_SIZE', 2000))
+
+# Cache of auth token lookups, in process or in the named Django cache.
+# Workers only see each other's deleted tokens and deactivated users through
+# a shared cache backend such as memcached, so only enable it without
+# TOKEN_CACHE_ALIAS when running a single process.
+TOKEN_CACHE = {
+    'ENABLED': bool(int(os.environ.get('TOKEN_CACHE', 0))),
+    'MAX_SIZE': int(os.environ.get('TOKEN_CACHE_MAX_SIZE', 10000)),
+    'TTL': int(os.environ.get('TOKEN_CACHE_TTL', 300)),
+    'CACHE_ALIAS': os.environ.get('TOKEN_CACHE_ALIAS') or None,
+}
+
+# Compression of responses of at least MIN_SIZE bytes, with brotli when the
+# brotli package is installed and the client accepts it, otherwise gzip
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+    'GZIP_LEVEL': int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6)),
+    'BROTLI_QUALITY': int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5)),
+}
+
+# Per view request metrics served at /metrics, which requires an
+# "Authorization: Bearer <TOKEN>" header when a token is set and is only
+# served without one in debug mode. Requests slower than SLOW_REQUEST_MS
+# are logged with their SQL, 0 turns it off.
+METRICS = {
+    'ENABLED': bool(int(os.environ.get('METRICS', 1))),
+    'TOKEN': os.environ.get('METRICS_TOKEN') or None,
+    'SLOW_REQUEST_MS': int(os.environ.get('SLOW_REQUEST_MS', 1000)),
+}
+
+# Checks of the query budgets of the API views, see core.query_budget, on
+# by default in debug mode. Requests over budget are logged, or fail with
+# QUERY_BUDGET_RAISE=1.
+QUERY_BUDGET = {
+    'ENABLED': bool(int(os.environ.get('QUERY_BUDGET', int(DEBUG)))),
+    'RAISE': bool(int(os.environ.get('QUERY_BUDGET_RAISE', 0))),
+}
+
+# Threads per process running the async views of the ASGI application, see
+# core.async_views, each of which keeps its own database connection
+ASYNC_VIEWS = {
+    'THREADS': int(os.environ.get('ASYNC_VIEW_THREADS', 16)),
+}
+
+# Opt-in profiling of requests, see core.profiling. Profiles are written to
+# DIR, which keeps the newest MAX_FILES of them, and tokens printed by the
+# profile_token command are accepted for TOKEN_MAX_AGE seconds.
+PROFILING = {
+    'ENABLED': bool(int(os.environ.get('PROFILING', 1))),
+    'DIR': os.environ.get('PROFILING_DIR', '/vol/web/profiles'),
+    'MAX_FILES': int(os.environ.get('PROFILING_MAX_FILES', 50)),
+    'TOKEN_MAX_AGE': int(os.environ.get('PROFILING_TOKEN_MAX_AGE', 3600)),
+    'SAMPLE_INTERVAL': float(
+        os.environ.get('PROFILING_SAMPLE_INTERVAL', 0.005)),
 }
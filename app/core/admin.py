@@ -1,6 +1,11 @@
 from django.contrib import admin # noqa
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 from core import models
+from core.profiling import profile_path
 
 # Register your models here.
 
@@ -27,6 +32,48 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class ProfileRecordAdmin(admin.ModelAdmin):
+    """Read only admin listing request profiles to download"""
+    ordering = ['-id']
+    list_display = ['created_at', 'method', 'path', 'status_code',
+                    'duration_ms', 'format', 'size', 'download']
+    list_filter = ['format', 'method']
+    search_fields = ['path', 'view_name']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/',
+                 self.admin_site.admin_view(self.download_view),
+                 name='core_profilerecord_download'),
+        ] + super().get_urls()
+
+    @admin.display(description='File')
+    def download(self, obj):
+        return format_html(
+            '<a href="{}">{}</a>',
+            reverse('admin:core_profilerecord_download', args=[obj.pk]),
+            obj.file_name)
+
+    def download_view(self, request, pk):
+        """Send the profile file as an attachment"""
+        if not self.has_view_permission(request):
+            raise Http404
+        record = get_object_or_404(models.ProfileRecord, pk=pk)
+        try:
+            return FileResponse(open(profile_path(record), 'rb'),
+                                as_attachment=True,
+                                filename=record.file_name)
+        except FileNotFoundError:
+            raise Http404
+
+
 admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Recepie)
 admin.site.register(models.Tag)
+admin.site.register(models.ProfileRecord, ProfileRecordAdmin)
@@ -0,0 +1,82 @@
+"""
+Async views running DRF views in a pool of threads
+
+Django 3.2 has no async ORM and, under ASGI, runs sync views one at a time
+on a single thread per process, so a request waiting on the database holds
+up all the others. The views made by async_view instead run the DRF view,
+its queries and rendering in a pool of ASYNC_VIEWS['THREADS'] threads, each
+with its own database connection, while the event loop keeps serving the
+other clients however slowly they send their requests or read responses.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse
+
+from core import profiling
+from core.middleware import time_encoding
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Return the thread pool of this process, started on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(settings.ASYNC_VIEWS['THREADS'],
+                                           thread_name_prefix='async-view')
+        return _executor
+
+
+async def run_in_thread(func, *args):
+    """Run a blocking function in the pool, in the context of the caller"""
+    call = functools.partial(contextvars.copy_context().run, func, *args)
+    return await asyncio.get_running_loop().run_in_executor(
+        _get_executor(), call)
+
+
+def _detach(response):
+    """
+    Copy a rendered response into a plain HttpResponse, which Django sends
+    as it is instead of rendering it again on its thread for sync code
+    """
+    detached = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        detached[header] = value
+    detached.cookies = response.cookies
+    return detached
+
+
+@profiling.profiled
+def _respond(view, request, args, kwargs):
+    """Run a sync view and render its response"""
+    # The request signals only close the connections of Django's thread
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            time_encoding(request, response)
+            response = _detach(response.render())
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(viewset, actions):
+    """
+    Return an async view running actions of a viewset in the pool, with the
+    attributes of the view DRF makes, such as the viewset's query budget
+    """
+    view = viewset.as_view(actions)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run_in_thread(_respond, view, request, args, kwargs)
+    return wrapper
@@ -0,0 +1,272 @@
+"""
+Helpers for seeding data, timing queries and driving servers in benchmark
+commands
+"""
+import asyncio
+import io
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, connections
+
+from core.models import Recepie, Tag
+from core.query_budget import QueryLog
+
+# Per-request latencies in seconds and query counts, the number of failed
+# requests and the elapsed seconds of a drive() run
+LoadResult = namedtuple('LoadResult',
+                        ('latencies', 'errors', 'elapsed', 'queries'))
+
+
+# Users created by seed_benchmark_data and driven by benchmark_api
+LOADTEST_EMAIL = 'loadtest-{}@example.com'
+LOADTEST_PASSWORD = 'benchmark'
+
+
+def loadtest_users():
+    """Return the users created by seed_benchmark_data"""
+    return get_user_model().objects.filter(
+        email__regex=r'^loadtest-[0-9]+@example\.com$').order_by('id')
+
+
+def create_benchmark_users(count, prefix='benchmark'):
+    """Create users to own benchmark data"""
+    stamp = int(time.time() * 1000)
+    return [
+        get_user_model().objects.create_user(
+            email=f'{prefix}-{stamp}-{i}@example.com',
+            password='benchmark',
+        )
+        for i in range(count)
+    ]
+
+
+def seed_recepies(user, count, tag_count=50, tags_per_recepie=3,
+                  batch_size=10000):
+    """
+    Bulk insert recepies and tags for a user and return the tags
+    """
+    tags = Tag.objects.get_or_create_many(
+        user, [f'tag {i}' for i in range(tag_count)])
+    through = Recepie.tags.through
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        last_id = Recepie.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        Recepie.objects.bulk_create([
+            Recepie(
+                user=user,
+                title=f'Recepie {created + i}',
+                price=Decimal((created + i) % 10000) / 100,
+                time_minutes=(created + i) % 240 + 1,
+                description=f'Benchmark recepie number {created + i}',
+            )
+            for i in range(size)
+        ], batch_size=batch_size)
+        recepie_ids = Recepie.objects.filter(
+            user=user, id__gt=last_id).values_list('id', flat=True)
+        links = [
+            through(recepie_id=recepie_id,
+                    tag_id=tags[(recepie_id + offset) % len(tags)].id)
+            for recepie_id in recepie_ids
+            for offset in range(min(tags_per_recepie, len(tags)))
+        ]
+        through.objects.bulk_create(links, batch_size=batch_size,
+                                    ignore_conflicts=True)
+        Tag.objects.adjust_counts(Counter(link.tag_id for link in links))
+        created += size
+    return tags
+
+
+def analyze():
+    """Refresh planner statistics after seeding"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+def explain(queryset):
+    """Return the query plan, executing the query where supported"""
+    if connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def timed(func, repeat=1):
+    """Return the best wall time of calling func, in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def wsgi_environ(method, path, token=None, body=b'', query=''):
+    """Build the WSGI environ of an API request"""
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': 'http',
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if token:
+        environ['HTTP_AUTHORIZATION'] = f'Token {token}'
+    return environ
+
+
+def drive(make_environ, threads, duration):
+    """
+    Send requests through the WSGI handler from a number of threads for
+    duration seconds, like a threaded server would, and return a LoadResult
+    """
+    handler = WSGIHandler()
+    latencies = [[] for _ in range(threads)]
+    queries = [[] for _ in range(threads)]
+    errors = [0] * threads
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        statuses = []
+        try:
+            while time.monotonic() < deadline:
+                log = QueryLog()
+                start = time.perf_counter()
+                with log.recording():
+                    response = handler(make_environ(),
+                                       lambda status, headers:
+                                       statuses.append(status))
+                    b''.join(response)
+                    # Fires request_finished, which closes or returns the
+                    # connection depending on CONN_MAX_AGE and pooling
+                    response.close()
+                latencies[index].append(time.perf_counter() - start)
+                queries[index].append(len(log.statements))
+                if not statuses.pop().startswith(('2', '3')):
+                    errors[index] += 1
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=worker, args=(i,))
+               for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return LoadResult([t for lat in latencies for t in lat], sum(errors),
+                      elapsed, [n for counts in queries for n in counts])
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1,
+                      round(percent / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+@contextmanager
+def serve(server_mode, threads, startup_timeout=30):
+    """
+    Run one gunicorn worker process with gunicorn.conf.py in SERVER_MODE
+    wsgi or asgi, with threads threads for sync views or async views, and
+    yield its host and port
+    """
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        host, port = probe.getsockname()
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE',
+                                              settings.SETTINGS_MODULE),
+        SERVER_MODE=server_mode,
+        BIND=f'{host}:{port}',
+        WEB_CONCURRENCY='1',
+        GUNICORN_THREADS=str(threads),
+        ASYNC_VIEW_THREADS=str(threads),
+        GUNICORN_MAX_REQUESTS='0',
+        ALLOWED_HOSTS=','.join([*settings.ALLOWED_HOSTS, host]),
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f'The {server_mode} server exited with '
+                                   f'status {server.returncode}')
+            try:
+                socket.create_connection((host, port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f'The {server_mode} server did not '
+                                       f'start in {startup_timeout}s')
+                time.sleep(0.1)
+        yield host, port
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+def http_request(host, port, path, token=None):
+    """Return the bytes of a GET request closing its connection"""
+    lines = [f'GET {path} HTTP/1.1', f'Host: {host}:{port}',
+             'Accept: application/json', 'Connection: close']
+    if token:
+        lines.append(f'Authorization: Token {token}')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode()
+
+
+async def slow_request(host, port, request, send_time, chunks=8):
+    """
+    Send a request in chunks spread over send_time seconds, like a client
+    on a slow network, and return the response status with the seconds
+    from sending its last byte to reading the whole response
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        size = -(-len(request) // chunks)
+        for start in range(0, len(request), size):
+            if start:
+                await asyncio.sleep(send_time / (chunks - 1))
+            writer.write(request[start:start + size])
+            await writer.drain()
+        sent = time.perf_counter()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1]), time.perf_counter() - sent
+    finally:
+        writer.close()
@@ -0,0 +1,100 @@
+"""
+PostgreSQL backend with connection health checks and optional pooling
+"""
+import functools
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from core.db.pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Adds two settings to the stock PostgreSQL backend:
+
+    CONN_HEALTH_CHECKS checks a persistent connection once per request
+    before reusing it, so a connection dropped by the server is replaced
+    instead of failing the request.
+
+    POOL['ENABLED'] makes closing a connection hand it back to an
+    in-process pool that later connections are taken from.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+
+    @property
+    def pool(self):
+        """The connection pool of this database, if pooling is enabled"""
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('ENABLED'):
+            return None
+        return get_pool(self.alias, options)
+
+    def connect(self):
+        """Connect, counting the new connection as healthy"""
+        super().connect()
+        self.health_check_done = True
+
+    def ensure_connection(self):
+        """Replace a persistent connection that is no longer usable"""
+        if self.connection is not None and not self.health_check_done \
+                and self.settings_dict.get('CONN_HEALTH_CHECKS') \
+                and not self.in_atomic_block:
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        """Check the connection again the next time it is used"""
+        self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def get_new_connection(self, conn_params):
+        """Take a connection from the pool when pooling is enabled"""
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.acquire(
+            functools.partial(super().get_new_connection, conn_params),
+            self._check,
+        )
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level',
+                                           connection.isolation_level)
+        return connection
+
+    def _close(self):
+        """Return the connection to the pool when pooling is enabled"""
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.release(self.connection, self._reset)
+
+    def _check(self, connection):
+        """Whether a pooled connection still answers queries"""
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
+
+    def _reset(self, connection):
+        """Roll back leftover transaction state before pooling"""
+        if connection.closed:
+            return False
+        status = connection.get_transaction_status()
+        if status == extensions.TRANSACTION_STATUS_IDLE:
+            return True
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        try:
+            connection.rollback()
+        except base.Database.Error:
+            return False
+        return True
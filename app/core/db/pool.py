@@ -0,0 +1,195 @@
+"""
+In-process pool of database connections shared by the threads of a worker
+"""
+import os
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    """No connection became available within the pool timeout"""
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of open DB-API connections for one database
+
+    Connections are created on demand up to max_size, handed out most
+    recently used first and health checked on checkout when they have been
+    idle for longer than check_interval seconds.
+    """
+
+    def __init__(self, max_size=10, timeout=10, max_lifetime=None,
+                 check_interval=30):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self._cond = threading.Condition()
+        # (connection, created, released) of connections ready for use
+        self._idle = []
+        # id(connection) -> created, of connections handed out
+        self._in_use = {}
+        # Slots reserved by threads currently opening a connection
+        self._opening = 0
+        self.counters = dict.fromkeys((
+            'connections_created', 'connections_reused',
+            'connections_discarded', 'health_check_failures',
+            'checkout_timeouts', 'checkout_wait_seconds',
+        ), 0)
+
+    @property
+    def size(self):
+        """Number of open connections, idle or in use"""
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def acquire(self, connect, check):
+        """
+        Return an open connection, reusing an idle one that passes check()
+        or opening a new one with connect()
+        """
+        while True:
+            conn, created, released = self._checkout()
+            if conn is None:
+                return self._open(connect)
+            idle_for = time.monotonic() - released
+            if idle_for < self.check_interval or check(conn):
+                self._count('connections_reused')
+                return conn
+            self._count('health_check_failures')
+            self._discard(conn)
+
+    def release(self, conn, reset):
+        """
+        Return a connection to the pool, closing it instead if reset()
+        fails or it is older than max_lifetime
+        """
+        with self._cond:
+            created = self._in_use.get(id(conn))
+        now = time.monotonic()
+        if created is None or self._expired(created, now) or \
+                not reset(conn):
+            self._discard(conn)
+            return
+        with self._cond:
+            self._in_use.pop(id(conn))
+            self._idle.append((conn, created, now))
+            self._cond.notify()
+
+    def close(self):
+        """Close every idle connection"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        """Return the counters and current sizes of the pool"""
+        with self._cond:
+            return dict(
+                self.counters,
+                size=self.size,
+                idle=len(self._idle),
+                in_use=len(self._in_use),
+                max_size=self.max_size,
+            )
+
+    def _checkout(self):
+        """
+        Take the most recently released idle connection or reserve a slot
+        for a new one, waiting up to timeout for either
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._cond:
+            while not self._idle and self.size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if self._idle or self.size < self.max_size:
+                        break
+                    self.counters['checkout_timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No database connection available after '
+                        f'{self.timeout}s (pool size {self.max_size})')
+            self.counters['checkout_wait_seconds'] += \
+                time.monotonic() - start
+            if self._idle:
+                conn, created, released = self._idle.pop()
+                self._in_use[id(conn)] = created
+                return conn, created, released
+            # Hold the slot while connecting outside of the lock
+            self._opening += 1
+            return None, None, None
+
+    def _open(self, connect):
+        """Open a new connection in a reserved slot"""
+        try:
+            conn = connect()
+        except BaseException:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opening -= 1
+            self._in_use[id(conn)] = time.monotonic()
+            self.counters['connections_created'] += 1
+        return conn
+
+    def _expired(self, created, now):
+        """Whether a connection outlived max_lifetime"""
+        return self.max_lifetime is not None and \
+            now - created >= self.max_lifetime
+
+    def _discard(self, conn):
+        """Close a connection and free its slot"""
+        with self._cond:
+            self._in_use.pop(id(conn), None)
+            self.counters['connections_discarded'] += 1
+            self._cond.notify()
+        self._close(conn)
+
+    def _close(self, conn):
+        """Close a connection, ignoring errors from broken ones"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _count(self, name):
+        """Increment a counter"""
+        with self._cond:
+            self.counters[name] += 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    """
+    Return the pool of a database alias, creating it on first use
+
+    Pools are per process, so workers forked after the pool was created
+    start with an empty pool instead of sharing the parent's sockets.
+    """
+    key = (os.getpid(), alias)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 10),
+                max_lifetime=options.get('MAX_LIFETIME'),
+                check_interval=options.get('CHECK_INTERVAL', 30),
+            )
+        return _pools[key]
+
+
+def all_pools():
+    """Return the pools of this process by database alias"""
+    pid = os.getpid()
+    with _pools_lock:
+        return {alias: pool for (owner, alias), pool in _pools.items()
+                if owner == pid}
@@ -0,0 +1,191 @@
+"""
+Measure latency and throughput of the API endpoints under load
+"""
+import json
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from core import benchmark
+from core.models import Recepie, Tag
+
+
+def summarize(result):
+    """Return the statistics of a LoadResult"""
+    count = len(result.latencies)
+
+    def milliseconds(percent):
+        value = benchmark.percentile(result.latencies, percent)
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        'requests': count,
+        'errors': result.errors,
+        'requests_per_second': round(count / result.elapsed, 1),
+        'p50_ms': milliseconds(50),
+        'p95_ms': milliseconds(95),
+        'p99_ms': milliseconds(99),
+        'queries_per_request': (round(sum(result.queries) / count, 2)
+                                if count else None),
+    }
+
+
+def change(value, baseline):
+    """Format the relative change of a value from its baseline"""
+    if not value or not baseline:
+        return 'n/a'
+    return f'{(value - baseline) / baseline * 100:+.1f}%'
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the API endpoints"""
+    help = ('Drive the recepie list, detail, create and update, tag list and '
+            'token endpoints as the users of seed_benchmark_data from '
+            '--threads threads for --duration seconds each and report the '
+            'p50/p95/p99 latency, requests/sec and queries per request as '
+            'JSON. Recepies created by the run are deleted afterwards.')
+
+    SCENARIOS = ('list', 'detail', 'create', 'update', 'tags', 'token')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', choices=self.SCENARIOS,
+                            default=list(self.SCENARIOS))
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Seconds to run each scenario for')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the random choice of users and '
+                                 'recepies')
+        parser.add_argument('--label', default='',
+                            help='Recorded in the results, such as the '
+                                 'commit being measured')
+        parser.add_argument('--output', default='-',
+                            help='File to write the JSON results to, - for '
+                                 'standard output')
+        parser.add_argument('--baseline',
+                            help='JSON results of an earlier run to compare '
+                                 'with')
+
+    def handle(self, *args, **options):
+        users = list(benchmark.loadtest_users())
+        if not users:
+            raise CommandError('No load test users, run '
+                               'seed_benchmark_data first')
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        self.rng = random.Random(options['seed'])
+        self.users = [
+            (user, Token.objects.get_or_create(user=user)[0].key,
+             list(Recepie.objects.filter(user=user).values_list(
+                 'id', flat=True)))
+            for user in users
+        ]
+        if not all(ids for user, token, ids in self.users):
+            raise CommandError('Every load test user needs recepies')
+        recepies = Recepie.objects.filter(user__in=users)
+        last_id = recepies.aggregate(last=Max('id'))['last']
+        data = {
+            'users': len(users),
+            'recepies': recepies.count(),
+            'tags': Tag.objects.filter(user__in=users).count(),
+        }
+        results = {}
+        try:
+            for name in options['scenarios']:
+                result = benchmark.drive(getattr(self, f'_{name}'),
+                                         options['threads'],
+                                         options['duration'])
+                results[name] = summarize(result)
+                self.stderr.write(f'{name:>8}: {results[name]}')
+        finally:
+            for recepie in recepies.filter(id__gt=last_id):
+                recepie.delete()
+
+        report = {
+            'label': options['label'],
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'threads': options['threads'],
+            'duration': options['duration'],
+            'data': data,
+            'scenarios': results,
+        }
+        self._write(report, options['output'])
+        if options['baseline']:
+            self._compare(report, options['baseline'])
+
+    def _write(self, report, output):
+        """Write the JSON report to a file or standard output"""
+        text = json.dumps(report, indent=2) + '\n'
+        if output == '-':
+            self.stdout.write(text, ending='')
+            return
+        with open(output, 'w') as results:
+            results.write(text)
+        self.stderr.write(f'Results written to {output}')
+
+    def _compare(self, report, path):
+        """Print the changes from the results of an earlier run"""
+        with open(path) as baseline:
+            previous = json.load(baseline)
+        self.stderr.write(f'Compared with {previous.get("label") or path}:')
+        for name, stats in report['scenarios'].items():
+            before = previous.get('scenarios', {}).get(name)
+            if before is None:
+                continue
+            changes = ', '.join(
+                f'{key} {change(stats[key], before.get(key))}'
+                for key in ('requests_per_second', 'p95_ms',
+                            'queries_per_request'))
+            self.stderr.write(f'{name:>8}: {changes}')
+
+    def _user(self):
+        return self.rng.choice(self.users)
+
+    def _list(self):
+        user, token, ids = self._user()
+        return benchmark.wsgi_environ(
+            'GET', reverse('recepie:recepie-list'), token)
+
+    def _detail(self):
+        user, token, ids = self._user()
+        return benchmark.wsgi_environ(
+            'GET', reverse('recepie:recepie-detail',
+                           args=[self.rng.choice(ids)]), token)
+
+    def _create(self):
+        user, token, ids = self._user()
+        body = json.dumps({
+            'title': 'Load test recepie',
+            'description': 'Created by benchmark_api',
+            'price': '5.00',
+            'time_minutes': 10,
+            'tags': [{'name': 'tag 0'}, {'name': 'load test'}],
+        }).encode()
+        return benchmark.wsgi_environ(
+            'POST', reverse('recepie:recepie-list'), token, body)
+
+    def _update(self):
+        user, token, ids = self._user()
+        body = json.dumps(
+            {'time_minutes': self.rng.randint(1, 240)}).encode()
+        return benchmark.wsgi_environ(
+            'PATCH', reverse('recepie:recepie-detail',
+                             args=[self.rng.choice(ids)]), token, body)
+
+    def _tags(self):
+        user, token, ids = self._user()
+        return benchmark.wsgi_environ(
+            'GET', reverse('recepie:tag-list'), token)
+
+    def _token(self):
+        user, token, ids = self._user()
+        body = json.dumps({'email': user.email,
+                           'password': benchmark.LOADTEST_PASSWORD}).encode()
+        return benchmark.wsgi_environ('POST', reverse('user:token'),
+                                      body=body)
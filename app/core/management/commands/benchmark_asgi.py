@@ -0,0 +1,203 @@
+"""
+Compare the concurrent slow clients one worker process sustains over WSGI
+and ASGI
+"""
+import asyncio
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from core import benchmark
+from core.models import Recepie
+
+# Server mode and URL names of the list, detail and tag list endpoints of
+# each way of serving them
+MODES = {
+    'wsgi': ('wsgi', 'recepie:recepie-list', 'recepie:recepie-detail',
+             'recepie:tag-list'),
+    'asgi-sync': ('asgi', 'recepie:recepie-list', 'recepie:recepie-detail',
+                  'recepie:tag-list'),
+    'asgi': ('asgi', 'recepie:async-recepie-list',
+             'recepie:async-recepie-detail', 'recepie:async-tag-list'),
+}
+
+
+def summarize(results, elapsed):
+    """Return the statistics of the (status, latency) results of clients"""
+    latencies = [latency for status, latency in results
+                 if status is not None and status < 400]
+
+    def milliseconds(percent):
+        value = benchmark.percentile(latencies, percent)
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        'requests': len(latencies),
+        'errors': len(results) - len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': milliseconds(50),
+        'p95_ms': milliseconds(95),
+        'p99_ms': milliseconds(99),
+    }
+
+
+class Command(BaseCommand):
+    """Django command to benchmark slow clients over WSGI and ASGI"""
+    help = ('Start one gunicorn worker process per mode: wsgi serves the '
+            'sync views from --threads threads, asgi-sync the same views '
+            'under uvicorn and asgi the async views with a pool of '
+            '--threads threads. At each level, --clients slow clients '
+            'starting one after the other send requests one at a time for '
+            '--duration seconds, each over --send-time seconds as on a '
+            'slow network, next to --fast-clients clients sending theirs at '
+            'once. The latency from the last byte sent to the whole '
+            'response and the requests/sec of both are reported as JSON, '
+            'along with the most slow clients each mode sustained without '
+            'errors while the fast clients got a p95 within --max-p95-ms.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=list(MODES),
+                            default=list(MODES))
+        parser.add_argument('--endpoint', choices=('list', 'detail', 'tags'),
+                            default='list')
+        parser.add_argument('--clients', nargs='+', type=int,
+                            default=[4, 16, 64, 256],
+                            help='Numbers of slow clients to run')
+        parser.add_argument('--fast-clients', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Seconds to run each level for')
+        parser.add_argument('--send-time', type=float, default=1.0,
+                            help='Seconds each client takes to send its '
+                                 'request')
+        parser.add_argument('--timeout', type=float, default=30,
+                            help='Seconds after which a client counts as '
+                                 'failed')
+        parser.add_argument('--max-p95-ms', type=float, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--label', default='',
+                            help='Recorded in the results, such as the '
+                                 'commit being measured')
+        parser.add_argument('--output', default='-',
+                            help='File to write the JSON results to, - for '
+                                 'standard output')
+
+    def handle(self, *args, **options):
+        users = list(benchmark.loadtest_users())
+        if not users:
+            raise CommandError('No load test users, run '
+                               'seed_benchmark_data first')
+        self.rng = random.Random(options['seed'])
+        self.users = [
+            (Token.objects.get_or_create(user=user)[0].key,
+             list(Recepie.objects.filter(user=user).values_list(
+                 'id', flat=True)))
+            for user in users
+        ]
+        if options['endpoint'] == 'detail' and \
+                not all(ids for token, ids in self.users):
+            raise CommandError('Every load test user needs recepies')
+
+        results = {}
+        for mode in options['modes']:
+            results[mode] = self._benchmark(mode, options)
+            self.stderr.write(f'{mode:>9}: sustained '
+                              f'{results[mode]["sustained_clients"]} '
+                              f'clients')
+
+        report = {
+            'label': options['label'],
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'endpoint': options['endpoint'],
+            'threads': options['threads'],
+            'duration': options['duration'],
+            'fast_clients': options['fast_clients'],
+            'send_time': options['send_time'],
+            'max_p95_ms': options['max_p95_ms'],
+            'modes': results,
+        }
+        text = json.dumps(report, indent=2) + '\n'
+        if options['output'] == '-':
+            self.stdout.write(text, ending='')
+        else:
+            with open(options['output'], 'w') as output:
+                output.write(text)
+            self.stderr.write(f'Results written to {options["output"]}')
+
+    def _benchmark(self, mode, options):
+        """Run every level of clients against a server of the mode"""
+        server_mode, *url_names = MODES[mode]
+        levels = []
+        with benchmark.serve(server_mode, options['threads']) as address:
+            # Warms the worker up, starting the pool of the async views
+            asyncio.run(self._client(address, url_names, 0, options))
+            for clients in options['clients']:
+                stats = asyncio.run(self._level(address, url_names, clients,
+                                                options))
+                levels.append(stats)
+                self.stderr.write(f'{mode:>9}: {stats}')
+        sustained = [stats['clients'] for stats in levels
+                     if not stats['slow']['errors']
+                     and not stats['fast']['errors']
+                     and stats['fast']['p95_ms'] <= options['max_p95_ms']]
+        return {
+            'levels': levels,
+            'sustained_clients': max(sustained, default=0),
+        }
+
+    async def _level(self, address, url_names, clients, options):
+        """Run a level of slow clients along with the fast ones"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + options['duration']
+        slow, fast = [], []
+
+        async def client(results, send_time, delay):
+            await asyncio.sleep(delay)
+            while loop.time() < deadline:
+                results.append(await self._client(address, url_names,
+                                                  send_time, options))
+
+        # The slow clients are spread over the time to send a request
+        await asyncio.gather(
+            *(client(slow, options['send_time'],
+                     index / clients * options['send_time'])
+              for index in range(clients)),
+            *(client(fast, 0, 0) for _ in range(options['fast_clients'])))
+        elapsed = loop.time() - started
+        return {
+            'clients': clients,
+            'slow': summarize(slow, elapsed),
+            'fast': summarize(fast, elapsed),
+        }
+
+    async def _client(self, address, url_names, send_time, options):
+        """
+        Send a request and return its status and latency, or Nones when it
+        failed
+        """
+        host, port = address
+        token, path = self._request(url_names, options['endpoint'])
+        try:
+            return await asyncio.wait_for(
+                benchmark.slow_request(
+                    host, port, benchmark.http_request(host, port, path,
+                                                       token),
+                    send_time),
+                options['timeout'])
+        except (OSError, ValueError, IndexError, asyncio.TimeoutError):
+            return None, None
+
+    def _request(self, url_names, endpoint):
+        """Return the token and path of a request to the endpoint"""
+        list_name, detail_name, tags_name = url_names
+        token, ids = self.rng.choice(self.users)
+        if endpoint == 'detail':
+            return token, reverse(detail_name, args=[self.rng.choice(ids)])
+        return token, reverse(tags_name if endpoint == 'tags' else list_name)
@@ -0,0 +1,74 @@
+"""
+Compare API throughput with different database connection handling
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from rest_framework.authtoken.models import Token
+
+from core import benchmark
+from core.db.pool import all_pools
+
+# CONN_MAX_AGE and pooling of each mode
+MODES = {
+    'new': (0, False),
+    'persistent': (60, False),
+    'pool': (0, True),
+}
+
+
+class Command(BaseCommand):
+    """Django command to measure requests/sec per connection mode"""
+    help = ('Drive the recepie list endpoint from several threads, opening '
+            'a connection per request, keeping persistent connections and '
+            'using the connection pool, and report requests/sec for each.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=list(MODES),
+                            default=list(MODES))
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Seconds to run each mode for')
+        parser.add_argument('--recepies', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write(self.style.WARNING(
+                'Connection handling only differs on PostgreSQL, results '
+                f'on {connection.vendor} are not meaningful'))
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        settings_dict = connections.databases[DEFAULT_DB_ALIAS]
+        original = (settings_dict['CONN_MAX_AGE'],
+                    settings_dict.get('POOL'))
+        user, = benchmark.create_benchmark_users(1)
+        try:
+            benchmark.seed_recepies(user, options['recepies'])
+            token = Token.objects.create(user=user).key
+            connections.close_all()
+            for mode in options['modes']:
+                max_age, pooled = MODES[mode]
+                settings_dict['CONN_MAX_AGE'] = max_age
+                settings_dict['POOL'] = dict(original[1] or {},
+                                             ENABLED=pooled)
+                self._run(mode, token, options)
+        finally:
+            settings_dict['CONN_MAX_AGE'], settings_dict['POOL'] = original
+            for pool in all_pools().values():
+                pool.close()
+            user.delete()
+
+    def _run(self, mode, token, options):
+        """Drive requests in one mode and print the results"""
+        result = benchmark.drive(
+            lambda: benchmark.wsgi_environ('GET', '/api/recepie/recepie/',
+                                           token),
+            options['threads'], options['duration'])
+        p50 = benchmark.percentile(result.latencies, 50) * 1000
+        p99 = benchmark.percentile(result.latencies, 99) * 1000
+        self.stdout.write(
+            f'{mode:>10}: '
+            f'{len(result.latencies) / result.elapsed:8.1f} req/s, '
+            f'p50 {p50:.2f} ms, p99 {p99:.2f} ms, {result.errors} errors')
+        if MODES[mode][1]:
+            for alias, pool in all_pools().items():
+                self.stdout.write(f'{"":>12}pool {alias}: {pool.stats()}')
@@ -0,0 +1,90 @@
+"""
+Show the query plans of the per-user access patterns on seeded data
+"""
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import benchmark
+from core.models import Recepie, Tag
+from recepie.filters import filter_recepies
+
+# Index names in PostgreSQL ("Index Scan using <name> on") and SQLite
+# ("SEARCH ... USING INDEX <name>") plans
+INDEX_PATTERN = re.compile(r'(?:using|USING (?:COVERING )?INDEX) (\w+)')
+
+
+class Command(BaseCommand):
+    """Django command to EXPLAIN the hot API queries at scale"""
+    help = ('Seed recepies, EXPLAIN the list and tag lookup queries and '
+            'report which indexes they use. Data is rolled back unless '
+            '--keep is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recepies', type=int, default=1000000,
+                            help='Total recepies spread over the users')
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--tags', type=int, default=50,
+                            help='Tags per user')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--keep', action='store_true',
+                            help='Commit the seeded data')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = benchmark.create_benchmark_users(options['users'])
+            per_user = options['recepies'] // len(users)
+            for user in users:
+                tags = benchmark.seed_recepies(
+                    user, per_user, tag_count=options['tags'],
+                    batch_size=options['batch_size'])
+            self.stdout.write(
+                f'Seeded {per_user * len(users)} recepies for '
+                f'{len(users)} users')
+            benchmark.analyze()
+            self._report(user, tags)
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def _report(self, user, tags):
+        """Print the plan and timing of each query"""
+        recepies = Recepie.objects.filter(user=user)
+        middle = recepies.order_by('-id').values_list(
+            'id', flat=True)[recepies.count() // 2]
+        through = Recepie.tags.through
+        queries = [
+            ('recepie list, first page', recepies.order_by('-id')[:100]),
+            ('recepie list, deep cursor',
+             recepies.filter(id__lt=middle).order_by('-id')[:100]),
+            ('tag list',
+             Tag.objects.filter(user=user).order_by('-name')[:100]),
+            ('tag lookup by name',
+             Tag.objects.filter(user=user,
+                                name__in=[tag.name for tag in tags[:5]])),
+            ('recepies by tag',
+             through.objects.filter(tag_id=tags[0].id)
+             .values('recepie_id')[:100]),
+        ]
+        by_id = recepies.order_by('-id')
+        tag_ids = f'{tags[0].id},{tags[1].id}'
+        for title, params in (
+            ('filter any of two tags', {'tags': tag_ids}),
+            ('filter all of two tags',
+             {'tags': tag_ids, 'tags_match': 'all'}),
+            ('filter tag names', {'tag_names': tags[0].name}),
+            ('filter price range', {'min_price': '10', 'max_price': '10.50'}),
+            ('filter max time', {'max_time': '2'}),
+            ('filter title prefix', {'title': 'Recepie 12345'}),
+        ):
+            queries.append(
+                (title, filter_recepies(by_id, params, user)[:100]))
+        for title, queryset in queries:
+            plan = benchmark.explain(queryset)
+            elapsed = benchmark.timed(lambda: list(queryset.all()),
+                                      repeat=5)
+            indexes = ', '.join(dict.fromkeys(INDEX_PATTERN.findall(plan)))
+            used = self.style.SUCCESS(indexes) if indexes \
+                else self.style.WARNING('no index')
+            self.stdout.write(f'\n== {title}: {elapsed:.2f} ms, {used}')
+            self.stdout.write(plan)
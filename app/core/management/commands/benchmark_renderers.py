@@ -0,0 +1,49 @@
+"""
+Compare rendering a page of recepies with the stdlib and the fast renderer
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core import benchmark, renderers
+from core.models import Recepie
+from recepie.serializers import RecipieSerializer
+
+
+class Command(BaseCommand):
+    """Django command to time the JSON renderers"""
+    help = ('Seed a page of recepies, serialize it once and time rendering '
+            'it with the stdlib JSONRenderer and with FastJSONRenderer. '
+            'Data is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=3,
+                            help='Tags per recepie')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            raise CommandError('orjson is not installed')
+        with transaction.atomic():
+            user, = benchmark.create_benchmark_users(1)
+            benchmark.seed_recepies(user, options['page_size'],
+                                    tags_per_recepie=options['tags'])
+            fields = RecipieSerializer.Meta.fields
+            page = Recepie.objects.filter(user=user).order_by('-id').values(
+                *[name for name in fields if name != 'tags'])
+            data = {'results': RecipieSerializer(page, many=True).data}
+            transaction.set_rollback(True)
+
+        stdlib, fast = JSONRenderer(), renderers.FastJSONRenderer()
+        if stdlib.render(data) != fast.render(data):
+            raise CommandError('The renderers write different JSON')
+        slow = benchmark.timed(lambda: stdlib.render(data),
+                               options['repeat'])
+        quick = benchmark.timed(lambda: fast.render(data), options['repeat'])
+        self.stdout.write(f'{len(data["results"])} recepies, '
+                          f'{len(fast.render(data))} bytes, identical JSON')
+        self.stdout.write(f'JSONRenderer:     {slow:.2f} ms')
+        self.stdout.write(f'FastJSONRenderer: {quick:.2f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'Speedup: {slow / quick:.1f}x'))
@@ -0,0 +1,58 @@
+"""
+Compare rendering a page of recepies from model instances and from rows
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from core import benchmark
+from core.models import Recepie, Tag
+from recepie.serializers import RecipieSerializer
+
+
+class Command(BaseCommand):
+    """Django command to time the recepie list serializer paths"""
+    help = ('Seed a page of recepies and time loading, serializing and '
+            'rendering it through the ModelSerializer from instances and '
+            'through the values() fast path. Data is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=3,
+                            help='Tags per recepie')
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user, = benchmark.create_benchmark_users(1)
+            benchmark.seed_recepies(user, options['page_size'],
+                                    tags_per_recepie=options['tags'])
+            self._report(user, options['repeat'])
+            transaction.set_rollback(True)
+
+    def _report(self, user, repeat):
+        """Print the timing of both paths"""
+        page = Recepie.objects.filter(user=user).order_by('-id')
+        fields = [name for name in RecipieSerializer.Meta.fields
+                  if name != 'tags']
+
+        def from_instances():
+            recepies = page.only(*fields).prefetch_related(Prefetch(
+                'tags', queryset=Tag.objects.only('id', 'name')
+                .order_by('id')))
+            return JSONRenderer().render(
+                RecipieSerializer(recepies, many=True).data)
+
+        def from_rows():
+            return JSONRenderer().render(
+                RecipieSerializer(page.values(*fields), many=True).data)
+
+        if from_instances() != from_rows():
+            raise CommandError('The paths render different JSON')
+        slow = benchmark.timed(from_instances, repeat)
+        fast = benchmark.timed(from_rows, repeat)
+        self.stdout.write(f'{page.count()} recepies, identical JSON')
+        self.stdout.write(f'ModelSerializer from instances: {slow:.1f} ms')
+        self.stdout.write(f'values() fast path:             {fast:.1f} ms')
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {slow / fast:.1f}x'))
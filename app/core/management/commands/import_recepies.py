@@ -0,0 +1,221 @@
+"""
+Import recepies and their tags from NDJSON or CSV files
+"""
+import csv
+import io
+import json
+import sys
+import time
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Recepie, Tag, User
+from recepie.cache import bump_version
+
+# Separator of the tag names in the tags column of CSV files, as written by
+# the recepie export
+CSV_TAG_SEPARATOR = '|'
+
+
+def read_ndjson(lines):
+    """Yield a record per non blank line of JSON"""
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError as error:
+                raise CommandError(f'Line {number}: {error}')
+
+
+def read_csv(lines):
+    """Yield a record per CSV row, splitting the tags column"""
+    for number, row in enumerate(csv.DictReader(lines), 2):
+        tags = row.get('tags') or ''
+        row['tags'] = [name for name in tags.split(CSV_TAG_SEPARATOR)
+                       if name]
+        yield number, row
+
+
+READERS = {'ndjson': read_ndjson, 'jsonl': read_ndjson, 'csv': read_csv}
+
+
+def validate(number, instance, exclude):
+    """
+    Check the fields of an unsaved instance against the constraints of
+    its model, as the bulk inserts skip them
+    """
+    try:
+        instance.clean_fields(exclude=exclude)
+    except ValidationError as error:
+        problems = '; '.join(f'{name}: {" ".join(messages)}'
+                             for name, messages in error.message_dict.items())
+        raise CommandError(f'Line {number}: invalid '
+                           f'{instance._meta.model_name} ({problems})')
+
+
+def parse_recepie(number, record):
+    """Return the validated recepie fields and tag names of a record"""
+    try:
+        fields = {
+            'title': str(record['title']),
+            'price': Decimal(str(record['price'])),
+            'time_minutes': int(record['time_minutes']),
+            'description': str(record.get('description') or ''),
+            'link': str(record.get('link') or ''),
+        }
+    except (KeyError, TypeError, ValueError, InvalidOperation) as error:
+        raise CommandError(f'Line {number}: invalid recepie ({error!r})')
+    # Records without a description are accepted, as the export writes them
+    validate(number, Recepie(**fields), exclude=['user', 'description'])
+    names = [tag['name'] if isinstance(tag, dict) else str(tag)
+             for tag in record.get('tags') or ()]
+    names = [name for name in names if name]
+    for name in names:
+        validate(number, Tag(name=name), exclude=['user'])
+    return fields, names
+
+
+class Command(BaseCommand):
+    """Django command to bulk load recepies for a user"""
+    help = ('Import recepies with their tags for a user from NDJSON or CSV '
+            'files, such as the ones written by the export API, in batches '
+            'of bulk inserts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Owner of the imported recepies')
+        parser.add_argument('paths', nargs='+',
+                            help='Files to import, - for standard input')
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='Input format, by default taken from the '
+                                 'file extension')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Recepies written per transaction')
+        parser.add_argument('--copy', action='store_true',
+                            help='Load with COPY (PostgreSQL only)')
+
+    def handle(self, *args, **options):
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy requires PostgreSQL')
+        try:
+            self.user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user with email {options["email"]}')
+        self.tags = {}
+        self.imported = 0
+        write = self._write_copy if options['copy'] else self._write
+        started = time.monotonic()
+        try:
+            for path in options['paths']:
+                records = self._records(path, options['format'])
+                while True:
+                    batch = list(islice(records, options['batch_size']))
+                    if not batch:
+                        break
+                    with transaction.atomic():
+                        write(batch)
+                    self.imported += len(batch)
+                    self._progress(started)
+        finally:
+            bump_version(self.user.pk)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} recepies in '
+            f'{time.monotonic() - started:.1f}s'))
+
+    def _records(self, path, input_format):
+        """Yield the parsed recepies of a file"""
+        input_format = input_format or path.rsplit('.', 1)[-1].lower()
+        if input_format not in READERS:
+            raise CommandError(f'Unknown format of {path}, use --format')
+        reader = READERS[input_format]
+        if path == '-':
+            yield from self._parse(reader, sys.stdin)
+            return
+        with open(path, newline='', encoding='utf-8') as lines:
+            yield from self._parse(reader, lines)
+
+    def _parse(self, reader, lines):
+        """Yield the recepie fields and tag names read from the lines"""
+        for number, record in reader(lines):
+            yield parse_recepie(number, record)
+
+    def _progress(self, started):
+        """Print the number of imported recepies and the rate"""
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'{self.imported} recepies, '
+            f'{self.imported / max(elapsed, 1e-9):.0f} rows/s')
+
+    def _tag_ids(self, batch):
+        """Return tag ids by name, creating the batch's new tags"""
+        missing = list(dict.fromkeys(
+            name for fields, names in batch for name in names
+            if name not in self.tags))
+        if missing:
+            self.tags.update(
+                (tag.name, tag.id)
+                for tag in Tag.objects.get_or_create_many(self.user, missing))
+        return self.tags
+
+    def _count_tags(self, batch):
+        """Add the batch's recepies to the counts of their tags"""
+        Tag.objects.adjust_counts(Counter(
+            self.tags[name]
+            for fields, names in batch for name in dict.fromkeys(names)))
+
+    def _write(self, batch):
+        """Write a batch with bulk inserts"""
+        tag_ids = self._tag_ids(batch)
+        recepies = Recepie.objects.bulk_create_for_user(
+            self.user, [Recepie(**fields) for fields, names in batch])
+        through = Recepie.tags.through
+        through.objects.bulk_create(
+            [through(recepie_id=recepie.pk, tag_id=tag_ids[name])
+             for recepie, (fields, names) in zip(recepies, batch)
+             for name in dict.fromkeys(names)],
+        )
+        self._count_tags(batch)
+
+    def _write_copy(self, batch):
+        """Write a batch with COPY, taking the ids from the sequence"""
+        tag_ids = self._tag_ids(batch)
+        table = Recepie._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                'FROM generate_series(1, %s)', [table, 'id', len(batch)])
+            ids = [row[0] for row in cursor.fetchall()]
+            change_seq = User.objects.next_change_seq(self.user.pk)
+            now = timezone.now()
+            self._copy(cursor, table, (
+                'id', 'title', 'price', 'time_minutes', 'description',
+                'link', 'user_id', 'updated_at', 'change_seq',
+            ), (
+                (pk, fields['title'], fields['price'], fields['time_minutes'],
+                 fields['description'], fields['link'], self.user.pk, now,
+                 change_seq)
+                for pk, (fields, names) in zip(ids, batch)
+            ))
+            self._copy(cursor, Recepie.tags.through._meta.db_table, (
+                'recepie_id', 'tag_id',
+            ), (
+                (pk, tag_ids[name])
+                for pk, (fields, names) in zip(ids, batch)
+                for name in dict.fromkeys(names)
+            ))
+        self._count_tags(batch)
+
+    def _copy(self, cursor, table, columns, rows):
+        """Load the rows into the table's columns with COPY ... FROM STDIN"""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        quote = connection.ops.quote_name
+        cursor.copy_expert(
+            f'COPY {quote(table)} ({", ".join(map(quote, columns))}) '
+            f"FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
@@ -0,0 +1,19 @@
+"""
+Print a token allowing to profile requests
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.profiling import make_token
+
+
+class Command(BaseCommand):
+    """Django command to sign a profiling token"""
+    help = ('Print the X-Profile header profiling the requests it is sent '
+            'with, see core.profiling.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'X-Profile: {make_token()}')
+        self.stderr.write(
+            f'Valid for {settings.PROFILING["TOKEN_MAX_AGE"]} seconds. Add '
+            f'"X-Profile-Format: collapsed" for sampled stacks.')
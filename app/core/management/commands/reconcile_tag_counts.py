@@ -0,0 +1,51 @@
+"""
+Fix drift in the denormalized recepie counts of tags
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from core.models import Tag, User
+
+
+class Command(BaseCommand):
+    """Django command to recount the recepies of each tag"""
+    help = ('Compare the stored recepie count of every tag with the through '
+            'table and correct the ones that drifted. Meant to run '
+            'periodically, e.g. from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only check the tags of the user '
+                                           'with this email')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Corrected tags written per update')
+
+    def handle(self, *args, **options):
+        tags = Tag.objects.with_actual_counts()
+        if options['user']:
+            try:
+                tags = tags.filter(user=User.objects.get(
+                    email=options['user']))
+            except User.DoesNotExist:
+                raise CommandError(f'No user with email {options["user"]}')
+        drifted = tags.exclude(
+            recepie_count=F('actual_count')).values_list('id', flat=True)
+        fixed, batch = 0, []
+        for tag_id in drifted.iterator():
+            batch.append(tag_id)
+            if len(batch) >= options['batch_size']:
+                fixed += self._save(batch)
+                batch = []
+        fixed += self._save(batch)
+        self.stdout.write(self.style.SUCCESS(f'Corrected {fixed} tag counts'))
+
+    def _save(self, tag_ids):
+        """
+        Recount the tags and return how many were corrected
+
+        Counting in the update itself keeps changes made to the counts
+        since the drifted tags were found, which writing the counts read
+        then would overwrite.
+        """
+        actual = Tag.objects.actual_count()
+        return Tag.objects.filter(id__in=tag_ids).exclude(
+            recepie_count=actual).update(recepie_count=actual)
@@ -0,0 +1,49 @@
+"""
+Create the users, recepies and tags driven by benchmark_api
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.authtoken.models import Token
+
+from core import benchmark
+from core.models import Recepie, Tag
+
+
+class Command(BaseCommand):
+    """Django command to seed load test data"""
+    help = ('Create --users users, each with --recepies recepies linked to '
+            '--tags-per-recepie of their --tags tags, and an auth token. '
+            'Load test users seeded before are deleted first, so every run '
+            'of benchmark_api starts from the same data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=4)
+        parser.add_argument('--recepies', type=int, default=1000,
+                            help='Recepies per user')
+        parser.add_argument('--tags', type=int, default=50,
+                            help='Tags per user')
+        parser.add_argument('--tags-per-recepie', type=int, default=3)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        deleted = benchmark.loadtest_users().count()
+        for user in benchmark.loadtest_users():
+            user.delete()
+        for index in range(options['users']):
+            user = get_user_model().objects.create_user(
+                email=benchmark.LOADTEST_EMAIL.format(index),
+                password=benchmark.LOADTEST_PASSWORD,
+            )
+            benchmark.seed_recepies(
+                user, options['recepies'], tag_count=options['tags'],
+                tags_per_recepie=options['tags_per_recepie'])
+            Token.objects.create(user=user)
+        benchmark.analyze()
+        users = benchmark.loadtest_users()
+        self.stdout.write(self.style.SUCCESS(
+            f'Replaced {deleted} with {users.count()} load test users, '
+            f'{Recepie.objects.filter(user__in=users).count()} recepies and '
+            f'{Tag.objects.filter(user__in=users).count()} tags in '
+            f'{time.monotonic() - started:.1f}s'))
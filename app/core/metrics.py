@@ -0,0 +1,162 @@
+"""
+In-process registry of request metrics, exported in the Prometheus text
+format
+
+Every worker process keeps its own series, labelled by the resolved view
+name and method of the requests, so a scrape reports the worker that
+answered it.
+"""
+import bisect
+import threading
+
+from core.db.pool import all_pools
+from recepie import cache as response_cache
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _series(name, labels, value, extra=()):
+    """Return one sample line"""
+    pairs = list(labels) + list(extra)
+    if pairs:
+        name += '{' + ','.join(f'{key}="{_escape(label)}"'
+                               for key, label in pairs) + '}'
+    return f'{name} {value}'
+
+
+class Counter:
+    """Monotonic counts by label values"""
+    kind = 'counter'
+
+    def __init__(self, name, description, labels):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield _series(self.name, zip(self.labels, labels), value)
+
+
+class Histogram:
+    """Observations counted in cumulative buckets by label values"""
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels, buckets):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {labels: list(counts)
+                      for labels, counts in self._values.items()}
+        for labels, counts in sorted(values.items()):
+            pairs = list(zip(self.labels, labels))
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                total += count
+                yield _series(f'{self.name}_bucket', pairs, total,
+                              [('le', bound)])
+            yield _series(f'{self.name}_sum', pairs, counts[-1])
+            yield _series(f'{self.name}_count', pairs, total)
+
+
+class Registry:
+    """The metrics of the process"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, description, labels=()):
+        return self._add(Counter(name, description, labels))
+
+    def histogram(self, name, description, labels=(),
+                  buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, description, labels, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        lines.extend(_runtime_samples())
+        return '\n'.join(lines) + '\n'
+
+
+def _runtime_samples():
+    """Yield the samples of the response cache and connection pools"""
+    yield '# TYPE response_cache_requests_total counter'
+    for result, count in sorted(response_cache.stats().items()):
+        yield _series('response_cache_requests_total', [('result', result)],
+                      count)
+    pools = all_pools()
+    if pools:
+        yield '# TYPE db_pool gauge'
+    for alias, pool in sorted(pools.items()):
+        for name, value in sorted(pool.stats().items()):
+            yield _series('db_pool', [('database', alias), ('stat', name)],
+                          value)
+
+
+registry = Registry()
+
+REQUESTS = registry.counter(
+    'http_requests_total', 'Requests by view, method and status',
+    ('view', 'method', 'status'))
+LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Time spent answering requests',
+    ('view', 'method'))
+QUERIES = registry.histogram(
+    'http_request_db_queries', 'Database queries run per request',
+    ('view', 'method'), QUERY_BUCKETS)
+DB_TIME = registry.histogram(
+    'http_request_db_seconds', 'Time spent in database queries per request',
+    ('view', 'method'))
+SERIALIZE_TIME = registry.histogram(
+    'http_response_serialize_seconds',
+    'Time spent building response data with serializers, including the '
+    'queries they run',
+    ('view', 'method'))
+ENCODE_TIME = registry.histogram(
+    'http_response_encode_seconds',
+    'Time spent encoding response data into bodies, e.g. as JSON',
+    ('view', 'method'))
+RESPONSE_SIZE = registry.histogram(
+    'http_response_bytes', 'Size of response bodies as sent',
+    ('view', 'method'), SIZE_BUCKETS)
@@ -0,0 +1,408 @@
+"""
+Middleware of the API
+"""
+import asyncio
+import functools
+import logging
+import time
+import types
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from core import metrics, profiling
+from core.query_budget import (QueryBudgetExceeded, QueryLog, describe,
+                               get_query_budget)
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Methods recorded in the metrics by name, any other is recorded as other so
+# that clients cannot add label values at will
+METRIC_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE',
+                            'OPTIONS'))
+
+
+def accepted_encodings(header):
+    """Return the encodings of an Accept-Encoding header with a q > 0"""
+    accepted = set()
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+
+class _Gzip:
+    """Incremental gzip compression with the interface of brotli's"""
+
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED,
+                                           16 + zlib.MAX_WBITS)
+
+    def process(self, data):
+        return self.compressor.compress(data)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+def _compressors():
+    """Return the supported encodings with their compressor factories"""
+    options = settings.RESPONSE_COMPRESSION
+    compressors = {}
+    if brotli is not None:
+        compressors['br'] = lambda: brotli.Compressor(
+            quality=options['BROTLI_QUALITY'])
+    compressors['gzip'] = lambda: _Gzip(options['GZIP_LEVEL'])
+    return compressors
+
+
+def compress_sequence(sequence, compressor):
+    """Yield the compressed chunks of a sequence of bytes"""
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def _on_loop(hook):
+    """
+    Make a bound hook a coroutine method, which Django awaits instead of
+    running it in its thread for sync code
+    """
+    @functools.wraps(hook)
+    async def method(self, *args):
+        return hook(*args)
+    return types.MethodType(method, hook.__self__)
+
+
+class AsyncCapableMiddleware:
+    """
+    Base of the middleware below, which runs in the mode of the handler it
+    wraps. Under ASGI, a sync only middleware would have Django run the
+    rest of the chain, views included, on its single thread for sync code.
+
+    Subclasses implement handle for WSGI and handle_async for ASGI. Their
+    process_view and process_template_response hooks run on the event loop
+    under ASGI, so they must not block.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Has Django await the middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+            for name in ('process_view', 'process_template_response'):
+                hook = getattr(self, name, None)
+                if hook is not None and \
+                        not asyncio.iscoroutinefunction(hook):
+                    setattr(self, name, _on_loop(hook))
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.handle_async(request)
+        return self.handle(request)
+
+
+class CompressionMiddleware(AsyncCapableMiddleware):
+    """
+    Compress responses with brotli, when installed and accepted by the
+    client, or gzip
+
+    Responses shorter than RESPONSE_COMPRESSION['MIN_SIZE'] bytes are sent
+    as they are. Streaming responses, such as exports, are compressed as
+    they are streamed, without buffering them.
+    """
+
+    def handle(self, request):
+        return self.compress(request, self.get_response(request))
+
+    async def handle_async(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        """Return the response compressed in an accepted encoding"""
+        if response.has_header('Content-Encoding'):
+            return response
+        if (not response.streaming and len(response.content)
+                < settings.RESPONSE_COMPRESSION['MIN_SIZE']):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        for encoding, compressor in _compressors().items():
+            if encoding in accepted:
+                break
+        else:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(
+                response.streaming_content, compressor())
+            del response['Content-Length']
+        else:
+            compressor = compressor()
+            content = (compressor.process(response.content)
+                       + compressor.finish())
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        # The compressed body is no longer byte for byte the one a strong
+        # ETag validates, see RFC 7232 section 2.1
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+
+class RequestRecorder(QueryLog):
+    """
+    Database execute wrapper counting and timing the queries of a request,
+    along with the time spent serializing and encoding its response
+    """
+
+    # Statements kept for the slow request log
+    MAX_STATEMENTS = 100
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = []
+        self.serialize_seconds = 0.0
+        self.encode_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.statements) < self.MAX_STATEMENTS:
+                self.statements.append((elapsed, sql))
+
+
+def time_encoding(request, response):
+    """
+    Add the time taken to render a DRF or template response, which encodes
+    the data its view built, to the metrics of its request
+    """
+    recorder = getattr(request, '_metrics', None)
+    if recorder is not None:
+        started = time.perf_counter()
+
+        def rendered(response):
+            recorder.encode_seconds += time.perf_counter() - started
+        response.add_post_render_callback(rendered)
+
+
+def time_serialization(request, seconds):
+    """
+    Add the time a serializer took to build response data, see
+    core.serializers, to the metrics of its request, if any
+    """
+    recorder = getattr(request, '_metrics', None)
+    if recorder is not None:
+        recorder.serialize_seconds += seconds
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Record latency, queries, serialization and encoding time and size of
+    every response in core.metrics, and log requests slower than
+    METRICS['SLOW_REQUEST_MS'] with their SQL
+
+    Streaming responses are observed when their last chunk has been sent.
+    """
+
+    def handle(self, request):
+        if not settings.METRICS['ENABLED']:
+            return self.get_response(request)
+        started = time.perf_counter()
+        request._metrics = recorder = RequestRecorder()
+        with recorder.recording():
+            response = self.get_response(request)
+        return self._finish(request, response, recorder, started)
+
+    async def handle_async(self, request):
+        if not settings.METRICS['ENABLED']:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        request._metrics = recorder = RequestRecorder()
+        with recorder.recording():
+            response = await self.get_response(request)
+        return self._finish(request, response, recorder, started)
+
+    def process_template_response(self, request, response):
+        """Time the rendering of DRF and template responses"""
+        time_encoding(request, response)
+        return response
+
+    def _finish(self, request, response, recorder, started):
+        """Observe the response now, or once streamed"""
+        if response.streaming:
+            response.streaming_content = self._stream(
+                request, response, response.streaming_content, recorder,
+                started)
+        else:
+            self._observe(request, response, recorder, started,
+                          len(response.content))
+        return response
+
+    def _stream(self, request, response, content, recorder, started):
+        """Yield the chunks of a streaming response, then observe it"""
+        size = 0
+        try:
+            with recorder.recording():
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self._observe(request, response, recorder, started, size)
+
+    def _observe(self, request, response, recorder, started, size):
+        """Record the metrics of a finished response"""
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        method = request.method
+        labels = (match.view_name if match else 'unresolved',
+                  method if method in METRIC_METHODS else 'other')
+        metrics.REQUESTS.inc(labels + (str(response.status_code),))
+        metrics.LATENCY.observe(labels, elapsed)
+        metrics.QUERIES.observe(labels, recorder.count)
+        metrics.DB_TIME.observe(labels, recorder.seconds)
+        metrics.SERIALIZE_TIME.observe(labels, recorder.serialize_seconds)
+        metrics.ENCODE_TIME.observe(labels, recorder.encode_seconds)
+        metrics.RESPONSE_SIZE.observe(labels, size)
+        slow = settings.METRICS['SLOW_REQUEST_MS']
+        if slow and elapsed * 1000 >= slow:
+            logger.warning(
+                'Slow request %s %s: %.0f ms, %d queries in %.0f ms\n%s',
+                request.method, request.get_full_path(), elapsed * 1000,
+                recorder.count, recorder.seconds * 1000,
+                '\n'.join(f'{seconds * 1000:.1f} ms {sql}'
+                          for seconds, sql in recorder.statements))
+
+
+class QueryBudgetMiddleware(AsyncCapableMiddleware):
+    """
+    Check requests against the query budget of their view when
+    QUERY_BUDGET['ENABLED'], raising QueryBudgetExceeded when
+    QUERY_BUDGET['RAISE'] and logging a warning otherwise
+
+    Queries run while a streaming response is sent are not counted.
+    """
+
+    def handle(self, request):
+        if not settings.QUERY_BUDGET['ENABLED']:
+            return self.get_response(request)
+        log = QueryLog()
+        with log.recording():
+            response = self.get_response(request)
+        self._check(request, log)
+        return response
+
+    async def handle_async(self, request):
+        if not settings.QUERY_BUDGET['ENABLED']:
+            return await self.get_response(request)
+        log = QueryLog()
+        with log.recording():
+            response = await self.get_response(request)
+        self._check(request, log)
+        return response
+
+    def _check(self, request, log):
+        """Report a request that went over its budget"""
+        budget = getattr(request, '_query_budget', None)
+        if budget is not None and len(log.statements) > budget:
+            message = describe(f'{request.method} {request.path}',
+                               log.statements, budget)
+            if settings.QUERY_BUDGET['RAISE']:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if settings.QUERY_BUDGET['ENABLED']:
+            request._query_budget = get_query_budget(view_func,
+                                                     request.method)
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """
+    Profile the requests asking for it, see core.profiling, and return the
+    id of the stored profile in the X-Profile-Id header
+
+    Under ASGI the profiler follows the view to its thread: sync views are
+    run profiled by process_view, async views enter it themselves, see
+    core.profiling.profiled. Streaming responses are profiled until the
+    view returns them.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if self.is_async:
+            self.process_view = self._run_profiled
+
+    def handle(self, request):
+        profile_format = profiling.requested_format(request)
+        if profile_format is None:
+            return self.get_response(request)
+        started = time.perf_counter()
+        with profiling.PROFILERS[profile_format]() as profiler:
+            response = self.get_response(request)
+        return self._store(profiler, profile_format, request, response,
+                           started)
+
+    async def handle_async(self, request):
+        profile_format = None
+        if profiling.asked(request):
+            # Checking a staff user may query the session and user
+            profile_format = await sync_to_async(
+                profiling.requested_format)(request)
+        if profile_format is None:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        profiler = profiling.PROFILERS[profile_format]()
+        with profiling.deferred(profiler):
+            response = await self.get_response(request)
+        return await sync_to_async(self._store)(
+            profiler, profile_format, request, response, started)
+
+    async def _run_profiled(self, request, view_func, view_args,
+                            view_kwargs):
+        """Run a sync view of a profiled request in the thread for sync code"""
+        if profiling.deferred_profiler() is None or \
+                asyncio.iscoroutinefunction(view_func):
+            return None
+        return await sync_to_async(profiling.profiled(view_func))(
+            request, *view_args, **view_kwargs)
+
+    def _store(self, profiler, profile_format, request, response, started):
+        record = profiling.store(profiler, profile_format, request, response,
+                                 time.perf_counter() - started)
+        response['X-Profile-Id'] = str(record.pk)
+        return response
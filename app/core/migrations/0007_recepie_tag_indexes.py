@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:26
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """Point recepies at the oldest of each user's same-named tags"""
+    Tag = apps.get_model('core', 'Tag')
+    Through = apps.get_model('core', 'Recepie').tags.through
+    duplicates = (Tag.objects.values('user', 'name')
+                  .annotate(keep=Min('id'), total=Count('id'))
+                  .filter(total__gt=1))
+    for duplicate in duplicates:
+        others = Tag.objects.filter(
+            user=duplicate['user'], name=duplicate['name'],
+        ).exclude(id=duplicate['keep'])
+        links = Through.objects.filter(tag__in=others)
+        tagged = Through.objects.filter(tag_id=duplicate['keep'])
+        Through.objects.bulk_create(
+            [Through(recepie_id=recepie_id, tag_id=duplicate['keep'])
+             for recepie_id in links.exclude(
+                 recepie__in=tagged.values('recepie')
+             ).values_list('recepie_id', flat=True).distinct()],
+        )
+        others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recepie_tag'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recepie',
+            index=models.Index(fields=['user', '-id'], name='recepie_user_id_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_user_tag_name'),
+        ),
+        # The auto-created through table only has a (recepie_id, tag_id)
+        # unique index, add the reverse one for lookups starting from tags
+        migrations.RunSQL(
+            'CREATE INDEX core_recepie_tags_tag_recepie_idx '
+            'ON core_recepie_tags (tag_id, recepie_id)',
+            'DROP INDEX core_recepie_tags_tag_recepie_idx',
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_change_seq'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recepie',
+            index=models.Index(fields=['user', 'price'], name='recepie_user_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recepie',
+            index=models.Index(fields=['user', 'time_minutes'], name='recepie_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recepie',
+            index=models.Index(fields=['user', 'title'], name='recepie_user_title_idx', opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ),
+    ]
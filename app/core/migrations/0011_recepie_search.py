@@ -0,0 +1,61 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:49
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Title words rank above description words, the configuration has to match
+# recepie.search.SEARCH_CONFIG
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce({row}title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce({row}description, '')), 'B')"
+)
+
+CREATE_SEARCH = [
+    '''
+    CREATE FUNCTION core_recepie_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {vector};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    '''.format(vector=SEARCH_VECTOR.format(row='NEW.')),
+    'CREATE TRIGGER core_recepie_search_vector_trigger '
+    'BEFORE INSERT OR UPDATE OF title, description ON core_recepie '
+    'FOR EACH ROW EXECUTE PROCEDURE core_recepie_search_vector_update()',
+    'UPDATE core_recepie SET search_vector = {vector}'.format(
+        vector=SEARCH_VECTOR.format(row='')),
+    'CREATE INDEX core_recepie_search_idx ON core_recepie '
+    'USING gin (search_vector)',
+]
+
+DROP_SEARCH = [
+    'DROP INDEX core_recepie_search_idx',
+    'DROP TRIGGER core_recepie_search_vector_trigger ON core_recepie',
+    'DROP FUNCTION core_recepie_search_vector_update()',
+]
+
+
+def run_on_postgresql(statements):
+    """Return a migration function running the statements on PostgreSQL"""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recepie_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recepie',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(run_on_postgresql(CREATE_SEARCH),
+                             run_on_postgresql(DROP_SEARCH)),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:51
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_recepies(apps, schema_editor):
+    """Set the recepie count of existing tags"""
+    Tag = apps.get_model('core', 'Tag')
+    Through = apps.get_model('core', 'Recepie').tags.through
+    Tag.objects.update(recepie_count=Coalesce(Subquery(
+        Through.objects.filter(tag_id=OuterRef('pk')).order_by()
+        .values('tag_id').annotate(total=Count('id')).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recepie_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='recepie_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_recepies, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recepie_count', '-id'], name='tag_user_usage_idx'),
+        ),
+    ]
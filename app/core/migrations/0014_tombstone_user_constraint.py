@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def delete_orphans(apps, schema_editor):
+    """Delete the tombstones left behind by deleted users"""
+    Tombstone = apps.get_model('core', 'Tombstone')
+    User = apps.get_model('core', 'User')
+    Tombstone.objects.exclude(user_id__in=User.objects.values('id')).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_profilerecord'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_orphans, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
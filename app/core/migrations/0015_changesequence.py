@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_sequences(apps, schema_editor):
+    """Move the change sequence of existing users to their own rows"""
+    User = apps.get_model('core', 'User')
+    ChangeSequence = apps.get_model('core', 'ChangeSequence')
+    ChangeSequence.objects.bulk_create(
+        ChangeSequence(user_id=user_id, value=value)
+        for user_id, value in User.objects.filter(
+            change_seq__gt=0).values_list('id', 'change_seq').iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_tombstone_user_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(copy_sequences, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='user',
+            name='change_seq',
+        ),
+    ]
@@ -1,10 +1,50 @@
-from django.db import models # noqa
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections, models # noqa
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
     PermissionsMixin
 
 
+# Ids of the users being deleted, whose recepies and tags go with them
+_deleting_users = ContextVar('deleting_users', default=frozenset())
+
+
+@contextmanager
+def deleting_users(user_ids):
+    """Mark the users as being deleted while the block runs"""
+    token = _deleting_users.set(_deleting_users.get() | set(user_ids))
+    try:
+        yield
+    finally:
+        _deleting_users.reset(token)
+
+
+def deleted_with_user(instance):
+    """
+    Whether a row is deleted along with its user, which leaves no one to
+    sync it to and no count or sequence to keep
+    """
+    return instance.user_id in _deleting_users.get()
+
+
+class UserQuerySet(models.QuerySet):
+    """Queryset of users"""
+    def delete(self):
+        """Delete the users, see deleted_with_user"""
+        with deleting_users(self.values_list('pk', flat=True)):
+            return super().delete()
+
+
 class UserManager(BaseUserManager):
     """Manager for user model"""
+    def get_queryset(self):
+        return UserQuerySet(self.model, using=self._db)
+
     def create_user(self, email, password=None, **extra_fields):
         """Create and save a new user"""
         if not email:
@@ -22,6 +62,35 @@ class UserManager(BaseUserManager):
         user.save(using=self._db) # noqa
         return user
 
+    def next_change_seq(self, user_id):
+        """
+        Advance the user's change sequence and return the new value, or 0
+        when the user does not exist
+
+        The sequence row stays locked until the surrounding transaction
+        ends, so each user's changes commit in sequence order.
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table = quote(ChangeSequence._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {table} ({user}, {value}) '
+                'SELECT {pk}, 1 FROM {users} WHERE {pk} = %s '
+                'ON CONFLICT ({user}) DO UPDATE '
+                'SET {value} = {table}.{value} + 1 '
+                'RETURNING {value}'.format(
+                    table=table,
+                    user=quote('user_id'),
+                    value=quote('value'),
+                    users=quote(self.model._meta.db_table),
+                    pk=quote(self.model._meta.pk.column),
+                ),
+                [user_id],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else 0
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     """Custom user model that supports using email instead of username"""
@@ -34,6 +103,52 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = 'email'
 
+    def delete(self, *args, **kwargs):
+        """Delete the user, see deleted_with_user"""
+        with deleting_users([self.pk]):
+            return super().delete(*args, **kwargs)
+
+
+class ChangeSequence(models.Model):
+    """
+    Last change sequence number given to a user's recepies, tags and
+    tombstones, advanced by UserManager.next_change_seq
+
+    Kept apart from the user row, which saving a user would write back
+    with whatever value it was loaded with.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    value = models.BigIntegerField(default=0)
+
+
+class RecepieManager(models.Manager):
+    """Manager for recepie model"""
+    def bulk_create_for_user(self, user, recepies, batch_size=None):
+        """
+        Insert the user's new recepies under one change sequence number and
+        set their ids, also on backends not returning them from inserts
+        """
+        if not recepies:
+            return recepies
+        change_seq = User.objects.next_change_seq(user.pk)
+        for recepie in recepies:
+            recepie.user = user
+            recepie.change_seq = change_seq
+        self.bulk_create(recepies, batch_size=batch_size)
+        if recepies[0].pk is None:
+            # The fresh sequence number marks exactly the rows just added,
+            # the row lock on the user keeps others from using it
+            ids = self.filter(user=user, change_seq=change_seq).order_by(
+                'id').values_list('id', flat=True)
+            for recepie, pk in zip(recepies, ids):
+                recepie.pk = pk
+                recepie._state.adding = False
+        return recepies
+
 
 class Recepie(models.Model):
     """Recepie object"""
@@ -47,11 +162,88 @@ class Recepie(models.Model):
         on_delete=models.CASCADE,
     )
     tags = models.ManyToManyField('Tag')
+    updated_at = models.DateTimeField(auto_now=True)
+    change_seq = models.BigIntegerField(default=0)
+    # Weighted title and description lexemes, kept up to date by a
+    # PostgreSQL trigger and left empty on other databases
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecepieManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='recepie_user_id_idx'),
+            models.Index(fields=['user', 'updated_at'],
+                         name='recepie_user_updated_idx'),
+            models.Index(fields=['user', 'change_seq'],
+                         name='recepie_user_seq_idx'),
+            models.Index(fields=['user', 'price'],
+                         name='recepie_user_price_idx'),
+            models.Index(fields=['user', 'time_minutes'],
+                         name='recepie_user_time_idx'),
+            # Pattern operators let PostgreSQL use the index for prefix
+            # matches whatever the database collation
+            models.Index(fields=['user', 'title'],
+                         name='recepie_user_title_idx',
+                         opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class TagManager(models.Manager):
+    """Manager for tag model"""
+    def get_or_create_many(self, user, names):
+        """
+        Return the user's tags for the given names in order, creating the
+        missing ones with a single insert
+        """
+        names = list(dict.fromkeys(names))
+        tags = {tag.name: tag
+                for tag in self.filter(user=user, name__in=names)}
+        missing = [name for name in names if name not in tags]
+        if missing:
+            change_seq = User.objects.next_change_seq(user.pk)
+            # Rows created by a concurrent request are skipped by the insert
+            # and picked up by the lookup that follows it
+            self.bulk_create(
+                [self.model(user=user, name=name, change_seq=change_seq)
+                 for name in missing],
+                ignore_conflicts=True,
+            )
+            tags.update(
+                (tag.name, tag)
+                for tag in self.filter(user=user, name__in=missing)
+            )
+        return [tags[name] for name in names]
+
+    def adjust_counts(self, deltas):
+        """
+        Add the deltas, a mapping of tag id to change, to the tags' recepie
+        counts with one update per distinct change
+        """
+        by_delta = defaultdict(list)
+        for tag_id, delta in deltas.items():
+            if delta:
+                by_delta[delta].append(tag_id)
+        for delta, tag_ids in by_delta.items():
+            self.filter(id__in=tag_ids).update(
+                recepie_count=F('recepie_count') + delta)
+
+    def actual_count(self):
+        """Return an expression counting the recepies linked to a tag"""
+        through = Recepie.tags.through
+        return Coalesce(Subquery(
+            through.objects.filter(tag_id=OuterRef('pk')).order_by()
+            .values('tag_id').annotate(total=Count('id')).values('total')
+        ), 0)
+
+    def with_actual_counts(self):
+        """Annotate the number of recepies linked to each tag"""
+        return self.annotate(actual_count=self.actual_count())
+
+
 class Tag(models.Model):
     """Tag object"""
     name = models.CharField(max_length=255)
@@ -59,6 +251,103 @@ class Tag(models.Model):
         User,
         on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    change_seq = models.BigIntegerField(default=0)
+    # Number of recepies using the tag, adjusted on every link write and
+    # reconciled by the reconcile_tag_counts command
+    recepie_count = models.IntegerField(default=0)
+
+    objects = TagManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'],
+                                    name='unique_user_tag_name'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'updated_at'],
+                         name='tag_user_updated_idx'),
+            models.Index(fields=['user', 'change_seq'],
+                         name='tag_user_seq_idx'),
+            models.Index(fields=['user', '-recepie_count', '-id'],
+                         name='tag_user_usage_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class TombstoneManager(models.Manager):
+    """Manager for tombstone model"""
+    def record(self, user_id, kind, object_ids):
+        """Record the deletion of the user's objects of a kind"""
+        change_seq = User.objects.next_change_seq(user_id)
+        return self.bulk_create([
+            self.model(user_id=user_id, kind=kind, object_id=object_id,
+                       change_seq=change_seq)
+            for object_id in object_ids
+        ])
+
+
+class Tombstone(models.Model):
+    """Record of a deleted recepie or tag for delta sync clients"""
+    KIND_RECEPIE = 'recepie'
+    KIND_TAG = 'tag'
+    KIND_CHOICES = (
+        (KIND_RECEPIE, 'Recepie'),
+        (KIND_TAG, 'Tag'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+    )
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TombstoneManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'change_seq'],
+                         name='tombstone_user_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
+
+
+class ProfileRecordManager(models.Manager):
+    """Manager for profile record model"""
+    def trim(self, keep):
+        """Delete all but the newest keep profiles along with their files"""
+        stale = self.order_by('-id').values_list('id', flat=True)[keep:]
+        # The post_delete signal removes the files of the deleted records
+        self.filter(id__in=list(stale)).delete()
+
+
+class ProfileRecord(models.Model):
+    """Profile of a request, stored as a file in PROFILING['DIR']"""
+    FORMAT_PSTATS = 'pstats'
+    FORMAT_COLLAPSED = 'collapsed'
+    FORMAT_CHOICES = (
+        (FORMAT_PSTATS, 'cProfile pstats'),
+        (FORMAT_COLLAPSED, 'Sampled collapsed stacks'),
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2048)
+    view_name = models.CharField(max_length=255, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    format = models.CharField(max_length=16, choices=FORMAT_CHOICES)
+    file_name = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+
+    objects = ProfileRecordManager()
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
@@ -0,0 +1,196 @@
+"""
+Opt-in profiling of live requests
+
+A request is profiled when it carries an X-Profile header holding a token
+signed with the SECRET_KEY, as printed by the profile_token command, or
+when a staff user logged in to the admin adds ?profile=1 to the URL. The
+profile is a cProfile pstats dump, or the stacks of the request's thread
+sampled every PROFILING['SAMPLE_INTERVAL'] seconds in the collapsed format
+of flame graph tools when collapsed is asked for with the X-Profile-Format
+header or ?profile=collapsed. Files are written to PROFILING['DIR'], which
+keeps the newest PROFILING['MAX_FILES'] of them, and are downloaded from
+the admin.
+
+Under ASGI the work of a request is done in another thread than the one of
+its middleware, so the profiler is deferred to the thread running its
+view, see profiled.
+"""
+import cProfile
+import functools
+import sys
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+from core.models import ProfileRecord
+
+SIGNING_SALT = 'core.profiling'
+TOKEN_VALUE = 'profile'
+
+# Profiler of the current request, entered by the thread running its view
+_deferred = ContextVar('deferred_profiler', default=None)
+
+
+def make_token():
+    """Return a signed token allowing to profile requests"""
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign(TOKEN_VALUE)
+
+
+def valid_token(token, max_age):
+    """Whether the token was signed by make_token at most max_age ago"""
+    try:
+        return signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+            token, max_age=max_age) == TOKEN_VALUE
+    except signing.BadSignature:
+        return False
+
+
+def asked(request):
+    """Whether the request asks to be profiled, allowed to or not"""
+    return (settings.PROFILING['ENABLED']
+            and ('HTTP_X_PROFILE' in request.META or 'profile' in request.GET))
+
+
+def requested_format(request):
+    """Return the format of the profile asked for or None"""
+    options = settings.PROFILING
+    if not options['ENABLED']:
+        return None
+    token = request.META.get('HTTP_X_PROFILE')
+    if token:
+        if not valid_token(token, options['TOKEN_MAX_AGE']):
+            return None
+        profile = request.META.get('HTTP_X_PROFILE_FORMAT', '1')
+    else:
+        profile = request.GET.get('profile')
+        if not profile or not request.user.is_staff:
+            return None
+    profile = ProfileRecord.FORMAT_PSTATS if profile == '1' else profile
+    return profile if profile in PROFILERS else None
+
+
+class CProfiler:
+    """Deterministic profile of every call made by the request"""
+    extension = 'prof'
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+
+class SamplingProfiler:
+    """
+    Stacks of the request's thread sampled by a background thread, which
+    slows the request down less than cProfile
+    """
+    extension = 'txt'
+
+    def __init__(self):
+        self.interval = settings.PROFILING['SAMPLE_INTERVAL']
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._sampler.join()
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({code.co_filename}:'
+                             f'{code.co_firstlineno})')
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def write(self, path):
+        with open(path, 'w') as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f'{stack} {count}\n')
+
+
+PROFILERS = {
+    ProfileRecord.FORMAT_PSTATS: CProfiler,
+    ProfileRecord.FORMAT_COLLAPSED: SamplingProfiler,
+}
+
+
+@contextmanager
+def deferred(profiler):
+    """Defer the profiler to the thread running the view of the request"""
+    token = _deferred.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _deferred.reset(token)
+
+
+def deferred_profiler():
+    """Return the profiler deferred in the current context, or None"""
+    return _deferred.get()
+
+
+def profiled(func):
+    """
+    Wrap a function run in a thread for a request, entering the profiler
+    deferred for the request if any
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _deferred.get()
+        if profiler is None:
+            return func(*args, **kwargs)
+        with profiler:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def profile_path(record):
+    """Return the path of the file of a profile record"""
+    return Path(settings.PROFILING['DIR']) / record.file_name
+
+
+def store(profiler, profile_format, request, response, elapsed):
+    """Write the profile of a request and drop the oldest ones"""
+    options = settings.PROFILING
+    directory = Path(options['DIR'])
+    directory.mkdir(parents=True, exist_ok=True)
+    file_name = f'{uuid.uuid4().hex}.{profiler.extension}'
+    profiler.write(directory / file_name)
+    match = request.resolver_match
+    record = ProfileRecord.objects.create(
+        method=request.method,
+        path=request.get_full_path()[:2048],
+        view_name=match.view_name if match else '',
+        status_code=response.status_code,
+        duration_ms=elapsed * 1000,
+        format=profile_format,
+        file_name=file_name,
+        size=(directory / file_name).stat().st_size,
+    )
+    ProfileRecord.objects.trim(options['MAX_FILES'])
+    return record
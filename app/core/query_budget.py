@@ -0,0 +1,135 @@
+"""
+Query budgets of API views
+
+A budget is the most queries a request to a view may run whatever the
+amount of data involved, so a missing prefetch or a query per row shows up
+as soon as a test or a development request goes over it. Views declare it
+with a query_budget attribute, either a number or a mapping of viewset
+action or lowercase HTTP method to a number, or with the query_budget
+decorator on function views and viewset actions.
+
+Queries are recorded by an execute wrapper installed on every connection,
+which passes them to the logs recording in the current context. As the
+context follows the work handed to threads by sync_to_async and the async
+views, so do the logs.
+"""
+import functools
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.test.utils import override_settings
+
+# Query logs recording in the current context, outermost first
+_recording = ContextVar('query_logs', default=())
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request or block of code ran more queries than its budget"""
+
+
+def query_budget(budget):
+    """Decorator setting the query budget of a view or viewset action"""
+    def decorator(view):
+        view.query_budget = budget
+        return view
+    return decorator
+
+
+def _pick(budget, key):
+    if isinstance(budget, dict):
+        return budget.get(key)
+    return budget
+
+
+def get_query_budget(view_func, method):
+    """
+    Return the budget of a resolved view for an HTTP method, or None
+    """
+    method = method.lower()
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return _pick(getattr(view_func, 'query_budget', None), method)
+    action = (getattr(view_func, 'actions', None) or {}).get(method, method)
+    budget = getattr(getattr(cls, action, None), 'query_budget', None)
+    if budget is None:
+        budget = _pick(getattr(cls, 'query_budget', None), action)
+    return budget
+
+
+def _execute(execute, sql, params, many, context):
+    """Execute wrapper passing queries through the recording logs"""
+    for log in reversed(_recording.get()):
+        execute = functools.partial(log, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection):
+    """Record the queries of a connection, see QueryLog.recording"""
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+class QueryLog:
+    """Database execute wrapper collecting the SQL of the queries run"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append(sql)
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def recording(self):
+        """
+        Return a context recording the queries run in it, in this thread
+        or in the threads it hands work to
+        """
+        token = _recording.set(_recording.get() + (self,))
+        try:
+            yield self
+        finally:
+            _recording.reset(token)
+
+
+def describe(label, statements, budget):
+    """
+    Describe queries over a budget, listing the repeated statements first
+    as they usually are the ones to batch or prefetch
+    """
+    lines = [f'{label} ran {len(statements)} queries, over its budget of '
+             f'{budget}']
+    counts = Counter(statements).most_common()
+    repeated = [(sql, count) for sql, count in counts if count > 1]
+    if repeated:
+        lines.append('Repeated queries:')
+        lines.extend(f'  {count}x {sql}' for sql, count in repeated)
+    lines.append('Queries:')
+    lines.extend(f'  {sql}' for sql in statements)
+    return '\n'.join(lines)
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin failing requests that go over the budget of their view
+    and asserting blocks of code stay within a query budget
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        enforced = override_settings(
+            QUERY_BUDGET={'ENABLED': True, 'RAISE': True})
+        enforced.enable()
+        cls.addClassCleanup(enforced.disable)
+
+    @contextmanager
+    def assertMaxQueries(self, budget):
+        """Fail if the block runs more than budget queries"""
+        log = QueryLog()
+        with log.recording():
+            yield log
+        if len(log.statements) > budget:
+            raise self.failureException(
+                describe('The block', log.statements, budget))
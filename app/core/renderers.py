@@ -0,0 +1,47 @@
+"""
+JSON renderer encoding with orjson when it is installed
+
+The output is the one of DRF's JSONRenderer with the default compact,
+unicode and strict settings. Types orjson does not encode the same way,
+such as dates, decimals and lazy translations, go through DRF's encoder, and
+data orjson refuses, such as integers beyond 64 bits, through the stdlib.
+Only floats differ: exponents are written as 1e16 rather than 1e+16 and
+infinities and NaN as null rather than refused.
+Requests for indented JSON and installs without orjson use the stdlib.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# U+2028 and U+2029 in UTF-8, escaped by JSONRenderer so that the JSON is
+# also valid JavaScript
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'),
+                   (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding with orjson, falling back to the stdlib"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (orjson is None or self.encoder_class is not JSONEncoder
+                or not self.compact or not self.strict or self.ensure_ascii
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        try:
+            ret = orjson.dumps(data, default=JSONEncoder().default, option=(
+                orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME))
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
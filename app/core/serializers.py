@@ -0,0 +1,34 @@
+"""
+Serializer bases timing how long building the data of API responses takes
+
+Serializers turning models into data run inside the view, before the
+renderer encodes it, and are often the largest part of a list request. The
+time spent in their data property is added to the metrics of the request in
+their context, see core.middleware.MetricsMiddleware.
+"""
+import time
+
+from rest_framework import serializers
+
+from core.middleware import time_serialization
+
+
+class TimedDataMixin:
+    """
+    Record the time spent building the data of the serializer. Serializers
+    used with many=True also set TimedListSerializer as their Meta's
+    list_serializer_class.
+    """
+
+    @property
+    def data(self):
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            time_serialization(self.context.get('request'),
+                               time.perf_counter() - started)
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    """List serializer recording the time spent building its data"""
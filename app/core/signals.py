@@ -0,0 +1,111 @@
+"""
+Signal handlers keeping the change sequence used by delta sync and the
+recepie counts of tags current, removing the files of deleted profiles and
+recording the queries of new connections
+"""
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, pre_delete, \
+    pre_save
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import ProfileRecord, Recepie, Tag, Tombstone, User, \
+    deleted_with_user
+from core.profiling import profile_path
+from core.query_budget import install
+
+
+@receiver(pre_save, sender=Recepie)
+@receiver(pre_save, sender=Tag)
+def stamp_change_seq(sender, instance, **kwargs):
+    """Give a saved recepie or tag the owner's next sequence number"""
+    instance.change_seq = User.objects.next_change_seq(instance.user_id)
+
+
+@receiver(post_delete, sender=Recepie)
+@receiver(post_delete, sender=Tag)
+def record_tombstone(sender, instance, **kwargs):
+    """Record the deletion so it reaches syncing clients"""
+    # Bulk deletes record the tombstones of all their rows up front
+    if getattr(instance, '_bulk_deleted', False) or \
+            deleted_with_user(instance):
+        return
+    Tombstone.objects.record(instance.user_id, sender._meta.model_name,
+                             [instance.pk])
+
+
+@receiver(pre_delete, sender=Tag)
+def touch_recepies_of_deleted_tag(sender, instance, **kwargs):
+    """Mark recepies as modified when a tag they use is deleted"""
+    if deleted_with_user(instance):
+        return
+    Recepie.objects.filter(tags=instance).update(
+        updated_at=timezone.now(),
+        change_seq=User.objects.next_change_seq(instance.user_id),
+    )
+
+
+@receiver(m2m_changed, sender=Recepie.tags.through)
+def touch_tagged_recepies(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """Mark recepies as modified when their tags change"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        recepies = Recepie.objects.filter(pk=instance.pk)
+    elif action == 'pre_clear':
+        recepies = Recepie.objects.filter(tags=instance)
+    else:
+        recepies = Recepie.objects.filter(pk__in=pk_set)
+    recepies.update(
+        updated_at=timezone.now(),
+        change_seq=User.objects.next_change_seq(instance.user_id),
+    )
+
+
+@receiver(pre_delete, sender=Recepie)
+def uncount_deleted_recepie(sender, instance, **kwargs):
+    """Take a deleted recepie off the counts of its tags"""
+    if getattr(instance, '_bulk_deleted', False) or \
+            deleted_with_user(instance):
+        return
+    Tag.objects.filter(recepie=instance).update(
+        recepie_count=F('recepie_count') - 1)
+
+
+@receiver(m2m_changed, sender=Recepie.tags.through)
+def count_tagged_recepies(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """Adjust the recepie counts of tags linked or unlinked by the ORM"""
+    if action == 'post_add':
+        # pk_set only holds the objects that were not linked already
+        deltas = ({instance.pk: len(pk_set)} if reverse
+                  else dict.fromkeys(pk_set, 1))
+    elif action in ('pre_remove', 'pre_clear'):
+        if reverse:
+            links = sender.objects.filter(tag_id=instance.pk)
+            if action == 'pre_remove':
+                links = links.filter(recepie_id__in=pk_set)
+            deltas = {instance.pk: -links.count()}
+        else:
+            links = sender.objects.filter(recepie_id=instance.pk)
+            if action == 'pre_remove':
+                links = links.filter(tag_id__in=pk_set)
+            deltas = dict.fromkeys(
+                links.values_list('tag_id', flat=True), -1)
+    else:
+        return
+    Tag.objects.adjust_counts(deltas)
+
+
+@receiver(post_delete, sender=ProfileRecord)
+def remove_profile_file(sender, instance, **kwargs):
+    """Remove the file of a deleted profile"""
+    profile_path(instance).unlink(missing_ok=True)
+
+
+@receiver(connection_created)
+def record_queries(sender, connection, **kwargs):
+    """Let query logs record the queries of the connection"""
+    install(connection)
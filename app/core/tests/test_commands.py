@@ -2,11 +2,20 @@
 Test Management Commands
 """
 
+import asyncio
+import json
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2OperationalError
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from core import benchmark
+from core.management.commands import reconcile_tag_counts
+from core.models import Recepie, Tag, User
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -30,3 +39,211 @@ class CommandsTests(SimpleTestCase):
         call_command('wait_for_db')
 
         self.assertEqual(mock_handle.call_count, 6)
+
+
+class ImportRecepiesTests(TestCase):
+    """Test the import_recepies command"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('test@example.com', 'testpass')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_file(self, name, content):
+        """Write a file to import and return its path"""
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as output:
+            output.write(content)
+        return path
+
+    def test_import_ndjson(self):
+        """Test importing recepies with tags in batches"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        path = self.write_file('recepies.ndjson', ''.join(
+            json.dumps({
+                'id': 99, 'title': f'Recepie {i}', 'price': '5.50',
+                'time_minutes': i, 'description': 'Imported',
+                'tags': [{'id': 1, 'name': 'Vegan'}, {'name': f'Tag {i % 2}'}],
+            }) + '\n'
+            for i in range(5)
+        ))
+        out = StringIO()
+        call_command('import_recepies', 'test@example.com', path,
+                     '--batch-size', '2', stdout=out)
+
+        recepies = Recepie.objects.filter(user=self.user).order_by('id')
+        self.assertEqual([r.title for r in recepies],
+                         [f'Recepie {i}' for i in range(5)])
+        self.assertEqual(
+            sorted(tag.name for tag in recepies[3].tags.all()),
+            ['Tag 1', 'Vegan'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+        self.assertIn('Imported 5 recepies', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+    def test_import_csv(self):
+        """Test importing the CSV export format"""
+        path = self.write_file('recepies.csv', (
+            'id,title,price,time_minutes,description,link,tags\n'
+            '1,Curry,10.00,30,Hot curry,,Hot|Main\n'
+            '2,Salad,4.00,5,,,\n'
+        ))
+        call_command('import_recepies', 'test@example.com', path,
+                     stdout=StringIO())
+
+        curry, salad = Recepie.objects.order_by('id')
+        self.assertEqual(str(curry.price), '10.00')
+        self.assertEqual(sorted(tag.name for tag in curry.tags.all()),
+                         ['Hot', 'Main'])
+        self.assertEqual(salad.description, '')
+        self.assertFalse(salad.tags.exists())
+
+    def test_import_invalid_record(self):
+        """Test an invalid record reports its line"""
+        path = self.write_file('recepies.ndjson', '{"title": "No price"}\n')
+        with self.assertRaisesMessage(CommandError, 'Line 1'):
+            call_command('import_recepies', 'test@example.com', path,
+                         stdout=StringIO())
+        self.assertFalse(Recepie.objects.exists())
+
+    def test_import_record_over_field_limits(self):
+        """Test records breaking the model constraints report their line"""
+        valid = {'title': 'Curry', 'price': '5.00', 'time_minutes': 10}
+        for invalid, message in (
+                ({'price': '1000.00'}, 'recepie (price: Ensure that there '
+                                       'are no more than 5 digits'),
+                ({'price': '1.005'}, 'recepie (price: Ensure that there are '
+                                     'no more than 2 decimal places'),
+                ({'title': 'x' * 256}, 'recepie (title: Ensure this value '
+                                       'has at most 255 characters'),
+                ({'link': 'x' * 256}, 'recepie (link: Ensure this value has '
+                                      'at most 255 characters'),
+                ({'tags': ['x' * 256]}, 'tag (name: Ensure this value has '
+                                        'at most 255 characters'),
+        ):
+            with self.subTest(invalid=invalid):
+                path = self.write_file('recepies.ndjson', (
+                    json.dumps(valid) + '\n'
+                    + json.dumps(dict(valid, **invalid)) + '\n'))
+                with self.assertRaisesMessage(CommandError,
+                                              f'Line 2: invalid {message}'):
+                    call_command('import_recepies', 'test@example.com',
+                                 path, stdout=StringIO())
+        self.assertFalse(Recepie.objects.exists())
+
+
+class ReconcileTagCountsTests(TestCase):
+    """Test the reconcile_tag_counts command"""
+
+    def test_reconcile_fixes_drift(self):
+        """Test drifted tag counts are corrected"""
+        user = User.objects.create_user('test@example.com', 'testpass')
+        recepie = Recepie.objects.create(user=user, title='Curry', price=5,
+                                         time_minutes=5, description='Hot')
+        used = Tag.objects.create(user=user, name='Used')
+        recepie.tags.add(used)
+        unused = Tag.objects.create(user=user, name='Unused')
+        Tag.objects.filter(id=used.id).update(recepie_count=7)
+        Tag.objects.filter(id=unused.id).update(recepie_count=2)
+
+        out = StringIO()
+        call_command('reconcile_tag_counts', stdout=out)
+
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'recepie_count')),
+            {'Used': 1, 'Unused': 0})
+        self.assertIn('Corrected 2 tag counts', out.getvalue())
+
+    def test_reconcile_keeps_concurrent_changes(self):
+        """Test counts changed after the drift was found are not lost"""
+        user = User.objects.create_user('test@example.com', 'testpass')
+        curry, dal = (
+            Recepie.objects.create(user=user, title=title, price=5,
+                                   time_minutes=5, description='Hot')
+            for title in ('Curry', 'Dal'))
+        tag = Tag.objects.create(user=user, name='Hot')
+        curry.tags.add(tag)
+        Tag.objects.filter(id=tag.id).update(recepie_count=7)
+        save = reconcile_tag_counts.Command._save
+
+        def link_then_save(command, tag_ids):
+            dal.tags.add(tag)
+            return save(command, tag_ids)
+
+        with patch.object(reconcile_tag_counts.Command, '_save',
+                          link_then_save):
+            call_command('reconcile_tag_counts', stdout=StringIO())
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.recepie_count, 2)
+
+
+class BenchmarkApiTests(TransactionTestCase):
+    """Test seeding load test data and benchmarking the API"""
+
+    def test_seed_replaces_users(self):
+        """Test seeding again starts from the same data"""
+        for _ in range(2):
+            call_command('seed_benchmark_data', users=2, recepies=5, tags=3,
+                         stdout=StringIO())
+
+        users = benchmark.loadtest_users()
+        self.assertEqual(users.count(), 2)
+        self.assertEqual(Recepie.objects.filter(user__in=users).count(), 10)
+        self.assertEqual(Tag.objects.filter(user__in=users).count(), 6)
+
+    def test_benchmark_api_reports_json(self):
+        """Test the results of each scenario are written as JSON"""
+        call_command('seed_benchmark_data', users=1, recepies=5,
+                     stdout=StringIO())
+        out = StringIO()
+        call_command('benchmark_api', scenarios=['detail', 'create'],
+                     threads=1, duration=0.2, stdout=out, stderr=StringIO())
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['data']['recepies'], 5)
+        for name in ('detail', 'create'):
+            stats = report['scenarios'][name]
+            self.assertGreater(stats['requests'], 0)
+            self.assertEqual(stats['errors'], 0)
+            self.assertGreater(stats['queries_per_request'], 0)
+        self.assertEqual(Recepie.objects.count(), 5)
+
+    def test_benchmark_api_requires_data(self):
+        """Test the benchmark asks for seeded data"""
+        with self.assertRaisesMessage(CommandError, 'seed_benchmark_data'):
+            call_command('benchmark_api', stdout=StringIO())
+
+    def test_benchmark_asgi_requires_data(self):
+        """Test the slow client benchmark asks for seeded data"""
+        with self.assertRaisesMessage(CommandError, 'seed_benchmark_data'):
+            call_command('benchmark_asgi', stdout=StringIO())
+
+
+class SlowClientTests(SimpleTestCase):
+    """Test the slow clients of benchmark_asgi"""
+
+    def test_slow_request(self):
+        """Test the request is sent whole in chunks and its status read"""
+        received = []
+
+        async def handle(reader, writer):
+            received.append(await reader.readuntil(b'\r\n\r\n'))
+            writer.write(b'HTTP/1.1 204 No Content\r\n\r\n')
+            await writer.drain()
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            host, port = server.sockets[0].getsockname()
+            request = benchmark.http_request(host, port, '/api/', 'key')
+            async with server:
+                return request, await benchmark.slow_request(
+                    host, port, request, send_time=0.07)
+
+        request, (status, latency) = asyncio.run(run())
+
+        self.assertEqual(received, [request])
+        self.assertIn(b'Authorization: Token key', request)
+        self.assertEqual(status, 204)
+        self.assertGreaterEqual(latency, 0)
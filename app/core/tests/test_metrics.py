@@ -0,0 +1,132 @@
+"""
+Test the request metrics and the /metrics endpoint
+"""
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Recepie
+
+METRICS_URL = reverse('metrics')
+RECEPIES_URL = reverse('recepie:recepie-list')
+EXPORT_URL = reverse('recepie:recepie-export')
+
+METRICS = {'ENABLED': True, 'TOKEN': 'secret', 'SLOW_REQUEST_MS': 0}
+
+
+def sample(text, line_start):
+    """Return the value of the first sample line starting with line_start"""
+    for line in text.splitlines():
+        if line.startswith(line_start):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+class HistogramTests(SimpleTestCase):
+    """Test the histogram exposition"""
+
+    def test_cumulative_buckets(self):
+        """Test buckets count every observation up to their bound"""
+        histogram = metrics.Histogram('latency', 'Latency', ('view',),
+                                      (0.1, 1))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(('list',), value)
+
+        self.assertEqual(list(histogram.samples()), [
+            'latency_bucket{view="list",le="0.1"} 1',
+            'latency_bucket{view="list",le="1"} 3',
+            'latency_bucket{view="list",le="+Inf"} 4',
+            'latency_sum{view="list"} 6.05',
+            'latency_count{view="list"} 4',
+        ])
+
+
+@override_settings(METRICS=METRICS)
+class MetricsMiddlewareTests(TestCase):
+    """Test requests are recorded and exposed"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass')
+        Recepie.objects.create(user=self.user, title='Curry', price=5,
+                               time_minutes=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def scrape(self):
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(res.status_code, 200)
+        return res.content.decode()
+
+    def test_request_recorded(self):
+        """Test a request is counted with its queries and size"""
+        labels = '{view="recepie:recepie-list",method="GET"'
+        before = self.scrape()
+        self.client.get(RECEPIES_URL)
+        after = self.scrape()
+
+        def delta(name):
+            return ((sample(after, name + labels) or 0)
+                    - (sample(before, name + labels) or 0))
+
+        self.assertEqual(delta('http_requests_total'), 1)
+        self.assertEqual(delta('http_request_duration_seconds_count'), 1)
+        self.assertGreater(delta('http_request_db_queries_sum'), 0)
+        self.assertGreater(delta('http_response_serialize_seconds_sum'), 0)
+        self.assertGreater(delta('http_response_encode_seconds_sum'), 0)
+        self.assertGreater(delta('http_response_bytes_sum'), 0)
+
+    def test_unknown_methods_recorded_as_other(self):
+        """Test methods outside the standard ones share one label"""
+        self.client.generic('BREW', RECEPIES_URL)
+        self.client.generic('PROPFIND', RECEPIES_URL)
+        text = self.scrape()
+
+        self.assertGreaterEqual(sample(
+            text, 'http_requests_total{view="recepie:recepie-list",'
+                  'method="other",status="405"}'), 2)
+        self.assertNotIn('BREW', text)
+        self.assertNotIn('PROPFIND', text)
+
+    def test_streaming_recorded_when_sent(self):
+        """Test streaming responses are recorded once fully sent"""
+        name = ('http_request_duration_seconds_count'
+                '{view="recepie:recepie-export",method="GET"}')
+        before = sample(self.scrape(), name) or 0
+        res = self.client.get(EXPORT_URL)
+        self.assertEqual(sample(self.scrape(), name) or 0, before)
+
+        b''.join(res.streaming_content)
+        self.assertEqual(sample(self.scrape(), name), before + 1)
+
+    def test_slow_request_logged(self):
+        """Test requests over the threshold are logged with their SQL"""
+        with self.settings(METRICS=dict(METRICS, SLOW_REQUEST_MS=1e-6)):
+            with self.assertLogs('core.middleware', 'WARNING') as logs:
+                self.client.get(RECEPIES_URL)
+
+        self.assertIn(f'GET {RECEPIES_URL}', logs.output[0])
+        self.assertIn('FROM "core_recepie"', logs.output[0])
+
+    def test_token_required(self):
+        """Test the endpoint requires the configured bearer token"""
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('# TYPE http_requests_total counter',
+                      res.content.decode())
+
+    def test_token_needed_outside_debug(self):
+        """Test the endpoint is only served without a token in debug mode"""
+        with self.settings(METRICS=dict(METRICS, TOKEN=None)):
+            self.assertEqual(self.client.get(METRICS_URL).status_code, 404)
+            with self.settings(DEBUG=True):
+                res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, 200)
+
+    def test_disabled(self):
+        """Test the endpoint is not found when metrics are disabled"""
+        with self.settings(METRICS=dict(METRICS, ENABLED=False)):
+            self.assertEqual(self.client.get(METRICS_URL).status_code, 404)
@@ -0,0 +1,104 @@
+"""
+Test the API middleware
+"""
+import gzip
+from unittest import skipIf
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import middleware
+from core.middleware import CompressionMiddleware, accepted_encodings
+
+BODY = b'{"title":"Recepie"}' * 200
+
+COMPRESSION = {'MIN_SIZE': 1024, 'GZIP_LEVEL': 6, 'BROTLI_QUALITY': 5}
+
+
+def respond(response, accept_encoding='gzip'):
+    """Return the response passed through the compression middleware"""
+    request = RequestFactory().get(
+        '/', HTTP_ACCEPT_ENCODING=accept_encoding)
+    return CompressionMiddleware(lambda request: response)(request)
+
+
+@override_settings(RESPONSE_COMPRESSION=COMPRESSION)
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Test compression of responses"""
+
+    def test_accepted_encodings(self):
+        """Test encodings refused with q=0 are not accepted"""
+        self.assertEqual(accepted_encodings('gzip;q=0.5, br;q=0, deflate'),
+                         {'gzip', 'deflate'})
+
+    @skipIf(middleware.brotli is not None, 'brotli takes precedence')
+    def test_gzip_response(self):
+        """Test large responses are compressed with gzip"""
+        response = respond(HttpResponse(BODY), 'gzip, deflate')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response.content), BODY)
+        self.assertEqual(int(response['Content-Length']),
+                         len(response.content))
+
+    @skipIf(middleware.brotli is None, 'brotli is not installed')
+    def test_brotli_response(self):
+        """Test brotli is preferred when the client accepts it"""
+        response = respond(HttpResponse(BODY), 'gzip, br')
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(middleware.brotli.decompress(response.content),
+                         BODY)
+
+    def test_small_response_not_compressed(self):
+        """Test responses under the minimum size are sent as they are"""
+        response = respond(HttpResponse(b'{"id":1}'))
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, b'{"id":1}')
+
+    def test_not_accepted(self):
+        """Test responses are not compressed if the client refuses it"""
+        response = respond(HttpResponse(BODY), 'identity')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.content, BODY)
+
+    def test_gzip_level(self):
+        """Test the gzip compression level comes from the settings"""
+        with self.settings(RESPONSE_COMPRESSION=dict(COMPRESSION,
+                                                     GZIP_LEVEL=1)):
+            fast = respond(HttpResponse(BODY)).content
+        with self.settings(RESPONSE_COMPRESSION=dict(COMPRESSION,
+                                                     GZIP_LEVEL=9)):
+            small = respond(HttpResponse(BODY)).content
+
+        self.assertEqual(gzip.decompress(fast), gzip.decompress(small))
+        self.assertNotEqual(fast, small)
+
+    def test_streaming_response(self):
+        """Test streaming responses are compressed chunk by chunk"""
+        chunks = [b'line %d\n' % number for number in range(1000)]
+        response = respond(StreamingHttpResponse(iter(chunks)))
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            b''.join(chunks))
+
+    def test_strong_etag_weakened(self):
+        """Test compressed responses have weak ETags"""
+        response = HttpResponse(BODY)
+        response['ETag'] = '"abc"'
+
+        self.assertEqual(respond(response)['ETag'], 'W/"abc"')
+
+    def test_encoded_response_untouched(self):
+        """Test responses that already have an encoding are left alone"""
+        response = HttpResponse(BODY)
+        response['Content-Encoding'] = 'identity'
+
+        self.assertEqual(respond(response).content, BODY)
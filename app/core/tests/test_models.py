@@ -2,10 +2,12 @@
     Test cases for models
 """
 
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from decimal import Decimal
-from core.models import Recepie, Tag
+from core.models import Recepie, Tag, Tombstone
 
 
 def create_user(**params):
@@ -81,4 +83,108 @@ class ModelTests(TestCase):
         }
         user = create_user(**payload)
         tag = Tag.objects.create(user=user, name="Test tag")
-        self.assertEqual(tag.name, "Test tag")
\ No newline at end of file
+        self.assertEqual(tag.name, "Test tag")
+
+    def test_get_or_create_many_tags(self):
+        """Test resolving tag names creates only the missing tags"""
+        user = create_user(email='test@example.com', password='testpass123')
+        other_user = create_user(email='other@example.com',
+                                 password='testpass123')
+        existing = Tag.objects.create(user=user, name='vegan')
+        Tag.objects.create(user=other_user, name='dinner')
+        with self.assertNumQueries(4):
+            tags = Tag.objects.get_or_create_many(
+                user, ['dinner', 'vegan', 'dinner', 'quick'])
+        self.assertEqual([tag.name for tag in tags],
+                         ['dinner', 'vegan', 'quick'])
+        self.assertEqual(tags[1], existing)
+        self.assertTrue(all(tag.user == user for tag in tags))
+        self.assertEqual(Tag.objects.filter(user=user).count(), 3)
+
+    def test_tag_names_unique_per_user(self):
+        """Test a user cannot have two tags with the same name"""
+        user = create_user(email='test@example.com', password='testpass123')
+        other_user = create_user(email='other@example.com',
+                                 password='testpass123')
+        Tag.objects.create(user=user, name='vegan')
+        Tag.objects.create(user=other_user, name='vegan')
+        with self.assertRaises(IntegrityError):
+            Tag.objects.create(user=user, name='vegan')
+
+    def test_access_pattern_indexes(self):
+        """Test the per-user composite indexes exist"""
+        with connection.cursor() as cursor:
+            recepie = connection.introspection.get_constraints(
+                cursor, Recepie._meta.db_table)
+            through = connection.introspection.get_constraints(
+                cursor, Recepie.tags.through._meta.db_table)
+        self.assertEqual(recepie['recepie_user_id_idx']['columns'],
+                         ['user_id', 'id'])
+        self.assertEqual(
+            through['core_recepie_tags_tag_recepie_idx']['columns'],
+            ['tag_id', 'recepie_id'],
+        )
+
+    def assertCountsAccurate(self):
+        """Assert every tag's stored recepie count matches the links"""
+        for tag in Tag.objects.with_actual_counts():
+            self.assertEqual(tag.recepie_count, tag.actual_count, tag.name)
+
+    def test_tag_counts_follow_link_changes(self):
+        """Test tag recepie counts are adjusted by ORM link changes"""
+        user = create_user(email='test@example.com', password='testpass123')
+        recepies = [
+            Recepie.objects.create(user=user, title=f'Recepie {i}',
+                                   time_minutes=5, price=Decimal('5.00'),
+                                   description='Test')
+            for i in range(3)
+        ]
+        vegan = Tag.objects.create(user=user, name='vegan')
+        quick = Tag.objects.create(user=user, name='quick')
+
+        recepies[0].tags.add(vegan, quick)
+        recepies[0].tags.add(vegan)
+        vegan.recepie_set.add(recepies[1], recepies[2])
+        self.assertCountsAccurate()
+        recepies[0].tags.remove(quick, quick)
+        vegan.recepie_set.remove(recepies[1])
+        self.assertCountsAccurate()
+        recepies[2].tags.add(quick)
+        recepies[2].tags.clear()
+        self.assertCountsAccurate()
+        vegan.recepie_set.clear()
+        recepies[1].tags.set([vegan, quick])
+        recepies[1].delete()
+        self.assertCountsAccurate()
+        vegan.refresh_from_db()
+        self.assertEqual(vegan.recepie_count, 0)
+
+    def test_user_delete_skips_per_row_work(self):
+        """Test deleting a user does no sync or count work per row"""
+        queries = []
+        for count in (1, 20):
+            user = create_user(email=f'test{count}@example.com',
+                               password='testpass123')
+            tag = Tag.objects.create(user=user, name='vegan')
+            for i in range(count):
+                Recepie.objects.create(
+                    user=user, title=f'Recepie {i}', time_minutes=5,
+                    price=Decimal('5.00'), description='Test',
+                ).tags.add(tag)
+            with CaptureQueriesContext(connection) as ctx:
+                user.delete()
+            queries.append(len(ctx.captured_queries))
+
+        self.assertEqual(queries[0], queries[1])
+        self.assertFalse(Tombstone.objects.exists())
+
+    def test_user_queryset_delete_skips_per_row_work(self):
+        """Test deleting users in bulk records no tombstones"""
+        user = create_user(email='test@example.com', password='testpass123')
+        Recepie.objects.create(user=user, title='Recepie', time_minutes=5,
+                               price=Decimal('5.00'), description='Test')
+
+        get_user_model().objects.filter(pk=user.pk).delete()
+
+        self.assertFalse(Tombstone.objects.exists())
+        self.assertFalse(Recepie.objects.exists())
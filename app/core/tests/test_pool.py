@@ -0,0 +1,106 @@
+"""
+Test the database connection pool
+"""
+import threading
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    """Stand-in for a DB-API connection"""
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def healthy(conn):
+    return True
+
+
+def broken(conn):
+    return False
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Test cases for the connection pool"""
+
+    def test_connection_reused(self):
+        """Test a released connection is handed out again"""
+        pool = ConnectionPool(max_size=2)
+        conn = pool.acquire(FakeConnection, healthy)
+        pool.release(conn, healthy)
+        self.assertIs(pool.acquire(FakeConnection, healthy), conn)
+        stats = pool.stats()
+        self.assertEqual(stats['connections_created'], 1)
+        self.assertEqual(stats['connections_reused'], 1)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_size_limited(self):
+        """Test checkout times out once max_size connections are in use"""
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        pool.acquire(FakeConnection, healthy)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection, healthy)
+        self.assertEqual(pool.stats()['checkout_timeouts'], 1)
+
+    def test_waiting_checkout_gets_released_connection(self):
+        """Test a waiting thread receives a connection once released"""
+        pool = ConnectionPool(max_size=1, timeout=5)
+        conn = pool.acquire(FakeConnection, healthy)
+        result = []
+        waiter = threading.Thread(
+            target=lambda: result.append(
+                pool.acquire(FakeConnection, healthy)))
+        waiter.start()
+        pool.release(conn, healthy)
+        waiter.join()
+        self.assertEqual(result, [conn])
+
+    @patch('time.monotonic')
+    def test_unhealthy_connection_replaced(self, mock_monotonic):
+        """Test an idle connection failing its health check is replaced"""
+        mock_monotonic.return_value = 0
+        pool = ConnectionPool(max_size=1, check_interval=30)
+        conn = pool.acquire(FakeConnection, healthy)
+        pool.release(conn, healthy)
+        mock_monotonic.return_value = 60
+        new_conn = pool.acquire(FakeConnection, broken)
+        self.assertIsNot(new_conn, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['health_check_failures'], 1)
+
+    def test_failed_reset_discards_connection(self):
+        """Test a connection that cannot be reset is closed, not pooled"""
+        pool = ConnectionPool(max_size=1)
+        conn = pool.acquire(FakeConnection, healthy)
+        pool.release(conn, broken)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    @patch('time.monotonic')
+    def test_old_connection_discarded(self, mock_monotonic):
+        """Test connections older than max_lifetime are closed"""
+        mock_monotonic.return_value = 0
+        pool = ConnectionPool(max_size=1, max_lifetime=100)
+        conn = pool.acquire(FakeConnection, healthy)
+        mock_monotonic.return_value = 100
+        pool.release(conn, healthy)
+        self.assertTrue(conn.closed)
+
+    def test_failed_connect_frees_slot(self):
+        """Test a failing connect does not leak a pool slot"""
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+
+        def fail():
+            raise RuntimeError('refused')
+
+        with self.assertRaises(RuntimeError):
+            pool.acquire(fail, healthy)
+        self.assertIsInstance(pool.acquire(FakeConnection, healthy),
+                              FakeConnection)
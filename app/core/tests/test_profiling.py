@@ -0,0 +1,142 @@
+"""
+Test profiling of live requests
+"""
+import pstats
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import profiling
+from core.models import ProfileRecord
+
+RECEPIES_URL = reverse('recepie:recepie-list')
+
+PROFILING = {
+    'ENABLED': True, 'MAX_FILES': 2, 'TOKEN_MAX_AGE': 60,
+    'SAMPLE_INTERVAL': 0.001,
+}
+
+
+class ProfilingTests(TestCase):
+    """Test requests are profiled on demand only"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        profiling_settings = override_settings(
+            PROFILING=dict(PROFILING, DIR=directory))
+        profiling_settings.enable()
+        self.addCleanup(profiling_settings.disable)
+        self.directory = Path(directory)
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_not_profiled_by_default(self):
+        """Test requests without a token are not profiled"""
+        res = self.client.get(RECEPIES_URL, {'profile': '1'})
+
+        self.assertFalse(res.has_header('X-Profile-Id'))
+        self.assertFalse(ProfileRecord.objects.exists())
+
+    def test_invalid_token_ignored(self):
+        """Test requests with a bad token are not profiled"""
+        res = self.client.get(RECEPIES_URL, HTTP_X_PROFILE='profile:bad')
+
+        self.assertFalse(res.has_header('X-Profile-Id'))
+
+    def test_signed_header_profiles(self):
+        """Test a signed token profiles the request with cProfile"""
+        res = self.client.get(RECEPIES_URL,
+                              HTTP_X_PROFILE=profiling.make_token())
+
+        self.assertEqual(res.status_code, 200)
+        record = ProfileRecord.objects.get(pk=res['X-Profile-Id'])
+        self.assertEqual(record.view_name, 'recepie:recepie-list')
+        self.assertEqual(record.format, ProfileRecord.FORMAT_PSTATS)
+        stats = pstats.Stats(str(profiling.profile_path(record)),
+                             stream=StringIO())
+        self.assertGreater(stats.total_calls, 0)
+
+    async def test_sync_view_profiled_under_asgi(self):
+        """Test the profiler follows sync views to their thread under ASGI"""
+        token = await sync_to_async(Token.objects.create)(user=self.user)
+
+        res = await AsyncClient().get(RECEPIES_URL,
+                                      authorization=f'Token {token.key}',
+                                      x_profile=profiling.make_token())
+
+        record = await sync_to_async(ProfileRecord.objects.get)(
+            pk=res['X-Profile-Id'])
+        stats = pstats.Stats(str(profiling.profile_path(record)),
+                             stream=StringIO())
+        self.assertIn('list', {name for _, _, name in stats.stats})
+
+    def test_collapsed_stacks(self):
+        """Test the sampled format writes collapsed stacks"""
+        res = self.client.get(RECEPIES_URL,
+                              HTTP_X_PROFILE=profiling.make_token(),
+                              HTTP_X_PROFILE_FORMAT='collapsed')
+
+        record = ProfileRecord.objects.get(pk=res['X-Profile-Id'])
+        self.assertEqual(record.format, ProfileRecord.FORMAT_COLLAPSED)
+        for line in profiling.profile_path(record).read_text().splitlines():
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+
+    def test_staff_query_parameter(self):
+        """Test staff users logged in to the admin can profile requests"""
+        staff = get_user_model().objects.create_superuser(
+            'admin@example.com', 'testpass')
+        self.client.force_login(staff)
+
+        res = self.client.get(RECEPIES_URL, {'profile': '1'})
+
+        self.assertTrue(res.has_header('X-Profile-Id'))
+
+    def test_ring_buffer(self):
+        """Test only the newest MAX_FILES profiles are kept"""
+        token = profiling.make_token()
+        for _ in range(3):
+            self.client.get(RECEPIES_URL, HTTP_X_PROFILE=token)
+
+        records = ProfileRecord.objects.all()
+        self.assertEqual(len(records), 2)
+        self.assertEqual(
+            sorted(path.name for path in self.directory.iterdir()),
+            sorted(record.file_name for record in records))
+
+    def test_admin_download(self):
+        """Test staff download profiles from the admin"""
+        res = self.client.get(RECEPIES_URL,
+                              HTTP_X_PROFILE=profiling.make_token())
+        record = ProfileRecord.objects.get(pk=res['X-Profile-Id'])
+        url = reverse('admin:core_profilerecord_download', args=[record.pk])
+        self.client.force_login(get_user_model().objects.create_superuser(
+            'admin@example.com', 'testpass'))
+
+        self.assertContains(
+            self.client.get(reverse('admin:core_profilerecord_changelist')),
+            url)
+        download = self.client.get(url)
+        self.assertEqual(b''.join(download.streaming_content),
+                         profiling.profile_path(record).read_bytes())
+
+    def test_profile_token_command(self):
+        """Test the command prints a valid header"""
+        out = StringIO()
+        call_command('profile_token', stdout=out, stderr=StringIO())
+
+        name, token = out.getvalue().strip().split(': ')
+        self.assertEqual(name, 'X-Profile')
+        self.assertTrue(profiling.valid_token(token, 60))
@@ -0,0 +1,95 @@
+"""
+Test the query budgets of API views
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import resolve, reverse
+from rest_framework.test import APIClient
+
+from core.models import Tag
+from core.query_budget import (QueryBudgetExceeded, QueryBudgetTestMixin,
+                               describe, get_query_budget, query_budget)
+from recepie.views import RecepieViewSet
+
+RECEPIES_URL = reverse('recepie:recepie-list')
+
+
+class QueryBudgetLookupTests(SimpleTestCase):
+    """Test finding the budget of resolved views"""
+
+    def test_viewset_action_budget(self):
+        """Test viewsets take the budget of the action of the method"""
+        view = resolve(RECEPIES_URL).func
+
+        self.assertEqual(get_query_budget(view, 'GET'),
+                         RecepieViewSet.query_budget['list'])
+        self.assertEqual(get_query_budget(view, 'POST'),
+                         RecepieViewSet.query_budget['create'])
+
+    def test_decorated_views(self):
+        """Test decorated function views and actions take precedence"""
+        @query_budget(3)
+        def view(request):
+            pass
+
+        self.assertEqual(get_query_budget(view, 'GET'), 3)
+        with patch.object(RecepieViewSet.search, 'query_budget', 1,
+                          create=True):
+            self.assertEqual(get_query_budget(
+                resolve(reverse('recepie:recepie-search')).func, 'GET'), 1)
+
+    def test_no_budget(self):
+        """Test views without a budget are not limited"""
+        def view(request):
+            pass
+
+        self.assertIsNone(get_query_budget(view, 'GET'))
+
+    def test_describe_repeated_queries(self):
+        """Test the report lists repeated statements with their counts"""
+        report = describe('GET /', ['SELECT 1', 'SELECT 2', 'SELECT 2'], 2)
+
+        self.assertIn('GET / ran 3 queries, over its budget of 2', report)
+        self.assertIn('2x SELECT 2', report)
+        self.assertNotIn('1x SELECT 1', report)
+
+
+class QueryBudgetEnforcementTests(QueryBudgetTestMixin, TestCase):
+    """Test requests and blocks over budget are reported"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_request_over_budget_raises(self):
+        """Test a request over its view's budget fails"""
+        with patch.object(RecepieViewSet, 'query_budget', {'list': 0}):
+            with self.assertRaisesMessage(QueryBudgetExceeded,
+                                          'over its budget of 0'):
+                self.client.get(RECEPIES_URL)
+
+    def test_request_over_budget_logged(self):
+        """Test a request over budget is logged when it may not raise"""
+        with override_settings(QUERY_BUDGET={'ENABLED': True,
+                                             'RAISE': False}), \
+                patch.object(RecepieViewSet, 'query_budget', {'list': 0}), \
+                self.assertLogs('core.middleware', 'WARNING') as logs:
+            res = self.client.get(RECEPIES_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(f'GET {RECEPIES_URL} ran', logs.output[0])
+
+    def test_assert_max_queries_reports_duplicates(self):
+        """Test the assertion helper reports repeated queries"""
+        for name in ('Vegan', 'Dessert'):
+            Tag.objects.create(user=self.user, name=name)
+
+        with self.assertRaisesMessage(self.failureException,
+                                      'Repeated queries:\n  2x SELECT'):
+            with self.assertMaxQueries(1):
+                for tag in Tag.objects.filter(user=self.user):
+                    Tag.objects.get(pk=tag.pk)
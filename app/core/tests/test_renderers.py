@@ -0,0 +1,67 @@
+"""
+Test the fast JSON renderer
+"""
+import datetime
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from core import renderers
+from core.renderers import FastJSONRenderer
+
+PAYLOAD = {
+    'results': ReturnList([
+        ReturnDict([('id', 1), ('title', 'Crème brûlée'),
+                    ('price', Decimal('5.50')), ('ratio', 0.1),
+                    ('tags', [OrderedDict([('id', 2), ('name', 'dessert')])])],
+                   serializer=None),
+    ], serializer=None),
+    'detail': _('Not found.'),
+    'updated': timezone.make_aware(
+        datetime.datetime(2021, 6, 1, 12, 30, 15, 123456),
+        datetime.timezone.utc),
+    'day': datetime.date(2021, 6, 1),
+    'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'separators': 'a\u2028b\u2029c',
+    7: None,
+    'ids': {3, 4},
+}
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """Test the renderer writes the JSON of DRF's JSONRenderer"""
+
+    def test_same_output_as_json_renderer(self):
+        """Test the output is byte for byte the stdlib renderer's"""
+        self.assertEqual(FastJSONRenderer().render(PAYLOAD),
+                         JSONRenderer().render(PAYLOAD))
+
+    def test_unsupported_data_uses_stdlib(self):
+        """Test data orjson refuses is rendered by the stdlib"""
+        payload = {'big': 2 ** 70}
+        self.assertEqual(FastJSONRenderer().render(payload),
+                         JSONRenderer().render(payload))
+
+    def test_indent_uses_stdlib(self):
+        """Test indented JSON requests are rendered by the stdlib"""
+        media_type = 'application/json; indent=4'
+        self.assertEqual(
+            FastJSONRenderer().render(PAYLOAD, media_type),
+            JSONRenderer().render(PAYLOAD, media_type))
+
+    def test_fallback_without_orjson(self):
+        """Test the stdlib is used when orjson is not installed"""
+        with patch.object(renderers, 'orjson', None):
+            self.assertEqual(FastJSONRenderer().render(PAYLOAD),
+                             JSONRenderer().render(PAYLOAD))
+
+    def test_none_renders_empty(self):
+        """Test no data renders an empty body"""
+        self.assertEqual(FastJSONRenderer().render(None), b'')
@@ -0,0 +1,24 @@
+"""
+Views of the core app
+"""
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from core.metrics import registry
+
+
+def metrics(request):
+    """
+    Serve the metrics of this process in the Prometheus text format, only
+    to holders of the token outside debug mode
+    """
+    options = settings.METRICS
+    if not options['ENABLED'] or not (options['TOKEN'] or settings.DEBUG):
+        raise Http404
+    if options['TOKEN'] and not constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''),
+            f'Bearer {options["TOKEN"]}'):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4')
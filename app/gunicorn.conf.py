@@ -0,0 +1,39 @@
+"""
+Gunicorn configuration for serving the app in production
+
+Workers are forked from a master that has already imported the project
+(preload_app), so they share its memory pages. Send the master HUP to
+restart the workers gracefully with the new configuration. As the code is
+preloaded, deploying new code needs USR2 to start a new master followed by
+QUIT to the old one, or a container restart.
+"""
+import os
+
+
+def _cpu_count():
+    """Cores available to this process, respecting container CPU sets"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# SERVER_MODE=asgi serves app/asgi.py with uvicorn workers instead
+if os.environ.get('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'app.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 2))
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', _cpu_count() * 2 + 1))
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then to bound the effect of memory leaks
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
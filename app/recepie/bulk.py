@@ -0,0 +1,261 @@
+"""
+Bulk create, update and delete of recepies
+
+A batch is validated item by item with the regular serializers and then
+written with a fixed number of statements: one insert or update of the
+recepies, one lookup of all the batch's tags and one insert and delete of
+through table rows. Invalid items are reported next to the written ones
+unless the request asks for ?atomic=true, which rejects the whole batch.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.deletion import Collector
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from core.models import Recepie, Tag, Tombstone, User
+
+
+def _error(code, errors):
+    return {'status': code, 'errors': errors}
+
+
+def _as_id(value):
+    """Return the value as a recepie id or None if it is not one"""
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class BulkRecepieMixin:
+    """
+    Add a bulk/ route accepting lists of recepies to create, update or
+    delete in one request
+    """
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Create the recepies in the request body
+        """
+        items = self._bulk_items(request)
+        results, valid = [], []
+        for item in items:
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid.append((len(results), serializer.validated_data))
+                results.append(None)
+            else:
+                results.append(_error(status.HTTP_400_BAD_REQUEST,
+                                      serializer.errors))
+        if self._reject(request, results):
+            return Response({'results': results},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        with transaction.atomic():
+            recepies = Recepie.objects.bulk_create_for_user(user, [
+                Recepie(**{key: value for key, value in data.items()
+                           if key != 'tags'})
+                for index, data in valid
+            ])
+            self._bulk_set_tags(user, {
+                recepie.pk: data['tags']
+                for recepie, (index, data) in zip(recepies, valid)
+                if data.get('tags')
+            }, created=True)
+        self.bump_cache_version()
+        return self._bulk_response(results, [
+            (index, recepie.pk)
+            for (index, data), recepie in zip(valid, recepies)
+        ], status.HTTP_201_CREATED)
+
+    @bulk.mapping.patch
+    def bulk_update(self, request):
+        """
+        Partially update the recepies in the request body by id
+        """
+        items = self._bulk_items(request)
+        ids = [_as_id(item.get('id')) if isinstance(item, dict) else None
+               for item in items]
+        instances = Recepie.objects.filter(user=request.user).in_bulk(
+            [pk for pk in ids if pk is not None])
+        results, valid = [], []
+        for pk, item in zip(ids, items):
+            instance = instances.get(pk)
+            if instance is None:
+                results.append(self._missing(pk))
+                continue
+            serializer = self.get_serializer(instance, data=item,
+                                             partial=True)
+            if serializer.is_valid():
+                valid.append((len(results), instance,
+                              serializer.validated_data))
+                results.append(None)
+            else:
+                results.append(_error(status.HTTP_400_BAD_REQUEST,
+                                      serializer.errors))
+        if self._reject(request, results):
+            return Response({'results': results},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        fields, tags = {'updated_at', 'change_seq'}, {}
+        for index, instance, data in valid:
+            for key, value in data.items():
+                if key == 'tags':
+                    tags[instance.pk] = value
+                else:
+                    setattr(instance, key, value)
+                    fields.add(key)
+        changed = list({instance.pk: instance
+                        for index, instance, data in valid}.values())
+        with transaction.atomic():
+            change_seq = (User.objects.next_change_seq(request.user.pk)
+                          if changed else 0)
+            now = timezone.now()
+            for instance in changed:
+                instance.updated_at = now
+                instance.change_seq = change_seq
+            Recepie.objects.bulk_update(changed, sorted(fields))
+            self._bulk_set_tags(request.user, tags)
+        self.bump_cache_version()
+        return self._bulk_response(results, [
+            (index, instance.pk) for index, instance, data in valid
+        ], status.HTTP_200_OK)
+
+    @bulk.mapping.delete
+    def bulk_destroy(self, request):
+        """
+        Delete the recepies whose ids are listed in the request body
+        """
+        ids = [_as_id(pk) for pk in self._bulk_items(request)]
+        recepies = Recepie.objects.filter(user=request.user).in_bulk(
+            [pk for pk in ids if pk is not None])
+        results = [
+            {'status': status.HTTP_204_NO_CONTENT} if pk in recepies
+            else self._missing(pk)
+            for pk in ids
+        ]
+        if self._reject(request, results):
+            return Response({'results': results},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if recepies:
+            self._bulk_delete(request.user, recepies)
+        self.bump_cache_version()
+        failed = any(result['status'] >= 400 for result in results)
+        return Response({'results': results}, status=(
+            status.HTTP_207_MULTI_STATUS if failed else status.HTTP_200_OK))
+
+    def _bulk_delete(self, user, recepies):
+        """
+        Delete the recepies, a mapping of id to recepie, recording their
+        tombstones and tag count changes with one statement each
+        """
+        links = Recepie.tags.through.objects.filter(
+            recepie_id__in=list(recepies))
+        with transaction.atomic():
+            Tombstone.objects.record(user.pk, Tombstone.KIND_RECEPIE,
+                                     list(recepies))
+            Tag.objects.adjust_counts({
+                tag_id: -total for tag_id, total in links.values_list(
+                    'tag_id').annotate(total=Count('id')).order_by()
+            })
+            # Tells the delete signal handlers the work is already done
+            for recepie in recepies.values():
+                recepie._bulk_deleted = True
+            collector = Collector(using=Recepie.objects.db)
+            collector.collect(list(recepies.values()))
+            collector.delete()
+
+    def _bulk_items(self, request):
+        """
+        Return the list of items in the request body
+        """
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'non_field_errors': [
+                _('Expected a list of items.')]})
+        if len(items) > settings.API_BULK_MAX_SIZE:
+            raise ValidationError({'non_field_errors': [
+                _('At most %(max)d items are accepted per request.')
+                % {'max': settings.API_BULK_MAX_SIZE}]})
+        return items
+
+    def _reject(self, request, results):
+        """
+        Whether the batch must not be written because of invalid items
+        """
+        if request.query_params.get('atomic', '').lower() not in (
+                'true', '1'):
+            return False
+        return any(result is not None and result['status'] >= 400
+                   for result in results)
+
+    def _missing(self, pk):
+        """
+        Return the result of an item whose recepie does not exist
+        """
+        if pk is None:
+            return _error(status.HTTP_400_BAD_REQUEST,
+                          {'id': [_('A valid integer is required.')]})
+        return _error(status.HTTP_404_NOT_FOUND, {'detail': _('Not found.')})
+
+    def _bulk_set_tags(self, user, tags, created=False):
+        """
+        Replace the tags of many recepies with one tag lookup and a single
+        through table delete and insert
+        """
+        if not tags:
+            return
+        names = [tag['name'] for items in tags.values() for tag in items]
+        resolved = {tag.name: tag.id
+                    for tag in Tag.objects.get_or_create_many(user, names)}
+        wanted = {
+            (pk, resolved[tag['name']])
+            for pk, items in tags.items() for tag in items
+        }
+        through, stale = Recepie.tags.through, {}
+        if not created:
+            links = through.objects.filter(recepie_id__in=list(tags))
+            current = {(recepie_id, tag_id): pk for pk, recepie_id, tag_id
+                       in links.values_list('id', 'recepie_id', 'tag_id')}
+            stale = {link: pk for link, pk in current.items()
+                     if link not in wanted}
+            if stale:
+                through.objects.filter(id__in=stale.values()).delete()
+            wanted -= set(current)
+        through.objects.bulk_create(
+            [through(recepie_id=recepie_id, tag_id=tag_id)
+             for recepie_id, tag_id in sorted(wanted)],
+            ignore_conflicts=True,
+        )
+        deltas = Counter(tag_id for recepie_id, tag_id in wanted)
+        deltas.subtract(tag_id for recepie_id, tag_id in stale)
+        Tag.objects.adjust_counts(deltas)
+
+    def _bulk_response(self, results, written, success):
+        """
+        Fill in the serialized recepies of the written items, given as
+        (index, id) pairs, and pick the status of the whole response
+        """
+        recepies = Recepie.objects.filter(
+            id__in=[pk for index, pk in written]).prefetch_related('tags')
+        recepies = {recepie.pk: recepie for recepie in recepies}
+        for index, pk in written:
+            results[index] = {
+                'status': success,
+                'data': self.get_serializer(recepies[pk]).data,
+            }
+        failed = len(written) < len(results)
+        return Response({'results': results}, status=(
+            status.HTTP_207_MULTI_STATUS if failed else success))
@@ -0,0 +1,139 @@
+"""
+Per-user versioned caching of recepie API responses
+
+Every cached response is keyed by a version number of the user's data.
+Writes bump the version instead of deleting keys, so all cached lists and
+details of that user become unreachable at once and expire on their own.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+# Validator headers stored and served along with the response data
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    """The Django cache holding responses and versions"""
+    return caches[settings.RESPONSE_CACHE['CACHE_ALIAS']]
+
+
+def _version_key(user_id):
+    return f'recepie:version:{user_id}'
+
+
+def get_version(user_id):
+    """Return the current data version of the user"""
+    cache = _cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # Start from the clock so that a version lost to eviction never
+        # matches responses cached under an earlier one
+        cache.add(_version_key(user_id), time.time_ns(), None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def _incr_version(user_id):
+    try:
+        _cache().incr(_version_key(user_id))
+    except ValueError:
+        get_version(user_id)
+
+
+def bump_version(user_id):
+    """
+    Invalidate the cached responses of the user
+
+    The version is bumped right away, so the writer reads its own write,
+    and again on commit, so responses cached by readers that saw the old
+    data while the transaction was open are not served afterwards.
+    """
+    if not settings.RESPONSE_CACHE['ENABLED']:
+        return
+    _incr_version(user_id)
+    transaction.on_commit(lambda: _incr_version(user_id))
+
+
+def stats():
+    """Return the response cache hit and miss counts of this process"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+class CachedResponseMixin:
+    """
+    Cache responses of a view until the user's data version changes
+    """
+
+    def bump_cache_version(self):
+        """Invalidate the cached responses of the requesting user"""
+        bump_version(self.request.user.pk)
+
+    def _cached(self, view, request, *args, **kwargs):
+        """Return the cached response data or compute and cache it"""
+        options = settings.RESPONSE_CACHE
+        if not options['ENABLED']:
+            return view(request, *args, **kwargs)
+        user_id = request.user.pk
+        digest = hashlib.md5(
+            f'{request.accepted_renderer.format}:'
+            f'{request.build_absolute_uri()}'.encode()).hexdigest()
+        key = f'recepie:response:{user_id}:{get_version(user_id)}:{digest}'
+        cached = _cache().get(key)
+        if cached is not None:
+            _count('hits')
+            data, headers = cached
+            response = get_conditional_response(
+                request,
+                etag=headers.get('ETag'),
+                last_modified=parse_http_date_safe(
+                    headers.get('Last-Modified', '')),
+            )
+            if response is None:
+                response = Response(data)
+            response['X-Cache'] = 'HIT'
+            for name, value in headers.items():
+                response[name] = value
+            return response
+        _count('misses')
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {name: response[name] for name in CACHED_HEADERS
+                       if response.has_header(name)}
+            _cache().set(key, (response.data, headers), options['TIMEOUT'])
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class CachedListMixin(CachedResponseMixin):
+    """
+    Serve the list action from the response cache
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(super().list, request, *args, **kwargs)
+
+
+class CachedRetrieveMixin(CachedResponseMixin):
+    """
+    Serve the retrieve action from the response cache
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,67 @@
+"""
+Conditional GET support for recepie API views
+"""
+import hashlib
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    """
+    Add ETag and Last-Modified headers to list and retrieve responses and
+    answer matching If-None-Match/If-Modified-Since requests with 304
+    before anything is serialized
+
+    Views must define get_validator_state(), returning a (last modified
+    datetime, state) pair, where state is any other value that changes
+    with the response, usually from a single aggregate query, or None when
+    there is nothing to validate. Views without it fail when the class is
+    defined rather than on their first request.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not callable(getattr(cls, 'get_validator_state', None)):
+            raise ImproperlyConfigured(
+                f'{cls.__name__} uses ConditionalGetMixin but does not '
+                f'define get_validator_state()')
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args,
+                                 **kwargs)
+
+    def get_validators(self):
+        """Return the ETag and Last-Modified timestamp of the response"""
+        validators = self.get_validator_state()
+        if validators is None:
+            return None, None
+        modified, state = validators
+        request = self.request
+        source = '|'.join(map(str, (
+            request.build_absolute_uri(),
+            request.accepted_renderer.format,
+            modified,
+            state,
+        )))
+        etag = f'"{hashlib.md5(source.encode()).hexdigest()}"'
+        return etag, modified and int(modified.timestamp())
+
+    def _conditional(self, view, request, *args, **kwargs):
+        """Return 304 if the client's copy is current, else the response"""
+        etag, last_modified = self.get_validators()
+        if etag is None:
+            return view(request, *args, **kwargs)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        if 200 <= response.status_code < 400:
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
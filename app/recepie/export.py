@@ -0,0 +1,120 @@
+"""
+Streaming export of a user's recepies as NDJSON or CSV
+
+Recepies are read with a server side cursor in chunks of
+API_EXPORT_CHUNK_SIZE rows and the tags of each chunk with one more query,
+so memory use stays the same however many recepies are exported.
+
+Django 3.2 iterates streaming responses on the event loop under ASGI, where
+the queries of the chunks cannot run, and only iterates sync iterators, so
+exports are refused under ASGI before anything is sent.
+"""
+import csv
+from itertools import islice
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.translation import gettext_lazy as _
+from rest_framework.decorators import action
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from core.models import Recepie
+from recepie.filters import filter_recepies
+
+EXPORT_FIELDS = ('id', 'title', 'price', 'time_minutes', 'description',
+                 'link')
+
+# Separator of the tag names in the tags column of CSV exports
+CSV_TAG_SEPARATOR = '|'
+
+
+def iter_recepies(queryset, chunk_size):
+    """
+    Yield the recepies of the queryset as dicts with their tags
+    """
+    rows = queryset.order_by('id').values(*EXPORT_FIELDS).iterator(
+        chunk_size=chunk_size)
+    through = Recepie.tags.through
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        tags = {row['id']: [] for row in chunk}
+        links = through.objects.filter(recepie_id__in=list(tags)).order_by(
+            'tag_id').values_list('recepie_id', 'tag_id', 'tag__name')
+        for recepie_id, tag_id, name in links:
+            tags[recepie_id].append({'id': tag_id, 'name': name})
+        for row in chunk:
+            row['tags'] = tags[row['id']]
+            yield row
+
+
+def iter_ndjson(recepies):
+    """Yield one JSON document per recepie"""
+    encoder = DjangoJSONEncoder()
+    for recepie in recepies:
+        yield encoder.encode(recepie) + '\n'
+
+
+class ExportUnavailable(APIException):
+    """The export cannot be streamed by the server handling the request"""
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = _('Exports are only served over WSGI.')
+    default_code = 'export_unavailable'
+
+
+class _Echo:
+    """File-like object returning what is written to it"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(recepies):
+    """Yield a CSV header and one row per recepie"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS + ('tags',))
+    for recepie in recepies:
+        yield writer.writerow(
+            [recepie[field] for field in EXPORT_FIELDS]
+            + [CSV_TAG_SEPARATOR.join(tag['name']
+                                      for tag in recepie['tags'])])
+
+
+EXPORT_FORMATS = {
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+    'csv': (iter_csv, 'text/csv'),
+}
+
+
+class ExportRecepieMixin:
+    """
+    Add an export/ route streaming all of the user's recepies
+    """
+
+    @action(detail=False, url_path='export')
+    def export(self, request):
+        """
+        Stream the user's recepies matching the list filters and their
+        tags, as NDJSON or with ?output=csv as CSV
+        """
+        if isinstance(request._request, ASGIRequest):
+            raise ExportUnavailable()
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_FORMATS:
+            raise ValidationError({'output': [
+                _('Must be one of: %(formats)s')
+                % {'formats': ', '.join(EXPORT_FORMATS)}]})
+        encode, content_type = EXPORT_FORMATS[output]
+        recepies = iter_recepies(
+            filter_recepies(Recepie.objects.filter(user=request.user),
+                            request.query_params, request.user),
+            settings.API_EXPORT_CHUNK_SIZE,
+        )
+        response = StreamingHttpResponse(encode(recepies),
+                                         content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="recepies.{output}"')
+        return response
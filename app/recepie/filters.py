@@ -0,0 +1,121 @@
+"""
+Query parameter filters of the recepie list
+
+Tag filters are subqueries on the through table, which has an index for
+lookups starting from tags, so recepies are never duplicated by a join.
+Price, time and title filters use the (user, column) indexes of Recepie.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.db.models import Count, Exists, OuterRef
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from core.models import Recepie, Tag
+
+TAG_MATCHES = ('any', 'all')
+
+# Values the columns filtered on can hold, beyond which databases fail to
+# bind the parameter instead of matching nothing
+INTEGER_RANGES = BaseDatabaseOperations.integer_field_ranges
+
+
+def _split(params, name):
+    """Return the comma separated values of a parameter"""
+    return [value.strip() for value in params.get(name, '').split(',')
+            if value.strip()]
+
+
+def _parse(params, name, parse, message):
+    """Return the parsed parameter or None when it is not given"""
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return parse(value)
+    except (ValueError, InvalidOperation):
+        raise ValidationError({name: [message]})
+
+
+def _decimal(value):
+    """Parse a finite decimal number"""
+    value = Decimal(value)
+    if not value.is_finite():
+        raise ValueError(value)
+    return value
+
+
+def _integer(field_type):
+    """Return a parser of integers in the range of a column type"""
+    low, high = INTEGER_RANGES[field_type]
+
+    def parse(value):
+        value = int(value)
+        if not low <= value <= high:
+            raise ValueError(value)
+        return value
+    return parse
+
+
+def _tag_ids(params):
+    """Return the tag ids of the tags parameter"""
+    parse = _integer('BigIntegerField')
+    try:
+        return [parse(value) for value in _split(params, 'tags')]
+    except ValueError:
+        raise ValidationError({'tags': [
+            _('Must be a comma separated list of tag ids.')]})
+
+
+def _filter_tags(queryset, links, count, match):
+    """Keep recepies linked to any or all of the matched tags"""
+    if match == 'any':
+        return queryset.filter(Exists(links.filter(recepie=OuterRef('pk'))))
+    return queryset.filter(pk__in=links.values('recepie_id').annotate(
+        matched=Count('tag_id', distinct=True),
+    ).filter(matched=count).values('recepie_id'))
+
+
+def filter_recepies(queryset, params, user):
+    """
+    Filter the user's recepies by the query parameters:
+
+    tags, tag_names -- comma separated tag ids or names
+    tags_match -- 'any' (default) or 'all' of the given tags
+    min_price, max_price -- inclusive price range
+    max_time -- maximum time_minutes
+    title -- case sensitive title prefix
+    """
+    match = params.get('tags_match', 'any')
+    if match not in TAG_MATCHES:
+        raise ValidationError({'tags_match': [
+            _('Must be one of: %(matches)s')
+            % {'matches': ', '.join(TAG_MATCHES)}]})
+    through = Recepie.tags.through
+    tag_ids = set(_tag_ids(params))
+    if tag_ids:
+        queryset = _filter_tags(
+            queryset, through.objects.filter(tag_id__in=tag_ids),
+            len(tag_ids), match)
+    names = set(_split(params, 'tag_names'))
+    if names:
+        queryset = _filter_tags(
+            queryset, through.objects.filter(tag_id__in=Tag.objects.filter(
+                user=user, name__in=names).values('id')),
+            len(names), match)
+
+    number = _('A valid number is required.')
+    min_price = _parse(params, 'min_price', _decimal, number)
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    max_price = _parse(params, 'max_price', _decimal, number)
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+    max_time = _parse(params, 'max_time', _integer('IntegerField'),
+                      _('A valid integer is required.'))
+    if max_time is not None:
+        queryset = queryset.filter(time_minutes__lte=max_time)
+    title = params.get('title')
+    if title:
+        queryset = queryset.filter(title__startswith=title)
+    return queryset
@@ -0,0 +1,137 @@
+"""
+Pagination for recepie API
+"""
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import Cursor, CursorPagination, \
+    _reverse_ordering
+
+
+class RecepieCursorPagination(CursorPagination):
+    """
+    Keyset pagination over recepies, newest first
+    """
+    ordering = '-id'
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination comparing rows on every field of orderings that end
+    with a unique field
+
+    DRF's cursors only hold the first field and skip the rows tied with it
+    by an offset, which stops at offset_cutoff, so pages of many ties
+    repeat forever. These cursors hold the values of all the fields of the
+    row before the page, as JSON.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse, position = ((False, None) if self.cursor is None
+                             else (self.cursor.reverse, self.cursor.position))
+        ordering = (_reverse_ordering(self.ordering) if reverse
+                    else self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = self._after(queryset, ordering, position)
+
+        # One more row tells whether there is a page after this one
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+        self.has_next = position is not None if reverse else more
+        self.has_previous = more if reverse else position is not None
+        self.next_position = self.previous_position = position
+        if self.page:
+            self.next_position = self._get_position_from_instance(
+                self.page[-1], self.ordering)
+            self.previous_position = self._get_position_from_instance(
+                self.page[0], self.ordering)
+        if (self.has_previous or self.has_next) and \
+                self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True, position=self.previous_position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        """Return the values of the ordering fields of a row as JSON"""
+        values = []
+        for field in ordering:
+            name = field.lstrip('-')
+            values.append(instance[name] if isinstance(instance, dict)
+                          else getattr(instance, name))
+        return json.dumps(values)
+
+    def _after(self, queryset, ordering, position):
+        """
+        Keep the rows following the position in the ordering, the rows
+        equal on the first fields and past it on the next one
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            values = None
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        after, equal = Q(), Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = '__lt' if field.startswith('-') else '__gt'
+            after |= equal & Q(**{name + lookup: value})
+            equal &= Q(**{name: value})
+        try:
+            return queryset.filter(after)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class TagCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination over tags in reverse name order, or most used first
+    with ?ordering=-usage
+    """
+    ordering = '-name'
+    orderings = {
+        '-name': ('-name',),
+        '-usage': ('-recepie_count', '-id'),
+    }
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Return the ordering selected by the ordering query parameter
+        """
+        ordering = request.query_params.get('ordering', self.ordering)
+        if ordering not in self.orderings:
+            raise ValidationError({'ordering': [
+                _('Must be one of: %(orderings)s')
+                % {'orderings': ', '.join(self.orderings)}]})
+        return self.orderings[ordering]
@@ -0,0 +1,67 @@
+"""
+Full text search of recepie titles and descriptions
+
+On PostgreSQL the search matches the trigger maintained search_vector
+column through its GIN index and orders by relevance, where title words
+weigh more than description words. Other databases, such as the SQLite
+used for local tests, fall back to substring matches on both columns.
+"""
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils.translation import gettext_lazy as _
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+# Text search configuration of the search_vector trigger
+SEARCH_CONFIG = 'english'
+
+
+def search_recepies(queryset, text):
+    """
+    Return the recepies matching the search text, most relevant first
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(text, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query),
+        ).order_by('-rank', '-id')
+    terms = text.split()
+    for term in terms:
+        queryset = queryset.filter(Q(title__icontains=term)
+                                   | Q(description__icontains=term))
+    title_matches = sum(
+        (Case(When(title__icontains=term, then=Value(1)), default=Value(0),
+              output_field=IntegerField())
+         for term in terms),
+        Value(0),
+    )
+    return queryset.annotate(rank=title_matches).order_by('-rank', '-id')
+
+
+class SearchRecepieMixin:
+    """
+    Add a search/ route returning the most relevant of the user's recepies
+    """
+
+    @action(detail=False, url_path='search')
+    def search(self, request):
+        """
+        Search the user's recepies for the ?q= text, combined with the list
+        filters and limited to ?limit= results
+        """
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': [_('This field is required.')]})
+        limit = request.query_params.get('limit', settings.API_PAGE_SIZE)
+        try:
+            limit = min(max(int(limit), 1), settings.API_MAX_PAGE_SIZE)
+        except ValueError:
+            raise ValidationError({'limit': [
+                _('A valid integer is required.')]})
+        recepies = search_recepies(self.get_queryset(), text)[:limit]
+        serializer = self.get_serializer(recepies, many=True)
+        return Response({'results': serializer.data})
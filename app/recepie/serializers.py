@@ -1,11 +1,13 @@
 """
 Recepie serializers
 """
+from django.db import transaction
 from rest_framework import serializers
 from core.models import Recepie, Tag
+from core.serializers import TimedDataMixin, TimedListSerializer
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedDataMixin, serializers.ModelSerializer):
     """
     Serializer for tag objects
     """
@@ -14,9 +16,86 @@ class TagSerializer(serializers.ModelSerializer):
         model = Tag
         fields = ('id', 'name')
         read_only_fields = ('id',)
+        list_serializer_class = TimedListSerializer
 
 
-class RecipieSerializer(serializers.ModelSerializer):
+class TagUsageSerializer(TagSerializer):
+    """
+    Serializer for tag objects with the number of recepies using them
+    """
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ('recepie_count',)
+        read_only_fields = fields
+
+
+class ValuesListSerializer(TimedListSerializer):
+    """
+    Read only list serializer that renders rows from values() directly
+
+    Each plain field is formatted with its serializer field's
+    to_representation and nested many to many fields are loaded for all
+    rows with one query, skipping the per field machinery of the child
+    serializer while producing the same data. Model instances are rendered
+    by the child serializer as usual.
+    """
+
+    def to_representation(self, data):
+        rows = data.all() if hasattr(data, 'all') else data
+        rows = list(rows)
+        if not rows or not isinstance(rows[0], dict):
+            return super().to_representation(rows)
+        plain, nested = [], []
+        for name, field in self.child.fields.items():
+            if isinstance(field, serializers.ListSerializer):
+                nested.append((name, field.child))
+            else:
+                plain.append((name, field.to_representation))
+        related = {
+            name: self._load_nested(name, child, rows)
+            for name, child in nested
+        }
+        results = []
+        for row in rows:
+            item = {}
+            for name, to_representation in plain:
+                value = row[name]
+                item[name] = None if value is None else \
+                    to_representation(value)
+            for name, child in nested:
+                item[name] = related[name].get(row['id'], [])
+            results.append(item)
+        return results
+
+    def _load_nested(self, name, child, rows):
+        """
+        Return the rendered related objects of the rows by row id, ordered
+        by id like the prefetch of the child serializer
+        """
+        field = self.child.Meta.model._meta.get_field(name)
+        through = field.remote_field.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        formats = [(nested_name, nested_field.to_representation)
+                   for nested_name, nested_field in child.fields.items()]
+        links = through.objects.filter(**{
+            f'{source}_id__in': [row['id'] for row in rows],
+        }).order_by(f'{target}_id').values_list(
+            f'{source}_id',
+            *(f'{target}__{nested_name}' for nested_name, _ in formats),
+        )
+        related = {}
+        for row_id, *values in links:
+            related.setdefault(row_id, []).append({
+                nested_name: None if value is None else to_representation(
+                    value)
+                for (nested_name, to_representation), value
+                in zip(formats, values)
+            })
+        return related
+
+
+class RecipieSerializer(TimedDataMixin, serializers.ModelSerializer):
     """
     Serializer for recepie objects
     """
@@ -27,17 +106,60 @@ class RecipieSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'price',
                   'time_minutes', 'link', 'tags')
         read_only_fields = ('id',)
+        list_serializer_class = ValuesListSerializer
+
+    def _resolve_tags(self, tags):
+        """
+        Get or create the requested tags for the user in bulk
+        """
+        return Tag.objects.get_or_create_many(
+            self.context['request'].user, [tag['name'] for tag in tags])
+
+    def _add_tags(self, recepie, tag_ids, current=None):
+        """
+        Attach the tags the recepie is not linked to yet with a single
+        through table insert, counting only the links inserted
+
+        current -- ids of the tags already linked, read from the through
+        table when not given
+        """
+        through = Recepie.tags.through
+        if current is None:
+            current = through.objects.filter(
+                recepie_id=recepie.id, tag_id__in=tag_ids).values_list(
+                    'tag_id', flat=True)
+        tag_ids = set(tag_ids) - set(current)
+        through.objects.bulk_create(
+            [through(recepie_id=recepie.id, tag_id=tag_id)
+             for tag_id in sorted(tag_ids)],
+            ignore_conflicts=True,
+        )
+        Tag.objects.adjust_counts(dict.fromkeys(tag_ids, 1))
 
     def _get_or_create_tag(self, tags, recepie):
         """
-        Get or create a tag
+        Get or create tags in bulk and attach them to the new recepie
+        """
+        # A recepie created in this transaction has no links yet
+        self._add_tags(recepie, [tag.id for tag in self._resolve_tags(tags)],
+                       current=())
+
+    def _set_tags(self, tags, recepie):
+        """
+        Replace the recepie's tags, writing only the rows that changed
         """
-        for tag in tags:
-            tag_obj = Tag.objects.get_or_create(user=self
-                                                .context['request'].user,
-                                                **tag)
-            recepie.tags.add(tag_obj[0])
+        tag_ids = {tag.id for tag in self._resolve_tags(tags)}
+        # Concurrent updates of the recepie's tags wait for this one, so
+        # the links read stay current until they are written
+        Recepie.objects.select_for_update().filter(pk=recepie.pk).exists()
+        links = Recepie.tags.through.objects.filter(recepie_id=recepie.id)
+        current = set(links.values_list('tag_id', flat=True))
+        if current - tag_ids:
+            links.filter(tag_id__in=current - tag_ids).delete()
+            Tag.objects.adjust_counts(dict.fromkeys(current - tag_ids, -1))
+        self._add_tags(recepie, tag_ids, current)
 
+    @transaction.atomic
     def create(self, validated_data):
         """
         Create a new recepie
@@ -47,14 +169,14 @@ class RecipieSerializer(serializers.ModelSerializer):
         self._get_or_create_tag(tags, recepie)
         return recepie
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """
         Update a recepie
         """
         tags = validated_data.pop('tags', None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tag(tags, instance)
+            self._set_tags(tags, instance)
 
         for key, value in validated_data.items():
             setattr(instance, key, value)
@@ -0,0 +1,33 @@
+"""
+Signal handlers for the recepie app
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Recepie, Tag
+from recepie.cache import bump_version
+
+
+@receiver(post_save, sender=Recepie)
+@receiver(post_delete, sender=Recepie)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_owner_responses(sender, instance, **kwargs):
+    """Invalidate cached responses when a recepie or tag changes"""
+    bump_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recepie.tags.through)
+def invalidate_tagged_responses(sender, instance, action, **kwargs):
+    """Invalidate cached responses when tags are added or removed"""
+    if action.startswith('post_'):
+        bump_version(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user_responses(sender, instance, **kwargs):
+    """Never serve responses cached for an earlier user with the same id"""
+    if kwargs.get('created', True):
+        bump_version(instance.pk)
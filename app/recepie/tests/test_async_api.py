@@ -0,0 +1,148 @@
+"""
+Test the async read endpoints of the ASGI application
+"""
+import pstats
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import metrics, profiling
+from core.models import ProfileRecord, Recepie, Tag
+from core.query_budget import QueryBudgetExceeded, QueryBudgetTestMixin
+from recepie.views import RecepieViewSet
+
+RECEPIES_URL = reverse('recepie:recepie-list')
+ASYNC_RECEPIES_URL = reverse('recepie:async-recepie-list')
+ASYNC_TAGS_URL = reverse('recepie:async-tag-list')
+
+
+def async_detail_url(recepie_id):
+    """Helper function to create async recepie detail url"""
+    return reverse('recepie:async-recepie-detail', args=[recepie_id])
+
+
+def sample(line_start):
+    """Return the value of the first metric sample starting with line_start"""
+    for line in metrics.registry.render().splitlines():
+        if line.startswith(line_start):
+            return float(line.rsplit(' ', 1)[1])
+    return 0
+
+
+# The views run in a pool of threads, which only see committed data
+class AsyncRecepieApiTests(QueryBudgetTestMixin, TransactionTestCase):
+    """Test the async endpoints serve what the sync ones do"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass')
+        token = Token.objects.create(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recepies = []
+        for title in ('Curry', 'Dal'):
+            recepie = Recepie.objects.create(
+                user=self.user, title=title, description='Spicy', price=5,
+                time_minutes=10)
+            recepie.tags.add(tag)
+            self.recepies.append(recepie)
+        self.client = AsyncClient()
+        self.auth = {'authorization': f'Token {token.key}'}
+
+    async def test_login_required(self):
+        """Test the async endpoints require authentication"""
+        res = await self.client.get(ASYNC_RECEPIES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_list_matches_sync(self):
+        """Test the async list returns the page of the sync one under WSGI"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        expected = client.get(RECEPIES_URL).json()['results']
+
+        res = client.get(ASYNC_RECEPIES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['results'], expected)
+
+    async def test_list(self):
+        """Test listing recepies under ASGI"""
+        res = await self.client.get(ASYNC_RECEPIES_URL, **self.auth)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertEqual([item['title'] for item in res.json()['results']],
+                         ['Dal', 'Curry'])
+
+    async def test_detail(self):
+        """Test retrieving a recepie under ASGI"""
+        res = await self.client.get(async_detail_url(self.recepies[0].id),
+                                    **self.auth)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['title'], 'Curry')
+        self.assertEqual(res.json()['tags'][0]['name'], 'Vegan')
+        self.assertTrue(res.has_header('ETag'))
+
+    async def test_tag_list(self):
+        """Test listing tags under ASGI"""
+        res = await self.client.get(ASYNC_TAGS_URL, **self.auth)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in res.json()['results']],
+                         ['Vegan'])
+
+    async def test_read_only(self):
+        """Test the async endpoints do not accept writes"""
+        res = await self.client.post(ASYNC_RECEPIES_URL, {'title': 'Soup'},
+                                     content_type='application/json',
+                                     **self.auth)
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_queries_recorded(self):
+        """Test queries run in the pool count towards the request metrics"""
+        name = ('http_request_db_queries_sum{'
+                'view="recepie:async-recepie-list",method="GET"}')
+        before = sample(name)
+
+        with override_settings(METRICS={'ENABLED': True, 'TOKEN': None,
+                                        'SLOW_REQUEST_MS': 0}):
+            await self.client.get(ASYNC_RECEPIES_URL, **self.auth)
+
+        self.assertGreater(sample(name), before)
+
+    async def test_query_budget_enforced(self):
+        """Test the async views keep the budgets of their viewset"""
+        with patch.object(RecepieViewSet, 'query_budget', {'list': 0}):
+            with self.assertRaisesMessage(QueryBudgetExceeded,
+                                          'over its budget of 0'):
+                await self.client.get(ASYNC_RECEPIES_URL, **self.auth)
+
+    async def test_profiled_in_pool(self):
+        """Test profiles of async views cover the work of the pool thread"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        # Storing the profile runs queries of its own
+        with override_settings(QUERY_BUDGET={'ENABLED': False}, PROFILING={
+                'ENABLED': True, 'DIR': directory, 'MAX_FILES': 2,
+                'TOKEN_MAX_AGE': 60, 'SAMPLE_INTERVAL': 0.001}):
+            res = await self.client.get(ASYNC_RECEPIES_URL,
+                                        x_profile=profiling.make_token(),
+                                        **self.auth)
+            record = await sync_to_async(ProfileRecord.objects.get)(
+                pk=res['X-Profile-Id'])
+            stats = pstats.Stats(str(profiling.profile_path(record)),
+                                 stream=StringIO())
+
+        self.assertIn('list', {name for _, _, name in stats.stats})
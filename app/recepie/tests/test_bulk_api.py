@@ -0,0 +1,146 @@
+"""
+Tests for the bulk recepie API
+"""
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from core.models import Recepie, Tag, Tombstone
+from core.query_budget import QueryBudgetTestMixin
+from recepie.tests.utils import AuthenticatedApiTestMixin, create_recepie, \
+    create_user
+
+BULK_URL = reverse('recepie:recepie-bulk')
+
+
+def recepie_payload(**params):
+    """Helper function to build a recepie payload"""
+    payload = {
+        'title': 'Bulk recepie',
+        'description': 'Bulk description',
+        'price': '5.00',
+        'time_minutes': 10,
+    }
+    payload.update(params)
+    return payload
+
+
+class BulkRecepieApiTests(AuthenticatedApiTestMixin, QueryBudgetTestMixin,
+                          TestCase):
+    """Test bulk create, update and delete of recepies"""
+
+    def test_bulk_create(self):
+        """Test creating recepies with tags in one request"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        payload = [
+            recepie_payload(title=f'Recepie {i}', tags=[
+                {'name': 'Vegan'}, {'name': f'Tag {i}'},
+            ])
+            for i in range(3)
+        ]
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        results = res.data['results']
+        self.assertEqual([r['data']['title'] for r in results],
+                         ['Recepie 0', 'Recepie 1', 'Recepie 2'])
+        for i, result in enumerate(results):
+            recepie = Recepie.objects.get(id=result['data']['id'])
+            self.assertEqual(recepie.user, self.user)
+            self.assertEqual(
+                sorted(tag.name for tag in recepie.tags.all()),
+                ['Tag %d' % i, 'Vegan'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+
+    def test_bulk_create_query_count_is_constant(self):
+        """Test the number of queries does not grow with the batch"""
+        def payload(count):
+            return [
+                recepie_payload(tags=[{'name': f'Tag {i % 5}'}])
+                for i in range(count)
+            ]
+        self.client.post(BULK_URL, payload(2), format='json')
+        with self.assertNumQueries(13):
+            res = self.client.post(BULK_URL, payload(50), format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_bulk_create_reports_invalid_items(self):
+        """Test invalid items are reported and valid ones created"""
+        payload = [recepie_payload(), {'title': 'No price'}]
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        created, failed = res.data['results']
+        self.assertEqual(created['status'], status.HTTP_201_CREATED)
+        self.assertEqual(failed['status'], status.HTTP_400_BAD_REQUEST)
+        self.assertIn('price', failed['errors'])
+        self.assertEqual(Recepie.objects.count(), 1)
+
+    def test_bulk_create_atomic(self):
+        """Test an invalid item rejects the whole batch in atomic mode"""
+        payload = [recepie_payload(), {'title': 'No price'}]
+        res = self.client.post(BULK_URL + '?atomic=true', payload,
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNone(res.data['results'][0])
+        self.assertFalse(Recepie.objects.exists())
+
+    def test_bulk_update(self):
+        """Test partially updating recepies and their tags"""
+        first = create_recepie(user=self.user, title='First')
+        second = create_recepie(user=self.user, title='Second')
+        first.tags.add(Tag.objects.create(user=self.user, name='Old'))
+        other = create_recepie(
+            user=create_user(email='other@example.com', password='testpass'))
+        payload = [
+            {'id': first.id, 'tags': [{'name': 'New'}]},
+            {'id': second.id, 'title': 'Renamed'},
+            {'id': other.id, 'title': 'Not mine'},
+        ]
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        statuses = [r['status'] for r in res.data['results']]
+        self.assertEqual(statuses, [200, 200, 404])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(first.title, 'First')
+        self.assertEqual([tag.name for tag in first.tags.all()], ['New'])
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'recepie_count')),
+            {'Old': 0, 'New': 1})
+        self.assertEqual(second.title, 'Renamed')
+        self.assertEqual(other.title, 'Test recepie')
+
+    def test_bulk_delete(self):
+        """Test deleting recepies by id records tombstones"""
+        recepies = [create_recepie(user=self.user) for _ in range(3)]
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        tag.recepie_set.add(*recepies)
+        ids = [recepie.id for recepie in recepies[:2]]
+        res = self.client.delete(BULK_URL, ids + [0], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        statuses = [r['status'] for r in res.data['results']]
+        self.assertEqual(statuses, [204, 204, 404])
+        self.assertEqual(list(Recepie.objects.values_list('id', flat=True)),
+                         [recepies[2].id])
+        self.assertEqual(
+            sorted(Tombstone.objects.values_list('object_id', flat=True)),
+            ids)
+        tag.refresh_from_db()
+        self.assertEqual(tag.recepie_count, 1)
+
+    @override_settings(API_BULK_MAX_SIZE=2)
+    def test_bulk_size_limited(self):
+        """Test batches over the size limit are rejected"""
+        res = self.client.post(BULK_URL, [recepie_payload()] * 3,
+                               format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recepie.objects.exists())
+
+    def test_bulk_requires_list(self):
+        """Test a body that is not a list is rejected"""
+        res = self.client.post(BULK_URL, recepie_payload(), format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
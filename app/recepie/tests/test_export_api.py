@@ -0,0 +1,98 @@
+"""
+Tests for the recepie export API
+"""
+import csv
+import gzip
+import io
+import json
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from core.models import Tag
+from core.query_budget import QueryBudgetTestMixin
+from recepie.tests.utils import AuthenticatedApiTestMixin, create_recepie, \
+    create_user
+
+EXPORT_URL = reverse('recepie:recepie-export')
+
+
+class RecepieExportApiTests(AuthenticatedApiTestMixin, QueryBudgetTestMixin,
+                            TestCase):
+    """Test streaming exports of the user's recepies"""
+
+    def setUp(self):
+        super().setUp()
+        self.recepie = create_recepie(user=self.user, title='Curry')
+        self.recepie.tags.add(Tag.objects.create(user=self.user, name='Hot'),
+                              Tag.objects.create(user=self.user, name='Main'))
+        create_recepie(user=self.user, title='Salad')
+        other = create_user(email='other@example.com', password='testpass')
+        create_recepie(user=other, title='Not mine')
+
+    def export(self, **params):
+        """Fetch an export and return its body"""
+        res = self.client.get(EXPORT_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        return res, b''.join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """Test exporting recepies with their tags as NDJSON"""
+        res, body = self.export()
+
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Curry', 'Salad'])
+        self.assertEqual(rows[0]['price'], '10.00')
+        self.assertEqual([tag['name'] for tag in rows[0]['tags']],
+                         ['Hot', 'Main'])
+        self.assertEqual(rows[1]['tags'], [])
+
+    def test_export_csv(self):
+        """Test exporting recepies as CSV"""
+        res, body = self.export(output='csv')
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([row['title'] for row in rows], ['Curry', 'Salad'])
+        self.assertEqual(rows[0]['tags'], 'Hot|Main')
+        self.assertEqual(rows[0]['description'], 'Test description')
+
+    @override_settings(API_EXPORT_CHUNK_SIZE=2)
+    def test_export_reads_in_chunks(self):
+        """Test tags are loaded once per chunk of recepies"""
+        for _ in range(3):
+            create_recepie(user=self.user)
+        res = self.client.get(EXPORT_URL)
+        # the recepie cursor and a tag query for each of three chunks
+        with self.assertNumQueries(4):
+            lines = b''.join(res.streaming_content).splitlines()
+        self.assertEqual(len(lines), 5)
+
+    def test_export_compressed(self):
+        """Test exports are streamed gzip compressed when accepted"""
+        res = self.client.get(EXPORT_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(res.streaming_content)).decode()
+        self.assertEqual(len(body.splitlines()), 2)
+
+    def test_export_unknown_output(self):
+        """Test an unknown output format is rejected"""
+        res = self.client.get(EXPORT_URL, {'output': 'xml'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_export_refused_under_asgi(self):
+        """Test exports fail up front under ASGI instead of mid-stream"""
+        token = await sync_to_async(Token.objects.create)(user=self.user)
+
+        res = await AsyncClient().get(
+            EXPORT_URL, authorization=f'Token {token.key}')
+
+        self.assertEqual(res.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+        self.assertFalse(res.streaming)
+        self.assertEqual(res.json()['detail'],
+                         'Exports are only served over WSGI.')
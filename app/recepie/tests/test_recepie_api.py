@@ -1,42 +1,25 @@
 """
 Test cases for recepie api
 """
+from datetime import timedelta
 from decimal import Decimal
+from unittest.mock import patch
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Prefetch
 from django.test import TestCase
-from django.contrib.auth import get_user_model
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework import status
+from django.utils import timezone
+from rest_framework import status, viewsets
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 from core.models import Recepie, Tag
+from core.query_budget import QueryBudgetTestMixin
+from recepie.conditional import ConditionalGetMixin
 from recepie.serializers import RecipieSerializer, RecepieDetailSerializer
-
-
-def detail_url(recepie_id):
-    """Helper function to create recepie detail url"""
-    return reverse('recepie:recepie-detail', args=[recepie_id])
-
-
-def create_recepie(user, **params):
-    """Helper function to create recepie"""
-    defaults = {
-        'title': 'Test recepie',
-        'description': 'Test description',
-        'price': Decimal(10.00),
-        'time_minutes': 5,
-        'link': 'https://www.google.com'
-    }
-    defaults.update(params)
-    return Recepie.objects.create(user=user, **defaults)
-
-
-def create_user(**params):
-    """Helper function to create user"""
-    return get_user_model().objects.create_user(**params)
-
-
-def create_tag(user, name='Main course'):
-    """Helper function to create tag"""
-    return Tag.objects.create(user=user, name=name)
+from recepie.tests.utils import AuthenticatedApiTestMixin, create_recepie, \
+    create_tag, create_user, detail_url
 
 
 class PublicRecepieApiTests(TestCase):
@@ -53,20 +36,10 @@ class PublicRecepieApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateRecepieApiTests(TestCase):
+class PrivateRecepieApiTests(AuthenticatedApiTestMixin, QueryBudgetTestMixin,
+                             TestCase):
     """Test cases for private recepie api"""
 
-    def setUp(self):
-        """Setup test cases"""
-        self.client = APIClient()
-        payload = {
-            'email': 'test@example.com',
-            'password': 'testpass',
-            'name': 'Test name'
-        }
-        self.user = create_user(**payload)
-        self.client.force_authenticate(self.user)
-
     def test_retrieve_recepies(self):
         """Test retrieving a list of recepies"""
         create_recepie(user=self.user)
@@ -76,7 +49,7 @@ class PrivateRecepieApiTests(TestCase):
         serializer = RecipieSerializer(recepies, many=True)
         res = self.client.get(url)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recepies_limited_to_user(self):
         """Test that recepies returned are for the authenticated user"""
@@ -93,8 +66,8 @@ class PrivateRecepieApiTests(TestCase):
         recepies = Recepie.objects.filter(user=self.user)
         serializer = RecipieSerializer(recepies, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_view_recepie_detail(self):
         """Test viewing a recepie detail"""
@@ -266,3 +239,299 @@ class PrivateRecepieApiTests(TestCase):
         res = self.client.patch(url, payload, format='json')
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recepie.tags.count(), 0)
+
+    def _create_tagged_recepies(self, count):
+        """Bulk create recepies that each carry two tags"""
+        tags = Tag.objects.get_or_create_many(self.user, ['indian', 'vegan'])
+        Recepie.objects.bulk_create([
+            Recepie(user=self.user, title=f'Recepie {i}', price=Decimal('5'),
+                    time_minutes=10, description='Test description')
+            for i in range(count)
+        ])
+        through = Recepie.tags.through
+        through.objects.bulk_create([
+            through(recepie_id=recepie_id, tag_id=tag.id)
+            for recepie_id in Recepie.objects.filter(
+                user=self.user, tags=None).values_list('id', flat=True)
+            for tag in tags
+        ])
+
+    def test_list_recepies_constant_queries(self):
+        """Test listing recepies does not issue a query per recepie"""
+        url = reverse('recepie:recepie-list')
+        created = 0
+        for total in (1, 100, 1000):
+            self._create_tagged_recepies(total - created)
+            created = total
+            # ETag validators, the page of recepies and their tags
+            with self.assertNumQueries(3):
+                res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(res.data['results'][0]['tags']), 2)
+
+    def test_retrieve_recepie_prefetches_tags(self):
+        """Test retrieving a recepie loads its tags in a single query"""
+        recepie = create_recepie(user=self.user)
+        for name in ('indian', 'vegan', 'dinner'):
+            recepie.tags.add(create_tag(user=self.user, name=name))
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(recepie.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 3)
+        self.assertEqual(res.data['description'], recepie.description)
+
+    def test_list_recepies_paginated_by_cursor(self):
+        """Test walking every page of recepies with the cursor links"""
+        recepies = [create_recepie(user=self.user) for _ in range(5)]
+        url = reverse('recepie:recepie-list')
+        res = self.client.get(url, {'page_size': 2})
+        self.assertIsNone(res.data['previous'])
+        ids = []
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(res.data['results']), 2)
+            ids.extend(item['id'] for item in res.data['results'])
+            if not res.data['next']:
+                break
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(res.data['next'])
+            self.assertNotIn('OFFSET', ctx.captured_queries[0]['sql'])
+        self.assertEqual(ids, [r.id for r in reversed(recepies)])
+
+    @patch('recepie.pagination.RecepieCursorPagination.max_page_size', 3)
+    def test_list_recepies_page_size_capped(self):
+        """Test requested page sizes are capped at the maximum"""
+        for _ in range(5):
+            create_recepie(user=self.user)
+        url = reverse('recepie:recepie-list')
+        res = self.client.get(url, {'page_size': 1000})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 3)
+        self.assertIsNotNone(res.data['next'])
+
+    def test_create_recipe_with_many_tags_query_count(self):
+        """Test tags are resolved and attached in bulk on create"""
+        for i in range(25):
+            create_tag(user=self.user, name=f'tag {i}')
+        payload = {
+            'title': 'feast',
+            'time_minutes': 90,
+            'price': Decimal('20.00'),
+            'description': 'test description',
+            'tags': [{'name': f'tag {i}'} for i in range(50)],
+        }
+        url = reverse('recepie:recepie-list')
+        # savepoint, change sequence and recepie insert, tag lookup, change
+        # sequence and tag insert, lookup of the inserted tags, through
+        # table insert, tag count update, savepoint release and reading the
+        # tags back for the response
+        with self.assertNumQueries(11):
+            res = self.client.post(url, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recepie = Recepie.objects.get(id=res.data['id'])
+        self.assertEqual(recepie.tags.count(), 50)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 50)
+
+    def _through_writes(self, queries):
+        """Return the captured writes to the recepie tags through table"""
+        return [query['sql'] for query in queries
+                if 'core_recepie_tags' in query['sql']
+                and query['sql'].startswith(('INSERT', 'DELETE'))]
+
+    def test_update_unchanged_tags_skips_writes(self):
+        """Test sending the current tag list does not rewrite its rows"""
+        recepie = create_recepie(user=self.user)
+        for name in ('indian', 'dinner'):
+            recepie.tags.add(create_tag(user=self.user, name=name))
+        payload = {'tags': [{'name': 'dinner'}, {'name': 'indian'}]}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(detail_url(recepie.id), payload,
+                                    format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._through_writes(ctx.captured_queries), [])
+        self.assertEqual(recepie.tags.count(), 2)
+
+    def test_adding_linked_tags_keeps_counts(self):
+        """Test links that already exist are not counted again"""
+        recepie = create_recepie(user=self.user)
+        linked = create_tag(user=self.user, name='indian')
+        recepie.tags.add(linked)
+        added = create_tag(user=self.user, name='dinner')
+
+        RecepieDetailSerializer()._add_tags(recepie, [linked.id, added.id])
+
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'recepie_count')),
+            {'indian': 1, 'dinner': 1})
+        self.assertEqual(recepie.tags.count(), 2)
+
+    def test_update_tags_writes_only_difference(self):
+        """Test changing tags inserts and deletes only the changed rows"""
+        recepie = create_recepie(user=self.user)
+        kept = create_tag(user=self.user, name='indian')
+        dropped = create_tag(user=self.user, name='dinner')
+        recepie.tags.add(kept, dropped)
+        payload = {'tags': [{'name': 'indian'}, {'name': 'spicy'}]}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(detail_url(recepie.id), payload,
+                                    format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = self._through_writes(ctx.captured_queries)
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(
+            set(recepie.tags.values_list('name', flat=True)),
+            {'indian', 'spicy'},
+        )
+
+    def test_list_not_modified(self):
+        """Test a current ETag is answered with 304 from one aggregate"""
+        create_recepie(user=self.user)
+        url = reverse('recepie:recepie-list')
+        res = self.client.get(url)
+        self.assertIn('ETag', res)
+        self.assertIn('Last-Modified', res)
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+    def test_list_etag_changes_on_write(self):
+        """Test the list ETag changes when recepies or tags change"""
+        recepie = create_recepie(user=self.user)
+        url = reverse('recepie:recepie-list')
+        etag = self.client.get(url)['ETag']
+        tag = create_tag(user=self.user)
+        recepie.tags.add(tag)
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        etag = res['ETag']
+        create_recepie(user=self.user).delete()
+        tag.delete()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_detail_not_modified_since(self):
+        """Test If-Modified-Since on a recepie detail"""
+        recepie = create_recepie(user=self.user)
+        res = self.client.get(detail_url(recepie.id))
+        res = self.client.get(detail_url(recepie.id),
+                              HTTP_IF_MODIFIED_SINCE=res['Last-Modified'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        res = self.client.get(detail_url(recepie.id),
+                              HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 1970 '
+                                                     '00:00:00 GMT')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_modified_since_delete(self):
+        """Test If-Modified-Since on the list after a recepie is deleted"""
+        create_recepie(user=self.user)
+        deleted = create_recepie(user=self.user)
+        Recepie.objects.update(
+            updated_at=timezone.now() - timedelta(hours=1))
+        url = reverse('recepie:recepie-list')
+        last_modified = self.client.get(url)['Last-Modified']
+
+        deleted.delete()
+        res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertNotEqual(res['Last-Modified'], last_modified)
+
+    def test_conditional_view_requires_validator_state(self):
+        """Test views without get_validator_state fail when defined"""
+        with self.assertRaises(ImproperlyConfigured):
+            type('NoValidators', (ConditionalGetMixin, viewsets.ModelViewSet),
+                 {'queryset': Recepie.objects.all()})
+
+    def _list_titles(self, **params):
+        """List recepies with the filter parameters and return the titles"""
+        res = self.client.get(reverse('recepie:recepie-list'), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return sorted(recepie['title'] for recepie in res.data['results'])
+
+    def test_filter_by_tags(self):
+        """Test filtering recepies by any or all of some tags"""
+        vegan = create_tag(user=self.user, name='Vegan')
+        quick = create_tag(user=self.user, name='Quick')
+        create_recepie(user=self.user, title='Both').tags.add(vegan, quick)
+        create_recepie(user=self.user, title='Vegan').tags.add(vegan)
+        create_recepie(user=self.user, title='Quick').tags.add(quick)
+        create_recepie(user=self.user, title='None')
+        ids = f'{vegan.id},{quick.id}'
+
+        self.assertEqual(self._list_titles(tags=ids),
+                         ['Both', 'Quick', 'Vegan'])
+        self.assertEqual(self._list_titles(tags=ids, tags_match='all'),
+                         ['Both'])
+        self.assertEqual(self._list_titles(tag_names='Vegan'),
+                         ['Both', 'Vegan'])
+        self.assertEqual(
+            self._list_titles(tag_names='Vegan,Quick', tags_match='all'),
+            ['Both'])
+
+    def test_filter_by_other_users_tag_names(self):
+        """Test tag names only match the user's own tags"""
+        other = create_user(email='other@example.com', password='testpass')
+        create_recepie(user=other, title='Theirs').tags.add(
+            create_tag(user=other, name='Vegan'))
+        create_recepie(user=self.user, title='Mine')
+        self.assertEqual(self._list_titles(tag_names='Vegan'), [])
+
+    def test_filter_by_price_time_and_title(self):
+        """Test filtering recepies by price range, time and title prefix"""
+        create_recepie(user=self.user, title='Cheap soup',
+                       price=Decimal('3.00'), time_minutes=10)
+        create_recepie(user=self.user, title='Pricey soup',
+                       price=Decimal('30.00'), time_minutes=10)
+        create_recepie(user=self.user, title='Slow roast',
+                       price=Decimal('12.00'), time_minutes=240)
+
+        self.assertEqual(self._list_titles(min_price='5', max_price='20'),
+                         ['Slow roast'])
+        self.assertEqual(self._list_titles(max_time=60),
+                         ['Cheap soup', 'Pricey soup'])
+        self.assertEqual(self._list_titles(title='Cheap'), ['Cheap soup'])
+
+    def test_filter_rows_not_duplicated(self):
+        """Test recepies matching several tags are listed once"""
+        tags = [create_tag(user=self.user, name=f'Tag {i}') for i in range(3)]
+        create_recepie(user=self.user, title='Tagged').tags.add(*tags)
+        ids = ','.join(str(tag.id) for tag in tags)
+        self.assertEqual(self._list_titles(tags=ids), ['Tagged'])
+
+    def test_filter_invalid_parameters(self):
+        """Test invalid filter values are rejected"""
+        url = reverse('recepie:recepie-list')
+        for params in ({'tags': 'abc'}, {'min_price': 'cheap'},
+                       {'max_price': 'NaN'}, {'max_time': '1.5'},
+                       {'tags_match': 'some'},
+                       {'tags': '1,99999999999999999999'},
+                       {'max_time': '2147483648'},
+                       {'max_time': '-2147483649'}):
+            res = self.client.get(url, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST,
+                             params)
+
+    def test_list_fast_path_renders_identical_json(self):
+        """Test values() rows render the same JSON as model instances"""
+        tags = [create_tag(user=self.user, name=name)
+                for name in ('vegan', 'indian', 'dinner')]
+        create_recepie(user=self.user, price=Decimal('5'), link='')
+        create_recepie(user=self.user, title='Dal', price=Decimal('10.5'),
+                       time_minutes=45).tags.add(tags[2], tags[0])
+        create_recepie(user=self.user, title='Ünïcode "quoted"',
+                       price=Decimal('0.99')).tags.add(*tags)
+        recepies = Recepie.objects.filter(user=self.user).order_by('-id')
+
+        instances = RecipieSerializer(recepies.prefetch_related(Prefetch(
+            'tags', queryset=Tag.objects.order_by('id'))), many=True)
+        rows = RecipieSerializer(recepies.values(
+            'id', 'title', 'price', 'time_minutes', 'link'), many=True)
+
+        self.assertEqual(JSONRenderer().render(rows.data),
+                         JSONRenderer().render(instances.data))
+        res = self.client.get(reverse('recepie:recepie-list'))
+        self.assertEqual(JSONRenderer().render(res.data['results']),
+                         JSONRenderer().render(instances.data))
@@ -0,0 +1,96 @@
+"""
+Tests for cached recepie API responses
+"""
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from core.models import Tag
+from core.query_budget import QueryBudgetTestMixin
+from recepie import cache as response_cache
+from recepie.tests.utils import AuthenticatedApiTestMixin, create_recepie, \
+    create_user, detail_url
+
+RECEPIE_URL = reverse('recepie:recepie-list')
+TAG_URL = reverse('recepie:tag-list')
+
+
+@override_settings(RESPONSE_CACHE={
+    'ENABLED': True, 'CACHE_ALIAS': 'default', 'TIMEOUT': 60,
+})
+class ResponseCacheTests(AuthenticatedApiTestMixin, QueryBudgetTestMixin,
+                         TestCase):
+    """Test list and detail responses are cached per user"""
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def test_list_served_from_cache(self):
+        """Test a repeated list is answered without queries"""
+        create_recepie(user=self.user)
+        res = self.client.get(RECEPIE_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        hits = response_cache.stats()['hits']
+        with self.assertNumQueries(0):
+            cached = self.client.get(RECEPIE_URL)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.data, res.data)
+        self.assertEqual(response_cache.stats()['hits'], hits + 1)
+
+    def test_query_string_cached_separately(self):
+        """Test different pages are cached under different keys"""
+        create_recepie(user=self.user)
+        create_recepie(user=self.user)
+        self.client.get(RECEPIE_URL)
+        res = self.client.get(RECEPIE_URL, {'page_size': 1})
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_api_write_invalidates(self):
+        """Test creating a recepie through the API invalidates the list"""
+        self.client.get(RECEPIE_URL)
+        payload = {'title': 'New', 'time_minutes': 5, 'price': '1.00',
+                   'description': 'Test description'}
+        self.client.post(RECEPIE_URL, payload)
+        res = self.client.get(RECEPIE_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_model_change_invalidates(self):
+        """Test changes made outside the API invalidate responses"""
+        recepie = create_recepie(user=self.user)
+        self.client.get(detail_url(recepie.id))
+        recepie.title = 'Changed'
+        recepie.save()
+        res = self.client.get(detail_url(recepie.id))
+        self.assertEqual(res.data['title'], 'Changed')
+
+    def test_tag_change_invalidates_recepies(self):
+        """Test renaming a tag invalidates the recepies showing it"""
+        recepie = create_recepie(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='old')
+        recepie.tags.add(tag)
+        self.client.get(RECEPIE_URL)
+        self.client.patch(reverse('recepie:tag-detail', args=[tag.id]),
+                          {'name': 'new'})
+        res = self.client.get(RECEPIE_URL)
+        self.assertEqual(res.data['results'][0]['tags'][0]['name'], 'new')
+
+    def test_cache_limited_to_user(self):
+        """Test users never receive responses cached for another user"""
+        create_recepie(user=self.user)
+        self.client.get(RECEPIE_URL)
+        other = create_user(email='other@example.com', password='testpass')
+        self.client.force_authenticate(other)
+        res = self.client.get(RECEPIE_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+
+    def test_cached_response_not_modified(self):
+        """Test a cached response still answers conditional requests"""
+        create_recepie(user=self.user)
+        etag = self.client.get(RECEPIE_URL)['ETag']
+        with self.assertNumQueries(0):
+            res = self.client.get(RECEPIE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], etag)
@@ -0,0 +1,58 @@
+"""
+Tests for the recepie search API
+"""
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from core.models import Tag
+from core.query_budget import QueryBudgetTestMixin
+from recepie.tests.utils import AuthenticatedApiTestMixin, create_recepie, \
+    create_user
+
+SEARCH_URL = reverse('recepie:recepie-search')
+
+
+class RecepieSearchApiTests(AuthenticatedApiTestMixin, QueryBudgetTestMixin,
+                            TestCase):
+    """Test searching the user's recepies"""
+
+    def search(self, **params):
+        """Search and return the titles of the results"""
+        res = self.client.get(SEARCH_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recepie['title'] for recepie in res.data['results']]
+
+    def test_search_title_and_description(self):
+        """Test matches in titles rank above matches in descriptions"""
+        create_recepie(user=self.user, title='Lentil stew',
+                       description='With tomato')
+        create_recepie(user=self.user, title='Tomato soup')
+        create_recepie(user=self.user, title='Pancakes')
+        other = create_user(email='other@example.com', password='testpass')
+        create_recepie(user=other, title='Tomato salad')
+
+        self.assertEqual(self.search(q='tomato'),
+                         ['Tomato soup', 'Lentil stew'])
+        self.assertEqual(self.search(q='tomato stew'), ['Lentil stew'])
+
+    def test_search_with_filters_and_limit(self):
+        """Test search combines with the list filters and a limit"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        create_recepie(user=self.user, title='Bean soup').tags.add(vegan)
+        create_recepie(user=self.user, title='Fish soup')
+        create_recepie(user=self.user, title='Pea soup')
+
+        self.assertEqual(self.search(q='soup', tags=vegan.id), ['Bean soup'])
+        self.assertEqual(len(self.search(q='soup', limit=2)), 2)
+
+    def test_search_results_include_tags(self):
+        """Test search results are serialized with their tags"""
+        recepie = create_recepie(user=self.user, title='Bean soup')
+        recepie.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        res = self.client.get(SEARCH_URL, {'q': 'bean'})
+        self.assertEqual(res.data['results'][0]['tags'][0]['name'], 'Vegan')
+
+    def test_search_requires_query(self):
+        """Test a search without text is rejected"""
+        res = self.client.get(SEARCH_URL)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,131 @@
+"""
+Tests for the recepie delta sync endpoint
+"""
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from core.models import Tag
+from core.query_budget import QueryBudgetTestMixin
+from recepie.tests.utils import AuthenticatedApiTestMixin, create_recepie, \
+    create_user, detail_url
+
+CHANGES_URL = reverse('recepie:recepie-changes')
+
+
+class RecepieSyncApiTests(AuthenticatedApiTestMixin, QueryBudgetTestMixin,
+                          TestCase):
+    """Test fetching changes since a sync token"""
+
+    def sync(self, since=None, **params):
+        """Fetch the changes after the token"""
+        if since is not None:
+            params['since'] = since
+        res = self.client.get(CHANGES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_initial_sync_returns_everything(self):
+        """Test syncing without a token returns all of the user's rows"""
+        recepie = create_recepie(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recepie.tags.add(tag)
+        other = create_user(email='other@example.com', password='testpass')
+        create_recepie(user=other)
+
+        data = self.sync()
+
+        self.assertEqual([r['id'] for r in data['recepies']], [recepie.id])
+        self.assertEqual(data['recepies'][0]['tags'][0]['name'], 'Vegan')
+        self.assertEqual([t['id'] for t in data['tags']], [tag.id])
+        self.assertFalse(data['has_more'])
+
+    def test_sync_returns_only_changes(self):
+        """Test a sync from a token returns rows changed after it"""
+        unchanged = create_recepie(user=self.user, title='Unchanged')
+        changed = create_recepie(user=self.user, title='Changed')
+        token = self.sync()['token']
+
+        self.client.patch(detail_url(changed.id), {'title': 'New'})
+        data = self.sync(token)
+
+        self.assertEqual([r['id'] for r in data['recepies']], [changed.id])
+        self.assertEqual(data['recepies'][0]['title'], 'New')
+        self.assertNotIn(unchanged.id, [r['id'] for r in data['recepies']])
+        self.assertEqual(self.sync(data['token'])['recepies'], [])
+
+    def test_sync_reports_deletions(self):
+        """Test deleted recepies and tags are reported by id"""
+        recepie = create_recepie(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        tag_id = tag.id
+        token = self.sync()['token']
+
+        self.client.delete(detail_url(recepie.id))
+        tag.delete()
+        data = self.sync(token)
+
+        self.assertEqual(data['deleted'], {
+            'recepies': [recepie.id], 'tags': [tag_id],
+        })
+
+    def test_tag_changes_resync_recepies(self):
+        """Test changing a recepie's tags marks the recepie changed"""
+        recepie = create_recepie(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        token = self.sync()['token']
+
+        recepie.tags.add(tag)
+        data = self.sync(token)
+        self.assertEqual([r['id'] for r in data['recepies']], [recepie.id])
+
+        tag.delete()
+        data = self.sync(data['token'])
+        self.assertEqual([r['id'] for r in data['recepies']], [recepie.id])
+        self.assertEqual(data['recepies'][0]['tags'], [])
+
+    def test_profile_update_keeps_sequence(self):
+        """Test saving the user between syncs loses no changes"""
+        for _ in range(3):
+            create_recepie(user=self.user)
+        token = self.sync()['token']
+
+        res = self.client.patch(reverse('user:me'), {'name': 'New name'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recepie = create_recepie(user=self.user)
+        data = self.sync(token)
+
+        self.assertEqual([r['id'] for r in data['recepies']], [recepie.id])
+        self.assertGreater(int(data['token']), int(token))
+
+    def test_sync_pages_with_limit(self):
+        """Test following tokens with a limit returns every change once"""
+        ids = [create_recepie(user=self.user).id for _ in range(5)]
+        seen, token, has_more = [], None, True
+        while has_more:
+            data = self.sync(token, limit=2)
+            self.assertLessEqual(len(data['recepies']), 2)
+            seen.extend(r['id'] for r in data['recepies'])
+            token, has_more = data['token'], data['has_more']
+        self.assertEqual(seen, ids)
+
+    def test_sync_query_count_is_constant(self):
+        """Test the sync cost does not grow with the number of changes"""
+        for _ in range(10):
+            recepie = create_recepie(user=self.user)
+            recepie.tags.add(Tag.objects.create(user=self.user,
+                                                name=f'Tag {recepie.id}'))
+        with self.assertNumQueries(8):
+            self.sync()
+
+    def test_invalid_token_rejected(self):
+        """Test a malformed token is a bad request"""
+        res = self.client.get(CHANGES_URL, {'since': 'abc'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_out_of_range_token_rejected(self):
+        """Test a token past the largest sequence number is a bad request"""
+        for name in ('since', 'limit'):
+            res = self.client.get(CHANGES_URL,
+                                  {name: '99999999999999999999'})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(name, res.data)
@@ -5,11 +5,13 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
 from rest_framework import status
-from core.models import Tag
+from core.models import Recepie, Tag
+from core.query_budget import QueryBudgetTestMixin
 from recepie.serializers import TagSerializer
 from rest_framework.test import APIClient
 
 TAG_URL = reverse('recepie:tag-list')
+RECEPIE_URL = reverse('recepie:recepie-list')
 
 
 def create_user(**params):
@@ -33,7 +35,7 @@ class PublicTagsApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateTagsApiTests(TestCase):
+class PrivateTagsApiTests(QueryBudgetTestMixin, TestCase):
     """Test the authorized user tags API"""
 
     def setUp(self):
@@ -53,7 +55,7 @@ class PrivateTagsApiTests(TestCase):
         tags = Tag.objects.all().order_by('-name')
         serializer = TagSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """Test that tags returned are for authenticated user"""
@@ -66,9 +68,9 @@ class PrivateTagsApiTests(TestCase):
         tag = Tag.objects.create(user=self.user, name='Comfort Food')
         res = self.client.get(TAG_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
-        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
+        self.assertEqual(res.data['results'][0]['id'], tag.id)
 
     def test_tag_update(self):
         """Test updating a tag"""
@@ -96,3 +98,87 @@ class PrivateTagsApiTests(TestCase):
         ).exists()
         self.assertTrue(exists)
 
+    def test_tags_paginated_by_cursor(self):
+        """Test tags are returned in pages following the cursor links"""
+        for name in ('a', 'b', 'c'):
+            Tag.objects.create(user=self.user, name=name)
+        res = self.client.get(TAG_URL, {'page_size': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [tag['name'] for tag in res.data['results']]
+        res = self.client.get(res.data['next'])
+        names += [tag['name'] for tag in res.data['results']]
+        self.assertEqual(names, ['c', 'b', 'a'])
+        self.assertIsNone(res.data['next'])
+
+    def test_create_duplicate_tag_rejected(self):
+        """Test creating a tag with a name the user already has fails"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        res = self.client.post(TAG_URL, {'name': 'Vegan'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_list_tags_with_counts(self):
+        """Test listing tags with their recepie counts, most used first"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Unused')
+        for title in ('Curry', 'Salad'):
+            self.client.post(RECEPIE_URL, {
+                'title': title, 'time_minutes': 5, 'price': '5.00',
+                'description': 'Test', 'tags': [
+                    {'name': 'Vegan'}, {'name': title}],
+            }, format='json')
+
+        res = self.client.get(TAG_URL, {'ordering': '-usage',
+                                        'with_counts': 'true'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        counts = [(tag['name'], tag['recepie_count'])
+                  for tag in res.data['results']]
+        self.assertEqual(counts[0], ('Vegan', 2))
+        self.assertEqual(counts[-1], ('Unused', 0))
+        self.assertEqual(len(counts), 4)
+        self.assertNotIn('recepie_count', self.client.get(
+            TAG_URL).data['results'][0])
+
+        recepie_id = Recepie.objects.get(title='Curry').id
+        self.client.patch(
+            reverse('recepie:recepie-detail', args=[recepie_id]),
+            {'tags': []}, format='json')
+        vegan.refresh_from_db()
+        self.assertEqual(vegan.recepie_count, 1)
+
+    def test_list_tags_by_usage_pages_through_ties(self):
+        """Test paging by usage returns every tag once past 1000 ties"""
+        Tag.objects.bulk_create(
+            Tag(user=self.user, name=f'Tag {i}') for i in range(1300))
+        Tag.objects.filter(name='Tag 7').update(recepie_count=2)
+        ids, url = [], TAG_URL
+        params = {'ordering': '-usage', 'page_size': 100}
+        # Pages that never end fail the test instead of hanging it
+        while url and len(ids) <= 1300:
+            res = self.client.get(url, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids += [tag['id'] for tag in res.data['results']]
+            url, params = res.data['next'], None
+
+        expected = list(Tag.objects.filter(user=self.user).order_by(
+            '-recepie_count', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(
+            [tag['id'] for tag in self.client.get(
+                res.data['previous']).data['results']],
+            expected[-200:-100])
+
+    def test_list_tags_invalid_cursor(self):
+        """Test a tampered cursor is not found rather than an error"""
+        # Cursors with the position abc and ["x", 1]
+        for cursor in ('cD1hYmM=', 'cD0lNUIlMjJ4JTIyJTJDKzElNUQ='):
+            res = self.client.get(TAG_URL, {'ordering': '-usage',
+                                            'cursor': cursor})
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_tags_unknown_ordering(self):
+        """Test an unknown tag ordering is rejected"""
+        res = self.client.get(TAG_URL, {'ordering': 'usage'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,49 @@
+"""
+Helpers shared by the recepie API tests
+"""
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core.models import Recepie, Tag
+
+
+def detail_url(recepie_id):
+    """Helper function to create recepie detail url"""
+    return reverse('recepie:recepie-detail', args=[recepie_id])
+
+
+def create_user(**params):
+    """Helper function to create user"""
+    return get_user_model().objects.create_user(**params)
+
+
+def create_tag(user, name='Main course'):
+    """Helper function to create tag"""
+    return Tag.objects.create(user=user, name=name)
+
+
+def create_recepie(user, **params):
+    """Helper function to create recepie"""
+    defaults = {
+        'title': 'Test recepie',
+        'description': 'Test description',
+        'price': Decimal('10.00'),
+        'time_minutes': 5,
+    }
+    defaults.update(params)
+    return Recepie.objects.create(user=user, **defaults)
+
+
+class AuthenticatedApiTestMixin:
+    """Authenticate the API client of each test as a new user"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user(
+            email='test@example.com',
+            password='testpass',
+            name='Test name',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
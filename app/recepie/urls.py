@@ -12,5 +12,10 @@ router.register('tag', views.TagViewSet, basename='tag')
 app_name = 'recepie'
 
 urlpatterns = [
-    path('', include(router.urls))
+    path('', include(router.urls)),
+    path('async/recepie/', views.recepie_list_async,
+         name='async-recepie-list'),
+    path('async/recepie/<int:pk>/', views.recepie_detail_async,
+         name='async-recepie-detail'),
+    path('async/tag/', views.tag_list_async, name='async-tag-list'),
 ]
@@ -1,41 +1,221 @@
 """
 This module contains the views for the recepie API
 """
+from django.db import IntegrityError, transaction
+from django.contrib.auth import get_user_model
+from django.db.models import BigIntegerField, Count, Max, Prefetch, \
+    Subquery
+from django.utils.translation import gettext_lazy as _
+from itertools import chain
+from django.conf import settings
 from rest_framework import viewsets, mixins
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
-from core.models import Recepie, Tag
+from rest_framework.response import Response
+from core.async_views import async_view
+from core.models import ChangeSequence, Recepie, Tag, Tombstone
 from recepie import serializers
+from recepie.bulk import BulkRecepieMixin
+from recepie.export import ExportRecepieMixin
+from recepie.filters import filter_recepies
+from recepie.search import SearchRecepieMixin
+from recepie.cache import CachedListMixin, CachedRetrieveMixin
+from recepie.conditional import ConditionalGetMixin
+from user.authentication import CachedTokenAuthentication
+from recepie.pagination import RecepieCursorPagination, \
+    TagCursorPagination
 
 
-class RecepieViewSet(viewsets.ModelViewSet):
+def _aggregate(queryset, aggregate):
+    """
+    Return a subquery computing an aggregate over the user's rows
+    """
+    return Subquery(queryset.order_by().values('user').annotate(
+        value=aggregate).values('value'))
+
+
+def _last_deleted(user, kind):
+    """
+    Return a subquery of when the user last deleted a row of the kind
+    """
+    return Subquery(Tombstone.objects.filter(
+        user=user, kind=kind).order_by('-change_seq').values(
+            'deleted_at')[:1])
+
+
+class RecepieViewSet(BulkRecepieMixin, ExportRecepieMixin, SearchRecepieMixin,
+                     CachedListMixin, CachedRetrieveMixin,
+                     ConditionalGetMixin, viewsets.ModelViewSet):
     """
     Views for recepie API
     """
     serializer_class = serializers.RecepieDetailSerializer
     queryset = Recepie.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecepieCursorPagination
+    # Most queries per request by action, see core.query_budget, including
+    # the token lookup of a cold token cache
+    query_budget = {
+        'list': 4, 'search': 3, 'retrieve': 4, 'changes': 9, 'create': 12,
+        'update': 16, 'partial_update': 16, 'destroy': 7, 'bulk': 15,
+        'bulk_update': 17, 'bulk_destroy': 10,
+    }
 
     def get_queryset(self):
         """
         Retrieve the recepies for the authenticated user
         """
-        return self.queryset.filter(user=self.request.user).order_by('-id')
+        queryset = self.queryset.filter(user=self.request.user)
+        if self.action in ('list', 'search'):
+            queryset = filter_recepies(queryset, self.request.query_params,
+                                       self.request.user)
+        return self._plan_queryset(queryset.order_by('-id'))
+
+    def _plan_queryset(self, queryset):
+        """
+        Load only the columns the read serializer renders and prefetch
+        nested relations in one query instead of one query per recepie
+
+        Lists are read as values() rows, which the list serializer renders
+        without building model instances and loads nested relations for.
+        """
+        if self.action not in ('list', 'retrieve', 'search'):
+            return queryset
+        serializer_class = self.get_serializer_class()
+        model_meta = serializer_class.Meta.model._meta
+        columns, prefetches = [], []
+        for name in serializer_class.Meta.fields:
+            field = model_meta.get_field(name)
+            if not field.many_to_many:
+                columns.append(name)
+                continue
+            nested = serializer_class._declared_fields[name]
+            nested = getattr(nested, 'child', nested)
+            prefetches.append(Prefetch(
+                name,
+                queryset=field.related_model.objects.only(
+                    *nested.Meta.fields).order_by('id'),
+            ))
+        if self.action in ('list', 'search'):
+            return queryset.values(*columns)
+        return queryset.only(*columns).prefetch_related(*prefetches)
+
+    def get_validator_state(self):
+        """
+        Return the last modification time of the recepies and their tags
+        with the counts that change when rows are deleted
+
+        Deleted recepies count as modifications of the list, so clients
+        sending only If-Modified-Since see them disappear. Deleting a tag
+        already marks its recepies as modified.
+        """
+        user = self.request.user
+        recepies = Recepie.objects.filter(user=user)
+        if self.action == 'retrieve':
+            try:
+                recepies = recepies.filter(pk=self.kwargs['pk'])
+            except ValueError:
+                return None
+            state = recepies.aggregate(
+                modified=Max('updated_at'),
+                tags_modified=Max('tags__updated_at'),
+                tags=Count('tags'),
+            )
+        else:
+            tags = Tag.objects.filter(user=user)
+            state = get_user_model().objects.filter(pk=user.pk).values(
+                modified=_aggregate(recepies, Max('updated_at')),
+                recepies=_aggregate(recepies, Count('id')),
+                tags_modified=_aggregate(tags, Max('updated_at')),
+                tags=_aggregate(tags, Count('id')),
+                deleted=_last_deleted(user, Tombstone.KIND_RECEPIE),
+            )[0]
+        if state['modified'] is None:
+            return None
+        modified = max(filter(None, (state.pop('modified'),
+                                     state.pop('tags_modified'),
+                                     state.pop('deleted', None))))
+        return modified, sorted(state.items())
 
     def get_serializer_class(self):
         """
         Return appropriate serializer class
         """
-        if self.action == 'list':
+        if self.action in ('list', 'search'):
             return serializers.RecipieSerializer
         return self.serializer_class
 
+    @action(detail=False, url_path='changes')
+    def changes(self, request):
+        """
+        Return the recepies and tags changed or deleted after the `since`
+        token with the token to pass on the next call
+        """
+        since = self._query_int('since', 0)
+        limit = min(self._query_int('limit', settings.API_PAGE_SIZE) or 1,
+                    settings.API_MAX_PAGE_SIZE)
+        user = request.user
+        head = ChangeSequence.objects.filter(user=user).values_list(
+            'value', flat=True).first() or 0
+        sources = [
+            model.objects.filter(user=user, change_seq__gt=since)
+            for model in (Recepie, Tag, Tombstone)
+        ]
+        # Stop after the limit-th change but never between rows sharing a
+        # sequence number, which bulk updates of many rows produce
+        seqs = sorted(chain.from_iterable(
+            source.order_by('change_seq').values_list(
+                'change_seq', flat=True)[:limit + 1]
+            for source in sources
+        ))
+        token = seqs[limit - 1] if len(seqs) > limit else head
+        recepies, tags, tombstones = (
+            source.filter(change_seq__lte=token).order_by('change_seq')
+            for source in sources
+        )
+        deleted = {Tombstone.KIND_RECEPIE: [], Tombstone.KIND_TAG: []}
+        for kind, object_id in tombstones.values_list('kind', 'object_id'):
+            deleted[kind].append(object_id)
+        context = self.get_serializer_context()
+        return Response({
+            'token': str(token),
+            'has_more': token < head,
+            'recepies': serializers.RecepieDetailSerializer(
+                recepies.prefetch_related('tags'), many=True,
+                context=context).data,
+            'tags': serializers.TagSerializer(tags, many=True,
+                                              context=context).data,
+            'deleted': {
+                'recepies': deleted[Tombstone.KIND_RECEPIE],
+                'tags': deleted[Tombstone.KIND_TAG],
+            },
+        })
+
+    def _query_int(self, name, default):
+        """
+        Read a non negative integer query parameter that fits the bigint
+        columns it is compared with
+        """
+        value = self.request.query_params.get(name)
+        if value is None:
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            value = -1
+        if not 0 <= value <= BigIntegerField.MAX_BIGINT:
+            msg = _('Must be a non negative integer')
+            raise ValidationError({name: [msg]})
+        return value
+
     def perform_create(self, serializer):
         """
         Create a new recepie
         """
         serializer.save(user=self.request.user)
+        self.bump_cache_version()
 
     def perform_update(self, serializer):
         """
@@ -44,18 +224,31 @@ class RecepieViewSet(viewsets.ModelViewSet):
         print("attempt", self.request.data, serializer.validated_data,
               self.serializer_class)
         serializer.save(user=self.request.user)
+        self.bump_cache_version()
+
+    def perform_destroy(self, instance):
+        """
+        Delete a recepie
+        """
+        instance.delete()
+        self.bump_cache_version()
 
 
-class TagViewSet(mixins.UpdateModelMixin, mixins.CreateModelMixin,
-                 mixins.DestroyModelMixin, viewsets.GenericViewSet,
-                 mixins.ListModelMixin):
+class TagViewSet(CachedListMixin, mixins.UpdateModelMixin,
+                 mixins.CreateModelMixin, mixins.DestroyModelMixin,
+                 viewsets.GenericViewSet, mixins.ListModelMixin):
     """
     Views for tag API
     """
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = TagCursorPagination
+    query_budget = {
+        'list': 2, 'create': 6, 'update': 6, 'partial_update': 6,
+        'destroy': 8,
+    }
 
     def get_queryset(self):
         """
@@ -63,14 +256,48 @@ class TagViewSet(mixins.UpdateModelMixin, mixins.CreateModelMixin,
         """
         return self.queryset.filter(user=self.request.user).order_by('-name')
 
+    def get_serializer_class(self):
+        """
+        Return the serializer with usage counts for ?with_counts=true lists
+        """
+        with_counts = self.request.query_params.get('with_counts', '')
+        if self.action == 'list' and with_counts.lower() in ('true', '1'):
+            return serializers.TagUsageSerializer
+        return self.serializer_class
+
     def perform_create(self, serializer):
         """
         Create a new tag
         """
-        serializer.save(user=self.request.user)
+        self._save_unique(serializer)
 
     def perform_update(self, serializer):
         """
         Update a tag
         """
-        serializer.save(user=self.request.user)
+        self._save_unique(serializer)
+
+    def perform_destroy(self, instance):
+        """
+        Delete a tag
+        """
+        instance.delete()
+        self.bump_cache_version()
+
+    def _save_unique(self, serializer):
+        """
+        Save the tag, rejecting a name the user already has
+        """
+        try:
+            with transaction.atomic():
+                serializer.save(user=self.request.user)
+        except IntegrityError:
+            msg = _('A tag with this name already exists')
+            raise ValidationError({'name': [msg]})
+        self.bump_cache_version()
+
+
+# Async variants of the read endpoints for the ASGI application
+recepie_list_async = async_view(RecepieViewSet, {'get': 'list'})
+recepie_detail_async = async_view(RecepieViewSet, {'get': 'retrieve'})
+tag_list_async = async_view(TagViewSet, {'get': 'list'})
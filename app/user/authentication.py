@@ -0,0 +1,114 @@
+"""
+    Authentication for user api views
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """
+    Thread safe LRU of token key to token, with entries expiring after a
+    time to live, or the named Django cache when one is configured
+
+    Tokens are invalidated in the shared cache by whichever worker deletes
+    them, so once it is configured the in-process LRU, which only that
+    worker would clear, is not used.
+    """
+    key_prefix = 'authtoken:'
+
+    def __init__(self, max_size, ttl, cache_alias=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        """Create the cache configured by the TOKEN_CACHE setting"""
+        options = settings.TOKEN_CACHE
+        return cls(options['MAX_SIZE'], options['TTL'],
+                   options.get('CACHE_ALIAS'))
+
+    @property
+    def shared(self):
+        """The shared Django cache, if one is configured"""
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def get(self, key):
+        """Return a copy of the cached token for the key, or None"""
+        if self.shared is not None:
+            return self.shared.get(self.key_prefix + key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return copy.deepcopy(entry[1])
+                del self._entries[key]
+        return None
+
+    def set(self, key, token):
+        """Cache the token under its key"""
+        if self.shared is not None:
+            self.shared.set(self.key_prefix + key, token, self.ttl)
+        else:
+            self._store(key, copy.deepcopy(token), time.monotonic())
+
+    def delete(self, *keys):
+        """Forget the given token keys"""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete_many([self.key_prefix + key for key in keys])
+
+    def delete_user(self, user_id, keys=()):
+        """Forget every cached token of the user"""
+        with self._lock:
+            keys = set(keys) | {
+                key for key, (_, token) in self._entries.items()
+                if token.user_id == user_id
+            }
+        if keys:
+            self.delete(*keys)
+
+    def clear(self):
+        """Forget all tokens held in this process"""
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key, token, now):
+        """Store the token locally, evicting the least recently used"""
+        with self._lock:
+            self._entries[key] = (now + self.ttl, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+token_cache = TokenCache.from_settings()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that resolves token keys from token_cache and only
+    queries the database on a miss, when TOKEN_CACHE['ENABLED']
+    """
+
+    def authenticate_credentials(self, key):
+        """Return the user and token for the key"""
+        if not settings.TOKEN_CACHE['ENABLED']:
+            return super().authenticate_credentials(key)
+        token = token_cache.get(key)
+        if token is None or not token.user.is_active:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+        return (token.user, token)
@@ -9,8 +9,10 @@ from django.contrib.auth import (
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
 
+from core.serializers import TimedDataMixin
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(TimedDataMixin, serializers.ModelSerializer):
     """Serializer for the users object"""
 
     class Meta:
@@ -0,0 +1,27 @@
+"""
+    Signal handlers for the user app
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Stop accepting a token as soon as it is deleted"""
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_saved_user_tokens(sender, instance, created, **kwargs):
+    """Drop the cached tokens of a changed, e.g. deactivated, user"""
+    if created:
+        return
+    keys = ()
+    if token_cache.shared is not None:
+        keys = Token.objects.filter(user=instance).values_list(
+            'key', flat=True)
+    token_cache.delete_user(instance.pk, keys)
@@ -0,0 +1,138 @@
+"""
+Tests for cached token authentication
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from user.authentication import TokenCache, token_cache
+
+PROFILE_URL = reverse('user:me')
+
+
+@override_settings(TOKEN_CACHE=dict(settings.TOKEN_CACHE, ENABLED=True))
+class CachedTokenAuthenticationTests(TestCase):
+    """Test token lookups are cached and invalidated"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpass',
+            name='Test name'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        """Test only the first request queries the token"""
+        with self.assertNumQueries(1):
+            res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_not_cached_when_disabled(self):
+        """Test tokens are looked up on every request unless enabled"""
+        with self.settings(TOKEN_CACHE=dict(settings.TOKEN_CACHE,
+                                            ENABLED=False)):
+            for _ in range(2):
+                with self.assertNumQueries(1):
+                    res = self.client.get(PROFILE_URL)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_invalid_token_rejected(self):
+        """Test an unknown token is not accepted"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_rejected(self):
+        """Test a cached token stops working once deleted"""
+        self.client.get(PROFILE_URL)
+        self.token.delete()
+        res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test a cached token stops working once its user is inactive"""
+        self.client.get(PROFILE_URL)
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_not_stale(self):
+        """Test the cached user reflects profile changes"""
+        self.client.get(PROFILE_URL)
+        self.client.patch(PROFILE_URL, {'name': 'New name'})
+        res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.data['name'], 'New name')
+
+
+class TokenCacheTests(TestCase):
+    """Test the token cache itself"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpass',
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def test_least_recently_used_evicted(self):
+        """Test the cache keeps at most max_size tokens"""
+        tokens = TokenCache(max_size=2, ttl=60)
+        tokens.set('a', self.token)
+        tokens.set('b', self.token)
+        tokens.get('a')
+        tokens.set('c', self.token)
+        self.assertIsNotNone(tokens.get('a'))
+        self.assertIsNone(tokens.get('b'))
+        self.assertIsNotNone(tokens.get('c'))
+
+    def test_expired_entries_dropped(self):
+        """Test entries are not returned after their time to live"""
+        tokens = TokenCache(max_size=2, ttl=0)
+        tokens.set('a', self.token)
+        self.assertIsNone(tokens.get('a'))
+
+    def test_shared_cache_fallback(self):
+        """Test tokens are found in the shared cache by other processes"""
+        TokenCache(max_size=2, ttl=60, cache_alias='default').set(
+            self.token.key, self.token)
+        other = TokenCache(max_size=2, ttl=60, cache_alias='default')
+        token = other.get(self.token.key)
+        self.assertEqual(token.user.email, self.user.email)
+        other.delete_user(self.user.pk, [self.token.key])
+        self.assertIsNone(other.get(self.token.key))
+
+    def test_shared_cache_deletes_reach_other_processes(self):
+        """Test a token deleted by one process is rejected by the others"""
+        deleting = TokenCache(max_size=2, ttl=60, cache_alias='default')
+        reading = TokenCache(max_size=2, ttl=60, cache_alias='default')
+        deleting.set(self.token.key, self.token)
+        self.assertIsNotNone(reading.get(self.token.key))
+
+        deleting.delete(self.token.key)
+
+        self.assertIsNone(reading.get(self.token.key))
+
+    def test_shared_cache_user_deletes_reach_other_processes(self):
+        """Test tokens of a user dropped by one process are by the others"""
+        deleting = TokenCache(max_size=2, ttl=60, cache_alias='default')
+        reading = TokenCache(max_size=2, ttl=60, cache_alias='default')
+        reading.set(self.token.key, self.token)
+        self.assertIsNotNone(reading.get(self.token.key))
+
+        deleting.delete_user(self.user.pk, [self.token.key])
+
+        self.assertIsNone(reading.get(self.token.key))
@@ -1,7 +1,8 @@
 """
     Views for User API
 """
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
+from user.authentication import CachedTokenAuthentication
 from user.serializers import UserSerializer, AuthTokenSerializer
 from rest_framework.settings import api_settings
 from rest_framework.authtoken.views import ObtainAuthToken
@@ -10,18 +11,22 @@ from rest_framework.authtoken.views import ObtainAuthToken
 class CreateUserView(generics.CreateAPIView):
     """Create a new user in the system"""
     serializer_class = UserSerializer
+    # Most queries per request by method, see core.query_budget
+    query_budget = {'post': 2}
 
 
 class CreateTokenView(ObtainAuthToken):
     """Create a new auth token for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    query_budget = {'post': 5}
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
+    query_budget = {'get': 2, 'put': 3, 'patch': 3}
 
     def get_object(self):
         """Retreive and return authenticated user"""